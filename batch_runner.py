@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import time
+
+from main import async_graph, memory, initial_state, run_config
+from nodes.builder_node import NO_PROGRESS_MAX_REPEATS, failure_repeats
+from tools.file_tools import PROJECT_PATH, use_project_path
+from utils.tracing import tracer
+
+
+def load_requirements(path: str) -> list[dict]:
+    """
+    Read requirements from a file with one requirement per line.
+    JSON lines like {"request_id": ..., "title": ..., "body": ...} (or with a "requirement" key) are supported,
+    any other non-empty line is taken as the requirement text itself.
+    """
+    requirements = []
+    with open(path, "r") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                entry = line
+            if isinstance(entry, dict):
+                text = entry.get("requirement") or "\n\n".join(p for p in (entry.get("title"), entry.get("body")) if p)
+                requirement_id = str(entry.get("request_id") or entry.get("id") or f"req-{line_no}")
+            else:
+                text, requirement_id = str(entry), f"req-{line_no}"
+            requirements.append({"id": requirement_id, "requirement": text})
+    return requirements
+
+
+def prepare_workspace(template: str, workspace_root: str, requirement_id: str) -> str:
+    """ Fresh copy of the template project for one requirement, without build output. """
+    workspace = os.path.join(os.path.abspath(workspace_root), requirement_id)
+    if os.path.exists(workspace):
+        shutil.rmtree(workspace)
+    shutil.copytree(template, workspace, symlinks=True, ignore=shutil.ignore_patterns("target", ".idea"))
+    return workspace
+
+
+async def run_requirement(requirement: dict, args, semaphore: asyncio.Semaphore) -> dict:
+    async with semaphore:
+        started = time.monotonic()
+        thread_id = f"{args.thread_prefix}{requirement['id']}"
+        result = {"id": requirement["id"], "thread_id": thread_id}
+        print(f"[{requirement['id']}] started")
+        try:
+            workspace = await asyncio.to_thread(prepare_workspace, args.project, args.workspaces, requirement["id"])
+            result["workspace"] = workspace
+            memory.delete_thread(thread_id)
+            with use_project_path(workspace):
+                state = await async_graph.ainvoke(initial_state(requirement["requirement"]), config=run_config(thread_id))
+            result["build_success"] = state["build_success"]
+            result["cycles_left"] = state["cycles"]
+            if not state["build_success"]:
+                result["build_summary"] = state["build_summary"]
+                result["failed_builds"] = len(state.get("failure_history", []))
+                result["no_progress"] = failure_repeats(state.get("failure_history", [])) >= NO_PROGRESS_MAX_REPEATS
+        except Exception as e:
+            result["error"] = repr(e)
+        result["duration_seconds"] = round(time.monotonic() - started, 1)
+        print(f"[{requirement['id']}] finished in {result['duration_seconds']}s: "
+              f"{'error' if 'error' in result else 'build ok' if result['build_success'] else 'build failed'}")
+        return result
+
+
+async def run_batch(requirements: list[dict], args) -> list[dict]:
+    """ Run every requirement in its own thread id and workspace, at most args.concurrency at a time. """
+    semaphore = asyncio.Semaphore(args.concurrency)
+    tasks = [asyncio.create_task(run_requirement(r, args, semaphore)) for r in requirements]
+    results = []
+    with open(args.output, "w") as out:
+        # Results are written as they complete so a long batch leaves usable output even if it is stopped
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            results.append(result)
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run many feature requirements through the agent concurrently.")
+    parser.add_argument("requirements", help="File with one requirement per line (JSON lines or plain text)")
+    parser.add_argument("--project", default=PROJECT_PATH, help="Template project copied into each workspace")
+    parser.add_argument("--workspaces", default="workspaces", help="Directory holding one project copy per requirement")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum requirements processed at the same time")
+    parser.add_argument("--output", default="batch_results.jsonl", help="Where to write one JSON result per requirement")
+    parser.add_argument("--thread-prefix", default="batch-", help="Prefix of the checkpoint thread ids")
+    args = parser.parse_args()
+
+    requirements = load_requirements(args.requirements)
+    started = time.monotonic()
+    results = asyncio.run(run_batch(requirements, args))
+    tracer.write_metrics()
+    print(tracer.llm_usage())
+    succeeded = sum(1 for r in results if r.get("build_success"))
+    print(f"{succeeded}/{len(results)} requirements built successfully in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,134 @@
+import itertools
+import json
+import re
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+JAVA_PATH_RE = re.compile(r'([\w./-]+\.java)\b')
+
+
+class ScriptedChatModel:
+    """
+    Offline stand-in for a chat model with tools bound. It answers from the conversation the way a
+    well-behaved model would, with no network call:
+      planner / error_handler: one round of discovery tool calls, then a JSON plan.
+      coder: read the step's files, write them back with a change, then confirm the step.
+    The plans touch services of the synthetic project (project_files); the error handler targets
+    the files named in the build summary when it can.
+    """
+
+    def __init__(self, role: str, metrics, project_files: list[str] = None, steps_per_plan: int = 3):
+        self.role = role
+        self.metrics = metrics
+        self.project_files = project_files or []
+        self.steps_per_plan = steps_per_plan
+        self._ids = itertools.count(1)
+        self._plan_cursor = 0
+
+    def invoke(self, messages: list[BaseMessage], *args, **kwargs) -> AIMessage:
+        turn = _current_turn(messages)
+        if self.role == "coder":
+            response = self._code(turn)
+        else:
+            response = self._plan(turn)
+        self.metrics.record_llm(self.role, messages, response)
+        return response
+
+    async def ainvoke(self, messages: list[BaseMessage], *args, **kwargs) -> AIMessage:
+        return self.invoke(messages, *args, **kwargs)
+
+    def _plan(self, turn: list[BaseMessage]) -> AIMessage:
+        if not any(isinstance(m, ToolMessage) for m in turn):
+            return self._tool_calls([
+                ("list_project_files", {"collapsed": True}),
+                ("find_java_symbol", {"annotation": "RestController"}),
+                ("read_file", {"file": "pom.xml"}),
+            ])
+        targets = []
+        if self.role == "error_handler":
+            summary = "\n".join(m.content for m in turn if isinstance(m, HumanMessage) and isinstance(m.content, str))
+            known = set(self.project_files)
+            targets = [p for p in dict.fromkeys(JAVA_PATH_RE.findall(summary)) if p in known]
+        if not targets:
+            services = [f for f in self.project_files if f.endswith("Service.java")] or self.project_files
+            targets = [services[(self._plan_cursor + i) % len(services)] for i in range(min(self.steps_per_plan, len(services)))]
+            self._plan_cursor += len(targets)
+        steps = [{
+            "id": i + 1,
+            "description": f"Add a count method to {path.rsplit('/', 1)[-1][:-5]}",
+            "affectedFiles": [path],
+            # Every other step depends on the previous one, so plans have both parallel and chained steps
+            "dependencies": [i] if i % 2 else [],
+        } for i, path in enumerate(targets)]
+        plan = {"summary": f"Benchmark plan touching {len(steps)} files", "steps": steps,
+                "estimates": {"totalSteps": len(steps), "complexity": "low"}}
+        return AIMessage(content="```json\n" + json.dumps(plan, indent=2) + "\n```", id=self._next_id("msg"))
+
+    def _code(self, turn: list[BaseMessage]) -> AIMessage:
+        step = _current_step(turn)
+        files = step.get("affectedFiles", [])
+        results = [m for m in turn if isinstance(m, ToolMessage)]
+        if not results:
+            return self._tool_calls([("find_java_symbol", {"name": f.rsplit("/", 1)[-1][:-5]}) for f in files if f.endswith(".java")]
+                                    + [("read_file", {"file": f}) for f in files])
+        if not any(m.name in ("create_or_update_file", "edit_file") for m in results):
+            contents = _read_results(turn)
+            return self._tool_calls([_edit(f, contents.get(f, ""), step.get("id")) for f in files])
+        return AIMessage(content=json.dumps({"stepId": step.get("id"), "modifiedFiles": files, "status": "success"}),
+                         id=self._next_id("msg"))
+
+    def _tool_calls(self, calls: list[tuple[str, dict]]) -> AIMessage:
+        return AIMessage(content="", id=self._next_id("msg"),
+                         tool_calls=[{"name": name, "args": args, "id": self._next_id("call")} for name, args in calls])
+
+    def _next_id(self, prefix: str) -> str:
+        return f"{prefix}_{self.role}_{next(self._ids)}"
+
+
+def _current_turn(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """ Messages since the model last answered without calling a tool. """
+    for i in range(len(messages) - 1, -1, -1):
+        message = messages[i]
+        if isinstance(message, AIMessage) and not message.tool_calls:
+            return messages[i + 1:]
+    return messages
+
+
+def _current_step(turn: list[BaseMessage]) -> dict:
+    """ The plan step from the code generator's prompt (its JSON follows the instructions). """
+    for message in reversed(turn):
+        if isinstance(message, HumanMessage) and isinstance(message.content, str) and '"affectedFiles"' in message.content:
+            content = message.content
+            try:
+                return json.loads(content[content.index("{", content.index("requirement")):].strip())
+            except ValueError:
+                continue
+    return {}
+
+
+def _read_results(turn: list[BaseMessage]) -> dict[str, str]:
+    paths = {}
+    for message in turn:
+        if isinstance(message, AIMessage):
+            for call in message.tool_calls:
+                if call["name"] == "read_file":
+                    paths[call["id"]] = call["args"].get("file", "")
+    return {paths[m.tool_call_id]: m.content for m in turn
+            if isinstance(m, ToolMessage) and m.tool_call_id in paths and isinstance(m.content, str)}
+
+
+def _edit(path: str, content: str, step_id) -> tuple[str, dict]:
+    """ An edit_file call adding a method at the end of the class, or a full write for a file that could not be read. """
+    tail = "\n".join(content.rstrip("\n").split("\n")[-2:])
+    if not tail.strip() or content.count(tail) != 1:
+        return "create_or_update_file", {"file_name": path, "file_contents": _change(content, step_id)}
+    return "edit_file", {"file_name": path, "edits": [{"search": tail, "replace": _change(tail, step_id).rstrip("\n")}]}
+
+
+def _change(content: str, step_id) -> str:
+    """ The file with a method added before its closing brace. """
+    method = f"\n    public long count{step_id}() {{\n        return {step_id}L;\n    }}\n"
+    end = content.rfind("}")
+    if end < 0:
+        return content + method
+    return content[:end].rstrip("\n") + "\n" + method + content[end:]
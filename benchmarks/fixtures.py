@@ -0,0 +1,240 @@
+import os
+
+GROUP_ID = "com.example"
+SPRING_BOOT_VERSION = "3.2.5"
+
+
+def generate_project(root: str, entities: int = 20, modules: int = 1, tests: bool = True, filler_methods: int = 5) -> list[str]:
+    """
+    Write a synthetic Spring Boot project under root: for every entity a JPA entity, repository,
+    service and REST controller (plus a @SpringBootTest when tests is True), spread over the given
+    number of Maven modules. filler_methods adds service methods to make files realistically sized.
+    Returns the relative paths of the files written.
+    """
+    written = []
+
+    def write(rel_path: str, content: str):
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+        written.append(rel_path)
+
+    module_names = [f"module-{i + 1}" for i in range(modules)] if modules > 1 else [""]
+    write("pom.xml", _root_pom(module_names if modules > 1 else []))
+    for index, module in enumerate(module_names):
+        if module:
+            write(f"{module}/pom.xml", _module_pom(module))
+        package = GROUP_ID + ("." + module.replace("-", "") if module else ".app")
+        source_root = os.path.join(module, "src/main/java", *package.split("."))
+        test_root = os.path.join(module, "src/test/java", *package.split("."))
+        if index == 0:
+            write(os.path.join(source_root, "Application.java"), _application(package))
+            write(os.path.join(module, "src/main/resources/application.properties"),
+                  "spring.datasource.url=jdbc:h2:mem:bench\nspring.jpa.hibernate.ddl-auto=create-drop\n")
+        for entity_index in range(index, entities, len(module_names)):
+            name = f"Entity{entity_index + 1}"
+            write(os.path.join(source_root, "model", f"{name}.java"), _entity(package, name))
+            write(os.path.join(source_root, "repository", f"{name}Repository.java"), _repository(package, name))
+            write(os.path.join(source_root, "service", f"{name}Service.java"), _service(package, name, filler_methods))
+            write(os.path.join(source_root, "web", f"{name}Controller.java"), _controller(package, name))
+            if tests:
+                write(os.path.join(test_root, "service", f"{name}ServiceTest.java"), _test(package, name))
+    return written
+
+
+def _root_pom(modules: list[str]) -> str:
+    module_entries = "".join(f"        <module>{m}</module>\n" for m in modules)
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+    <modelVersion>4.0.0</modelVersion>
+    <parent>
+        <groupId>org.springframework.boot</groupId>
+        <artifactId>spring-boot-starter-parent</artifactId>
+        <version>{SPRING_BOOT_VERSION}</version>
+    </parent>
+    <groupId>{GROUP_ID}</groupId>
+    <artifactId>bench</artifactId>
+    <version>0.0.1-SNAPSHOT</version>
+    <packaging>{"pom" if modules else "jar"}</packaging>
+    <properties>
+        <java.version>17</java.version>
+    </properties>
+""" + (f"    <modules>\n{module_entries}    </modules>\n" if modules else _dependencies()) + "</project>\n"
+
+
+def _module_pom(module: str) -> str:
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+    <modelVersion>4.0.0</modelVersion>
+    <parent>
+        <groupId>{GROUP_ID}</groupId>
+        <artifactId>bench</artifactId>
+        <version>0.0.1-SNAPSHOT</version>
+    </parent>
+    <artifactId>{module}</artifactId>
+{_dependencies()}</project>
+"""
+
+
+def _dependencies() -> str:
+    dependencies = [("org.springframework.boot", "spring-boot-starter-web", ""),
+                    ("org.springframework.boot", "spring-boot-starter-data-jpa", ""),
+                    ("com.h2database", "h2", "runtime"),
+                    ("org.springframework.boot", "spring-boot-starter-test", "test")]
+    entries = "".join(
+        f"        <dependency>\n            <groupId>{g}</groupId>\n            <artifactId>{a}</artifactId>\n"
+        + (f"            <scope>{s}</scope>\n" if s else "") + "        </dependency>\n"
+        for g, a, s in dependencies)
+    return f"    <dependencies>\n{entries}    </dependencies>\n"
+
+
+def _application(package: str) -> str:
+    return f"""package {package};
+
+import org.springframework.boot.SpringApplication;
+import org.springframework.boot.autoconfigure.SpringBootApplication;
+
+@SpringBootApplication
+public class Application {{
+
+    public static void main(String[] args) {{
+        SpringApplication.run(Application.class, args);
+    }}
+}}
+"""
+
+
+def _entity(package: str, name: str) -> str:
+    return f"""package {package}.model;
+
+import jakarta.persistence.Entity;
+import jakarta.persistence.GeneratedValue;
+import jakarta.persistence.Id;
+
+@Entity
+public class {name} {{
+
+    @Id
+    @GeneratedValue
+    private Long id;
+
+    private String name;
+
+    public Long getId() {{
+        return id;
+    }}
+
+    public String getName() {{
+        return name;
+    }}
+
+    public void setName(String name) {{
+        this.name = name;
+    }}
+}}
+"""
+
+
+def _repository(package: str, name: str) -> str:
+    return f"""package {package}.repository;
+
+import {package}.model.{name};
+import org.springframework.data.jpa.repository.JpaRepository;
+
+public interface {name}Repository extends JpaRepository<{name}, Long> {{
+}}
+"""
+
+
+def _service(package: str, name: str, filler_methods: int) -> str:
+    filler = "".join(f"""
+    public String describe{i}(Long id) {{
+        return repository.findById(id).map({name}::getName).orElse("unknown-{i}");
+    }}
+""" for i in range(filler_methods))
+    return f"""package {package}.service;
+
+import {package}.model.{name};
+import {package}.repository.{name}Repository;
+import java.util.List;
+import java.util.Optional;
+import org.springframework.stereotype.Service;
+
+@Service
+public class {name}Service {{
+
+    private final {name}Repository repository;
+
+    public {name}Service({name}Repository repository) {{
+        this.repository = repository;
+    }}
+
+    public List<{name}> findAll() {{
+        return repository.findAll();
+    }}
+
+    public Optional<{name}> findById(Long id) {{
+        return repository.findById(id);
+    }}
+{filler}}}
+"""
+
+
+def _controller(package: str, name: str) -> str:
+    path = name.lower()
+    return f"""package {package}.web;
+
+import {package}.model.{name};
+import {package}.service.{name}Service;
+import java.util.List;
+import org.springframework.http.ResponseEntity;
+import org.springframework.web.bind.annotation.GetMapping;
+import org.springframework.web.bind.annotation.PathVariable;
+import org.springframework.web.bind.annotation.RequestMapping;
+import org.springframework.web.bind.annotation.RestController;
+
+@RestController
+@RequestMapping("/{path}")
+public class {name}Controller {{
+
+    private final {name}Service service;
+
+    public {name}Controller({name}Service service) {{
+        this.service = service;
+    }}
+
+    @GetMapping
+    public List<{name}> list() {{
+        return service.findAll();
+    }}
+
+    @GetMapping("/{{id}}")
+    public ResponseEntity<{name}> get(@PathVariable Long id) {{
+        return ResponseEntity.of(service.findById(id));
+    }}
+}}
+"""
+
+
+def _test(package: str, name: str) -> str:
+    return f"""package {package}.service;
+
+import static org.assertj.core.api.Assertions.assertThat;
+
+import org.junit.jupiter.api.Test;
+import org.springframework.beans.factory.annotation.Autowired;
+import org.springframework.boot.test.context.SpringBootTest;
+
+@SpringBootTest
+class {name}ServiceTest {{
+
+    @Autowired
+    private {name}Service service;
+
+    @Test
+    void findAllStartsEmpty() {{
+        assertThat(service.findAll()).isEmpty();
+    }}
+}}
+"""
@@ -0,0 +1,170 @@
+import asyncio
+import functools
+import json
+import threading
+import time
+from collections import defaultdict
+
+from langchain_core.messages import BaseMessage
+
+from utils.context_compaction import count_message_tokens, count_tokens
+from utils.tracing import payload_bytes
+
+
+class BenchmarkMetrics:
+    """ Counters filled by the wrapped nodes, tools and the scripted model during a benchmark run. Thread safe. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.node_seconds: dict[str, list[float]] = defaultdict(list)
+        self.tool_calls: dict[str, int] = defaultdict(int)
+        self.tool_errors: dict[str, int] = defaultdict(int)
+        self.tool_seconds: dict[str, float] = defaultdict(float)
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.llm_calls: dict[str, int] = defaultdict(int)
+        self.llm_request_bytes: dict[str, list[int]] = defaultdict(list)
+        self.llm_request_tokens: dict[str, list[int]] = defaultdict(list)
+        # Tokens at the start of each request identical to the role's previous request: what a provider prompt cache can serve
+        self.llm_prefix_tokens: dict[str, int] = defaultdict(int)
+        self._last_request: dict[str, list[tuple]] = {}
+        self.llm_response_bytes = 0
+
+    def wrap_node(self, name: str, node):
+        """ The node, recording its wall time under name. Works for sync and async nodes. """
+        if asyncio.iscoroutinefunction(node):
+            @functools.wraps(node)
+            async def timed_async(state):
+                started = time.perf_counter()
+                try:
+                    return await node(state)
+                finally:
+                    self._add_node_time(name, time.perf_counter() - started)
+            return timed_async
+
+        @functools.wraps(node)
+        def timed(state):
+            started = time.perf_counter()
+            try:
+                return node(state)
+            finally:
+                self._add_node_time(name, time.perf_counter() - started)
+        return timed
+
+    def wrap_tool(self, tool):
+        """ The tool function, counting calls, errors and the bytes it read or wrote. Keeps name, docstring and signature. """
+        @functools.wraps(tool)
+        def counted(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = tool(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self.tool_errors[tool.__name__] += 1
+                raise
+            finally:
+                with self._lock:
+                    self.tool_calls[tool.__name__] += 1
+                    self.tool_seconds[tool.__name__] += time.perf_counter() - started
+            with self._lock:
+                if tool.__name__ in ("read_file", "read_files") and isinstance(result, str):
+                    self.bytes_read += len(result.encode("utf-8"))
+                contents = kwargs.get("file_contents", args[1] if len(args) > 1 else None)
+                if tool.__name__ == "create_or_update_file" and isinstance(contents, str):
+                    self.bytes_written += len(contents.encode("utf-8"))
+                if tool.__name__ == "edit_file":
+                    edits = kwargs.get("edits", args[1] if len(args) > 1 else [])
+                    self.bytes_written += sum(len(e.get("replace", "").encode("utf-8")) for e in edits)
+            return result
+        return counted
+
+    def record_llm(self, role: str, messages: list[BaseMessage], response: BaseMessage):
+        request_bytes = payload_bytes(messages)
+        request_tokens = count_message_tokens(messages)
+        # Compacted copies keep the id of the stored message but not its size
+        keys = [(m.type, m.id, payload_bytes([m])) if m.id else (m.type, json.dumps(m.content), json.dumps(getattr(m, "tool_calls", None) or []))
+                for m in messages]
+        with self._lock:
+            previous = self._last_request.get(role, [])
+            shared = 0
+            while shared < min(len(keys), len(previous)) and keys[shared] == previous[shared]:
+                shared += 1
+            self._last_request[role] = keys
+            self.llm_prefix_tokens[role] += sum(count_tokens(m) for m in messages[:shared])
+            self.llm_calls[role] += 1
+            self.llm_request_bytes[role].append(request_bytes)
+            self.llm_request_tokens[role].append(request_tokens)
+            self.llm_response_bytes += payload_bytes([response])
+
+    def _add_node_time(self, name: str, seconds: float):
+        with self._lock:
+            self.node_seconds[name].append(seconds)
+
+    def report(self) -> dict:
+        """ The collected numbers as a JSON-serializable dict (times in milliseconds). """
+        with self._lock:
+            return {
+                "nodes": {name: {"calls": len(times),
+                                 "total_ms": round(sum(times) * 1000, 2),
+                                 "mean_ms": round(sum(times) * 1000 / len(times), 3),
+                                 "max_ms": round(max(times) * 1000, 3)}
+                          for name, times in sorted(self.node_seconds.items())},
+                "tools": {name: {"calls": calls,
+                                 "errors": self.tool_errors.get(name, 0),
+                                 "total_ms": round(self.tool_seconds[name] * 1000, 2)}
+                          for name, calls in sorted(self.tool_calls.items())},
+                "io": {"bytes_read": self.bytes_read, "bytes_written": self.bytes_written},
+                "llm": {role: {"calls": calls,
+                               "request_bytes_total": sum(self.llm_request_bytes[role]),
+                               "request_bytes_max": max(self.llm_request_bytes[role]),
+                               "request_tokens_total": sum(self.llm_request_tokens[role]),
+                               "request_tokens_max": max(self.llm_request_tokens[role]),
+                               "prefix_tokens_total": self.llm_prefix_tokens[role]}
+                        for role, calls in sorted(self.llm_calls.items())},
+                "llm_response_bytes": self.llm_response_bytes,
+            }
+
+
+def format_report(report: dict) -> str:
+    lines = ["Node                       calls   total ms    mean ms     max ms"]
+    for name, n in report["nodes"].items():
+        lines.append(f"{name:<26} {n['calls']:>5} {n['total_ms']:>10.1f} {n['mean_ms']:>10.2f} {n['max_ms']:>10.2f}")
+    lines.append("")
+    lines.append("Tool                       calls  errors   total ms")
+    for name, t in report["tools"].items():
+        lines.append(f"{name:<26} {t['calls']:>5} {t['errors']:>7} {t['total_ms']:>10.1f}")
+    lines.append("")
+    lines.append("LLM role        calls  request KB total  request KB max  tokens total  tokens max  cacheable prefix")
+    for role, l in report["llm"].items():
+        prefix = l.get("prefix_tokens_total", 0) / l["request_tokens_total"] if l["request_tokens_total"] else 0
+        lines.append(f"{role:<15} {l['calls']:>5} {l['request_bytes_total'] / 1024:>17.1f} {l['request_bytes_max'] / 1024:>15.1f}"
+                     f" {l['request_tokens_total']:>13} {l['request_tokens_max']:>11} {prefix:>17.0%}")
+    lines.append("")
+    lines.append(f"Bytes read by tools: {report['io']['bytes_read']}, written: {report['io']['bytes_written']}, "
+                 f"LLM response bytes: {report['llm_response_bytes']}")
+    if "wall_seconds" in report:
+        lines.append(f"Wall time: {report['wall_seconds']:.2f}s over {report['runs']} run(s), "
+                     f"builds succeeded: {report['builds_succeeded']}/{report['runs']}")
+    return "\n".join(lines)
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Regressions of report against baseline: node mean times and LLM request sizes that grew by more
+    than tolerance (a fraction). Node times also have to grow by at least a millisecond to count.
+    """
+    regressions = []
+    for name, node in report["nodes"].items():
+        base = baseline.get("nodes", {}).get(name)
+        if base and node["mean_ms"] > base["mean_ms"] * (1 + tolerance) and node["mean_ms"] - base["mean_ms"] >= 1:
+            regressions.append(f"node {name}: mean {node['mean_ms']:.2f}ms vs baseline {base['mean_ms']:.2f}ms")
+    for role, llm in report["llm"].items():
+        base = baseline.get("llm", {}).get(role)
+        for key in ("request_bytes_total", "request_tokens_max"):
+            if base and llm[key] > base[key] * (1 + tolerance):
+                regressions.append(f"llm {role}: {key} {llm[key]} vs baseline {base[key]}")
+    for key in ("bytes_read", "bytes_written"):
+        base = baseline.get("io", {}).get(key)
+        if base is not None and report["io"][key] > base * (1 + tolerance):
+            regressions.append(f"io {key}: {report['io'][key]} vs baseline {base}")
+    return regressions
@@ -0,0 +1,159 @@
+"""
+Offline benchmark of the agent graph: scripted fake LLM, synthetic Spring Boot project and a stub mvn.
+Measures the graph's own overhead (node latency, tool calls, bytes read and written, LLM payload sizes).
+
+    python -m benchmarks.run --entities 50 --modules 3 --builds compile,success
+    python -m benchmarks.run --json current.json --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_llm import ScriptedChatModel
+from benchmarks.fixtures import generate_project
+from benchmarks.metrics import BenchmarkMetrics, compare, format_report
+
+# Graph node name -> the function names main.build_graph uses for it (sync, async)
+NODE_FUNCTIONS = {
+    "code_planner_node": ("generate_plan_node", "agenerate_plan_node"),
+    "code_generator_node": ("generate_code", "agenerate_code"),
+    "implementer_node": ("implement_coding_plan_node",),
+    "error_handler_node": ("error_handler_node", "aerror_handler_node"),
+    "builder_node": ("builder_node", "abuilder_node"),
+}
+
+
+def prepare_environment(workdir: str, args):
+    """ Environment for an offline run; must be set before the agent modules are imported. """
+    bin_dir = os.path.join(workdir, "bin")
+    os.makedirs(bin_dir, exist_ok=True)
+    mvn = os.path.join(bin_dir, "mvn")
+    with open(mvn, "w") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(os.path.dirname(__file__), "stub_mvn.py")}" "$@"\n')
+    os.chmod(mvn, 0o755)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    os.environ["CHECKPOINT_DB"] = os.path.join(workdir, "checkpoints.sqlite")
+    os.environ["LLM_CACHE_MODE"] = "off"
+    os.environ["BENCH_MVN_SCRIPT"] = args.builds
+    os.environ["BENCH_MVN_LOG_LINES"] = str(args.log_lines)
+
+
+def instrument(metrics: BenchmarkMetrics, args):
+    """ Replace the models, nodes and tools used by main.build_graph with scripted / measured versions. Returns the fake models. """
+    import main
+    import nodes.code_generator as code_generator
+    import nodes.code_planner as code_planner
+    import nodes.error_handler_node as error_handler
+    from utils.tracing import traced_llm
+
+    models = {
+        "planner": ScriptedChatModel("planner", metrics, steps_per_plan=args.steps),
+        "coder": ScriptedChatModel("coder", metrics),
+        "error_handler": ScriptedChatModel("error_handler", metrics, steps_per_plan=args.steps),
+    }
+    # Keep the tracing wrapper, so its overhead is part of what is measured
+    code_planner.llm_with_tools = traced_llm("planner", models["planner"])
+    code_generator.llm_with_tools = traced_llm("code_generator", models["coder"])
+    error_handler.llm_with_tools = traced_llm("error_handler", models["error_handler"])
+
+    for node_name, function_names in NODE_FUNCTIONS.items():
+        for function_name in function_names:
+            setattr(main, function_name, metrics.wrap_node(node_name, getattr(main, function_name)))
+
+    wrapped = {}
+    for tools_name in ("PLANNER_TOOLS", "CODE_TOOLS", "ERROR_HANDLER_TOOLS"):
+        tools = [wrapped.setdefault(tool.__name__, metrics.wrap_tool(tool)) for tool in getattr(main, tools_name)]
+        setattr(main, tools_name, tools)
+    # Steps implemented in parallel call the tools directly rather than through a ToolNode
+    code_generator.tools_by_name = {tool.__name__: tool for tool in main.CODE_TOOLS}
+    return models
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="agent-bench-")
+    try:
+        prepare_environment(workdir, args)
+        import main
+        from tools.file_tools import use_project_path
+        from utils.tracing import tracer
+
+        metrics = BenchmarkMetrics()
+        models = instrument(metrics, args)
+        graph = main.build_graph(main.memory, use_async=args.use_async)
+
+        builds_succeeded = 0
+        started = time.perf_counter()
+        for run_index in range(args.runs):
+            # A fresh project per run, so every run starts from the same files and build history
+            project = os.path.join(workdir, f"project-{run_index}")
+            files = generate_project(project, args.entities, args.modules, not args.no_tests, args.filler_methods)
+            for model in models.values():
+                model.project_files = files
+            os.environ["BENCH_MVN_STATE"] = os.path.join(workdir, f"mvn-state-{run_index}")
+
+            config = main.run_config(f"bench-{run_index}")
+            with use_project_path(project):
+                state = main.initial_state("Add a count method to the services of the project.")
+                state["max_parallel_steps"] = args.parallel_steps
+                state["cycles"] = args.cycles
+                if args.use_async:
+                    final = asyncio.run(graph.ainvoke(state, config=config))
+                else:
+                    final = graph.invoke(state, config=config)
+            builds_succeeded += 1 if final["build_success"] else 0
+
+        tracer.write_metrics()
+        report = metrics.report()
+        report["wall_seconds"] = round(time.perf_counter() - started, 3)
+        report["runs"] = args.runs
+        report["builds_succeeded"] = builds_succeeded
+        report["settings"] = {k: v for k, v in vars(args).items() if k not in ("json", "baseline", "keep")}
+        return report
+    finally:
+        if args.keep:
+            print(f"Benchmark files kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the agent graph offline with a scripted LLM and a stub mvn.")
+    parser.add_argument("--entities", type=int, default=20, help="Entities in the synthetic project (5 files each with tests)")
+    parser.add_argument("--modules", type=int, default=1, help="Maven modules the entities are spread over")
+    parser.add_argument("--no-tests", action="store_true", help="Generate the project without test classes")
+    parser.add_argument("--filler-methods", type=int, default=5, help="Extra methods per service, to grow file sizes")
+    parser.add_argument("--steps", type=int, default=3, help="Steps in every plan the scripted model returns")
+    parser.add_argument("--builds", default="compile,test,success",
+                        help="Outcomes of successive builds in a run: success, compile or test, optionally with a "
+                             "failing file count like compile:5 (the last one repeats)")
+    parser.add_argument("--log-lines", type=int, default=2000, help="[INFO] lines the stub mvn prints per build")
+    parser.add_argument("--cycles", type=int, default=4, help="Implementation cycles allowed per run")
+    parser.add_argument("--parallel-steps", type=int, default=1, help="max_parallel_steps of the runs")
+    parser.add_argument("--runs", type=int, default=1, help="Number of runs to measure")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Benchmark the async graph")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Report of an earlier run to compare against; exits with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed growth over the baseline, as a fraction")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated projects and logs")
+    args = parser.parse_args()
+
+    report = run(args)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != report["settings"]:
+            print("WARNING: the baseline was measured with different settings; totals are not comparable")
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        sys.exit(1 if regressions else 0)
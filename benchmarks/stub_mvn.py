@@ -0,0 +1,96 @@
+"""
+Stand-in for the mvn executable used by the benchmarks. Prints a canned Maven log and exits like Maven would.
+
+BENCH_MVN_SCRIPT   comma separated outcomes of successive builds: success, compile or test
+                   (the last one repeats), optionally with the number of failing files,
+                   e.g. "compile,test:1,compile:5,success".
+BENCH_MVN_STATE    file counting the builds run so far.
+BENCH_MVN_LOG_LINES  [INFO] lines printed before the result, to exercise log parsing.
+BENCH_MVN_ERRORS   default number of files reported by a compile or test failure.
+
+-Dtest=... and -DskipTests limit the failing tests to the selected ones, like Surefire would.
+"""
+import os
+import sys
+import time
+
+
+def main() -> int:
+    script = [s.strip() for s in os.getenv("BENCH_MVN_SCRIPT", "success").split(",") if s.strip()] or ["success"]
+    state_file = os.getenv("BENCH_MVN_STATE", "")
+    build_number = 0
+    if state_file:
+        if os.path.exists(state_file):
+            with open(state_file) as f:
+                build_number = int(f.read().strip() or 0)
+        with open(state_file, "w") as f:
+            f.write(str(build_number + 1))
+    outcome, _, count = script[min(build_number, len(script) - 1)].partition(":")
+
+    cwd = os.getcwd()
+    print(f"[INFO] Scanning for projects...")
+    print(f"[INFO] Running stub mvn {' '.join(sys.argv[1:])} (build {build_number + 1}: {outcome})")
+    for i in range(int(os.getenv("BENCH_MVN_LOG_LINES", "2000"))):
+        print(f"[INFO] Compiling source file {i} of the benchmark project")
+    errors = int(count or os.getenv("BENCH_MVN_ERRORS", "3"))
+
+    if outcome == "compile":
+        for path in _java_files(cwd, "src/main/java")[:errors]:
+            for _ in range(2):  # Maven prints compilation errors twice
+                print(f"[ERROR] {path}:[12,17] cannot find symbol")
+                print("  symbol:   class MissingType")
+                print(f"  location: class {os.path.basename(path)[:-5]}")
+        print("[INFO] BUILD FAILURE")
+        print("[ERROR] Failed to execute goal org.apache.maven.plugins:maven-compiler-plugin:3.11.0:compile (default-compile): Compilation failure")
+        return 1
+    tests = _java_files(cwd, "src/test/java")
+    for arg in sys.argv[1:]:
+        if arg == "-DskipTests":
+            tests = []
+        elif arg.startswith("-Dtest="):
+            selected = set(arg[len("-Dtest="):].split(","))
+            tests = [t for t in tests if t.split("/src/test/java/", 1)[1][:-len(".java")].replace("/", ".") in selected]
+    if outcome == "test" and tests:
+        started = time.time()
+        for path in tests[:errors]:
+            _write_surefire_report(cwd, path, started)
+        print("[ERROR] Tests run: 1, Failures: 1, Errors: 0, Skipped: 0")
+        print("[INFO] BUILD FAILURE")
+        print("[ERROR] There are test failures.")
+        return 1
+    print("[INFO] BUILD SUCCESS")
+    return 0
+
+
+def _java_files(root: str, source_dir: str) -> list[str]:
+    found = []
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d != "target" and not d.startswith("."))
+        if f"/{source_dir}" not in directory + "/":
+            continue
+        found.extend(os.path.join(directory, f) for f in sorted(files) if f.endswith(".java"))
+    return found
+
+
+def _write_surefire_report(root: str, test_path: str, started: float):
+    """ A failed-test report where Surefire would write it, in the module owning the test. """
+    module_dir = test_path.split("/src/test/java/", 1)[0]
+    class_path = test_path.split("/src/test/java/", 1)[1][:-len(".java")]
+    classname = class_path.replace("/", ".")
+    reports_dir = os.path.join(module_dir, "target", "surefire-reports")
+    os.makedirs(reports_dir, exist_ok=True)
+    simple_name = classname.rsplit(".", 1)[-1]
+    with open(os.path.join(reports_dir, f"TEST-{classname}.xml"), "w") as f:
+        f.write(f"""<?xml version="1.0" encoding="UTF-8"?>
+<testsuite name="{classname}" tests="1" failures="1" errors="0" skipped="0" time="{time.time() - started:.3f}">
+  <testcase name="findAllStartsEmpty" classname="{classname}" time="0.01">
+    <failure message="expected: empty but was: [entity]" type="org.opentest4j.AssertionFailedError">org.opentest4j.AssertionFailedError: expected: empty but was: [entity]
+	at {classname}.findAllStartsEmpty({simple_name}.java:18)
+</failure>
+  </testcase>
+</testsuite>
+""")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
+import argparse
+import asyncio
+
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.constants import START, END
 from langgraph.graph import add_messages, MessagesState, StateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
@@ -12,15 +14,16 @@ from states.states import CodeState, IndCodingState
 
 load_dotenv()
 
+from tools.changeset import get_changeset
 from tools.file_tools import *
-from nodes.code_generator import generate_code
-from nodes.code_planner import generate_plan_node
+from tools.registry import PLANNER_TOOLS, CODE_TOOLS, ERROR_HANDLER_TOOLS
+from nodes.code_generator import agenerate_code, generate_code
+from nodes.code_planner import agenerate_plan_node, generate_plan_node
 from nodes.orchestrator import implement_coding_plan_node, decide_next_step_node
-from nodes.error_handler_node import error_handler_node
-from nodes.builder_node import builder_node, decide_next_step_after_build
-
-#Build the graph
-builder = StateGraph(CodeState)
+from nodes.error_handler_node import aerror_handler_node, error_handler_node
+from nodes.builder_node import abuilder_node, builder_node, decide_next_step_after_build
+from utils.checkpointer import SqliteCheckpointer
+from utils.tracing import traced_node, tracer
 
 def plan_tool_node_decider(state: CodeState) -> str:
     """
@@ -64,54 +67,117 @@ def decide_post_tool_node(state: CodeState) -> str:
         return "code_planner_node"
     return "code_generator_node"
 
-# Define the nodes
-builder.add_node("code_planner_node", generate_plan_node)
-builder.add_node("code_generator_node", generate_code)
-builder.add_node("tools", ToolNode([read_file, show_project_structure])) # ToolNode is a prebuilt node that handles tool calls
-builder.add_node("code_tools", ToolNode([read_file, show_project_structure, create_or_update_file])) # ToolNode for file creation or update
-builder.add_node("error_handler_tools", ToolNode([read_file, show_project_structure]))
-builder.add_node("implementer_node", implement_coding_plan_node)
-builder.add_node("error_handler_node", error_handler_node)
-builder.add_node("builder_node", builder_node)
-
-# Define the edges
-builder.add_edge(START, "code_planner_node")
-builder.add_conditional_edges("code_planner_node", plan_tool_node_decider)
-
-builder.add_edge("tools", "code_planner_node")
-builder.add_edge("code_tools", "code_generator_node")
-builder.add_edge("error_handler_tools", "error_handler_node")
-
-builder.add_conditional_edges("code_generator_node", code_tool_node_decider)
-builder.add_conditional_edges("implementer_node", decide_next_step_node)
-
-builder.add_conditional_edges("builder_node", decide_next_step_after_build)
-builder.add_conditional_edges("error_handler_node", error_handler_tool_node_decider)
-
-# Define memory for the graph
-memory = MemorySaver()
-
-# Add memory to the graph and compile
-graph = builder.compile(checkpointer=memory)
-
-config = {"configurable": {"thread_id": "thread_1"}, "recursion_limit": 100}
-code_state = {
-    "feature_requirement": "The build process of the project is failing due to context load issues in Test files. Fix the context load issues in the Test files.",
-    "planning_started": False,
-    "impl_started": False,
-    "impl_done": False,
-    "coding_plan": {},
-    "coding_impl": {},
-    "build_success": False,
-    "build_summary": "",
-    "current_implementation_step": 0,
-    "messages": [],
-    "overall_messages": [],
-    "cycles": 3
-}
-
-# Run the graph
-result = graph.invoke(code_state, config=config)
-
-for m in result['overall_messages']:
-    m.pretty_print()
\ No newline at end of file
+def build_graph(checkpointer, use_async: bool = False):
+    """
+    Build and compile the graph. With use_async the LLM and build nodes are coroutines
+    (ainvoke and an asyncio Maven subprocess), so the graph must be run with ainvoke/astream;
+    under an event loop the tool calls of one LLM turn then run concurrently and several
+    runs can share one process. Every node is traced (utils/tracing.py).
+    """
+    builder = StateGraph(CodeState)
+
+    # Define the nodes
+    builder.add_node("code_planner_node", traced_node("code_planner_node", agenerate_plan_node if use_async else generate_plan_node))
+    builder.add_node("code_generator_node", traced_node("code_generator_node", agenerate_code if use_async else generate_code))
+    builder.add_node("tools", ToolNode(PLANNER_TOOLS)) # ToolNode is a prebuilt node that handles tool calls
+    builder.add_node("code_tools", ToolNode(CODE_TOOLS)) # ToolNode for file creation or update
+    builder.add_node("error_handler_tools", ToolNode(ERROR_HANDLER_TOOLS))
+    builder.add_node("implementer_node", traced_node("implementer_node", implement_coding_plan_node))
+    builder.add_node("error_handler_node", traced_node("error_handler_node", aerror_handler_node if use_async else error_handler_node))
+    builder.add_node("builder_node", traced_node("builder_node", abuilder_node if use_async else builder_node))
+
+    # Define the edges
+    builder.add_edge(START, "code_planner_node")
+    builder.add_conditional_edges("code_planner_node", plan_tool_node_decider)
+
+    builder.add_edge("tools", "code_planner_node")
+    builder.add_edge("code_tools", "code_generator_node")
+    builder.add_edge("error_handler_tools", "error_handler_node")
+
+    builder.add_conditional_edges("code_generator_node", code_tool_node_decider)
+    builder.add_conditional_edges("implementer_node", decide_next_step_node)
+
+    builder.add_conditional_edges("builder_node", decide_next_step_after_build)
+    builder.add_conditional_edges("error_handler_node", error_handler_tool_node_decider)
+
+    # Add memory to the graph and compile
+    return builder.compile(checkpointer=checkpointer)
+
+# Define memory for the graph. Checkpoints are kept on disk so an interrupted run can be resumed.
+memory = SqliteCheckpointer()
+
+graph = build_graph(memory)
+async_graph = build_graph(memory, use_async=True)
+
+DEFAULT_REQUIREMENT = "The build process of the project is failing due to context load issues in Test files. Fix the context load issues in the Test files."
+
+def initial_state(feature_requirement: str) -> CodeState:
+    """ State of a new run of the project in the current context; the project's changeset is started afresh. """
+    get_changeset(project_path()).clear()
+    return {
+        "feature_requirement": feature_requirement,
+        "planning_started": False,
+        "impl_started": False,
+        "impl_done": False,
+        "coding_plan": {},
+        "coding_impl": {},
+        "build_success": False,
+        "build_summary": "",
+        "error_handling_started": False,
+        "current_implementation_step": 0,
+        "messages": [],
+        "overall_messages": [],
+        "cycles": 3,
+        "max_parallel_steps": 4,
+        "build_error_count": None,
+        "build_compile_error_count": None,
+        "build_test_selection": None,
+        "snapshots": [],
+        "failure_history": []
+    }
+
+def run_config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}, "recursion_limit": 100}
+
+def resume(thread_id: str, use_async: bool = False):
+    """
+    Continue a previous run from the last node that completed, using the checkpoints saved for its thread id.
+    With use_async the run continues on the async graph. Returns the final state, or None if there is nothing to resume.
+    """
+    config = run_config(thread_id)
+    snapshot = graph.get_state(config)
+    if not snapshot.values:
+        print(f"No checkpoint found for thread {thread_id}")
+        return None
+    if not snapshot.next:
+        print(f"Thread {thread_id} already finished")
+        return snapshot.values
+    print(f"Resuming thread {thread_id} at {', '.join(snapshot.next)}")
+    if use_async:
+        return asyncio.run(async_graph.ainvoke(None, config=config))
+    return graph.invoke(None, config=config)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan, implement and build a feature requirement on a Spring Boot project.")
+    parser.add_argument("--requirement", default=DEFAULT_REQUIREMENT, help="Feature requirement to implement")
+    parser.add_argument("--thread-id", default="thread_1", help="Checkpoint thread id of the run")
+    parser.add_argument("--resume", action="store_true", help="Continue the run of --thread-id from its last checkpoint")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Run the graph on an event loop with the async nodes")
+    args = parser.parse_args()
+
+    # Run the graph
+    if args.resume:
+        result = resume(args.thread_id, args.use_async)
+    else:
+        # A fresh run must not pick up the history of an earlier run with the same thread id
+        memory.delete_thread(args.thread_id)
+        if args.use_async:
+            result = asyncio.run(async_graph.ainvoke(initial_state(args.requirement), config=run_config(args.thread_id)))
+        else:
+            result = graph.invoke(initial_state(args.requirement), config=run_config(args.thread_id))
+
+    tracer.write_metrics()
+    print(tracer.llm_usage())
+    if result:
+        for m in result['overall_messages']:
+            m.pretty_print()
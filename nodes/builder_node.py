@@ -1,12 +1,23 @@
-import re
+import asyncio
+import os
 
+from langchain_core.messages import HumanMessage
 from langchain_openai import ChatOpenAI
 
+import tools.file_tools as file_tools
 from states.states import CodeState
-from tools.file_tools import build_project
+from tools.diagnostics import collect_diagnostics, fingerprint, render_summary
+from tools.maven_build import BuildLogParser, BuildResult, abuild_project, build_project
+from tools.snapshots import WORKSPACE_SNAPSHOTS, best_snapshot, comparable_scores, get_snapshot_store
+from tools.test_selection import selection_key
 
 # llm = ChatOpenAI(model="gpt-4o")
 
+# A run stops once a build fails with the same problems this many times: further fix cycles are not making progress.
+NO_PROGRESS_MAX_REPEATS = int(os.getenv("NO_PROGRESS_MAX_REPEATS", "3"))
+# Characters of a fix plan kept in the failure history
+PLAN_OUTLINE_CHARS = 800
+
 SUMMARY_PROMPT = """
 You are a Java software engineer responsible for analyzing the build logs and summarizing the build process.
 Your job is to:
@@ -26,27 +37,185 @@ def builder_node(state: CodeState):
     If the build fails, it returns the relevant error messages from the build process.
     """
     print("In builder node")
+    # A failed build starts a new error handling turn
+    state["error_handling_started"] = False
     try:
         # Attempt to build the project
-        build_project()
-        state["build_success"] = True
+        result = build_project()
+        if result.success and result.selected_tests is not None:
+            # Only the affected tests ran: the build that ends the run has to pass the full suite
+            print("Affected tests passed, running the full test suite")
+            result = build_project(all_tests=True)
+    except Exception as e:
+        # Maven could not be started at all
+        state["build_success"] = False
+        state["build_summary"] = f"Could not run the build: {e}"
+        return state
+    return apply_build_result(state, result)
+
+async def abuilder_node(state: CodeState):
+    """
+    Async variant of builder_node: Maven runs as an asyncio subprocess and the
+    reports are read off the event loop.
+    """
+    print("In builder node")
+    state["error_handling_started"] = False
+    try:
+        result = await abuild_project()
+        if result.success and result.selected_tests is not None:
+            print("Affected tests passed, running the full test suite")
+            result = await abuild_project(all_tests=True)
     except Exception as e:
-        # If the build fails, capture the error and set the state accordingly
         state["build_success"] = False
+        state["build_summary"] = f"Could not run the build: {e}"
+        return state
+    return await asyncio.to_thread(apply_build_result, state, result)
+
+def apply_build_result(state: CodeState, result: BuildResult):
+    """ Record the outcome of a build in the state, summarizing the diagnostics of a failed build. """
+    print(f"Build {'succeeded' if result.success else 'failed'} in {result.duration:.1f}s")
+    state["build_success"] = result.success
+    state["build_error_count"] = 0
+    state["build_compile_error_count"] = 0
+    state["build_test_selection"] = selection_key(result.selected_tests)
+    if not result.success:
+        # If the build fails, capture the errors and set the state accordingly
         # build_summary = llm.invoke(
         #     SUMMARY_PROMPT.replace("${build_log}", str(e))
         # )
-        state["build_summary"] = str(extract_failures_and_warnings(str(e)))
+        diagnostics = collect_diagnostics(result.parser.errors, file_tools.project_path(), since=result.started)
+        if diagnostics:
+            state["build_summary"] = "\n".join(result.notes() + [render_summary(diagnostics)])
+        else:
+            state["build_summary"] = result.summary()
+        # A build stopped early has at least as many problems as it reported; one that failed without diagnostics has at least one
+        state["build_error_count"] = max(len(diagnostics), result.parser.compilation_error_count, 1)
+        # Unlike test failures, these do not depend on which tests the build selected
+        state["build_compile_error_count"] = max(sum(1 for d in diagnostics if d.kind in ("compile", "dependency")),
+                                                 result.parser.compilation_error_count)
+        repeats = record_failure(state, fingerprint(diagnostics, fallback=result.summary()))
+        if repeats >= NO_PROGRESS_MAX_REPEATS:
+            print(f"The build failed with the same problems {repeats} times, stopping")
+            state["overall_messages"].append(HumanMessage(
+                content=f"Stopping: the build failed {repeats} times with the same problems and the fix cycles are not making progress."))
+        elif WORKSPACE_SNAPSHOTS and not (repeats > 1 and discard_repeated_cycle(state)):
+            rollback_if_worse(state)
     return state
 
+def record_failure(state: CodeState, failure: str) -> int:
+    """
+    Add the failed build to the run's failure history, with the plan that was implemented before it.
+    Returns how many builds of the run have failed with these problems.
+    """
+    history = state.setdefault("failure_history", [])
+    history.append({
+        "fingerprint": failure,
+        "error_count": state["build_error_count"],
+        "cycles_left": state["cycles"],
+        "plan": plan_outline(state.get("coding_plan") or {}),
+        "rolled_back_to": None,
+    })
+    return failure_repeats(history)
+
+def failure_repeats(history: list[dict]) -> int:
+    """ Number of failed builds with the same fingerprint as the last one, including it. """
+    if not history:
+        return 0
+    return sum(1 for entry in history if entry["fingerprint"] == history[-1]["fingerprint"])
+
+def plan_outline(plan: dict) -> str:
+    steps = "; ".join(str(step.get("description", "")) for step in plan.get("steps", []) if isinstance(step, dict))
+    outline = f"{plan.get('summary', '')} Steps: {steps}" if steps else str(plan.get("summary", ""))
+    return outline[:PLAN_OUTLINE_CHARS] + ("..." if len(outline) > PLAN_OUTLINE_CHARS else "")
+
+def failed_attempts(history: list[dict]) -> str:
+    """
+    The fix plans already implemented while the build failed with the last build's problems, and what each led to,
+    for the error handler to try something else. Empty when these problems are new.
+    """
+    if len(history) < 2:
+        return ""
+    current = history[-1]["fingerprint"]
+    lines = []
+    for before, after in zip(history, history[1:]):
+        if before["fingerprint"] != current:
+            continue
+        if after["fingerprint"] == current:
+            outcome = "the problems stayed the same" + (" and its changes were rolled back" if after["rolled_back_to"] else "")
+        else:
+            outcome = f"it led to different problems ({after['error_count']}), which later turned back into these"
+        lines.append(f"{len(lines) + 1}. {after['plan'] or '(no plan recorded)'}\n   Result: {outcome}.")
+    return "\n".join(lines)
+
+def discard_repeated_cycle(state: CodeState) -> bool:
+    """
+    The last fix cycle left the build failing exactly as before it: restore the snapshot taken before the cycle,
+    so the next attempt starts from the tree the problems were reported on instead of piling up changes that did not help.
+    A cycle that reduced the number of problems is kept even if the fingerprints match.
+    """
+    snapshots = state.get("snapshots", [])
+    if not snapshots or snapshots[-1].get("fingerprint") != state["failure_history"][-1]["fingerprint"]:
+        return False
+    snapshot = snapshots[-1]
+    before, now = comparable_scores(snapshot, state["build_error_count"], state["build_compile_error_count"], state["build_test_selection"])
+    if before is None or now < before:
+        return False
+    try:
+        changed = get_snapshot_store(file_tools.project_path()).restore(snapshot["id"])
+    except Exception as e:
+        print(f"Could not roll back to snapshot {snapshot['id']}: {e}")
+        return False
+    print(f"The build failed with the same problems as before the last cycle, rolled back its {len(changed)} changed files")
+    state["failure_history"][-1]["rolled_back_to"] = snapshot["id"]
+    return True
+
+def tree_fingerprint(state: CodeState):
+    """ Fingerprint of the failures of the project tree as it is now: the last build's, or the restored snapshot's after a rollback. """
+    history = state.get("failure_history")
+    if not history or state.get("build_success"):
+        return None
+    restored = history[-1].get("rolled_back_to")
+    if restored:
+        return next((s.get("fingerprint") for s in state.get("snapshots", []) if s["id"] == restored), None)
+    return history[-1]["fingerprint"]
+
+def rollback_if_worse(state: CodeState):
+    """
+    If the tree just built has more problems than the best snapshot of this run, restore that snapshot,
+    so the next fix cycle starts from the best known state instead of compounding the damage.
+    """
+    best = best_snapshot(state.get("snapshots", []), state["build_error_count"], state["build_compile_error_count"],
+                         state["build_test_selection"])
+    if best is None:
+        return
+    try:
+        changed = get_snapshot_store(file_tools.project_path()).restore(best["id"])
+    except Exception as e:
+        print(f"Could not roll back to snapshot {best['id']}: {e}")
+        return
+    if state.get("failure_history"):
+        state["failure_history"][-1]["rolled_back_to"] = best["id"]
+    print(f"Rolled back {len(changed)} files to snapshot {best['id']} ({best['error_count']} problems instead of {state['build_error_count']})")
+    state["build_summary"] = (
+        f"The last fix cycle made the build worse ({state['build_error_count']} problems), so its changes were rolled back. "
+        f"The project is again in the state it had with {best['cycles_left']} cycles left, whose build reported "
+        f"{best['error_count']} problems:\n{best['build_summary']}"
+    )
+    state["build_error_count"] = best["error_count"]
+    state["build_compile_error_count"] = best.get("compile_error_count")
+    state["build_test_selection"] = best.get("test_selection")
+
 def decide_next_step_after_build(state: CodeState) -> str:
     """
     This node decides the next step after the build process.
     If the build was successful, it returns '__end__' to indicate completion.
-    If the build failed, it returns 'code_generator_node' to retry code generation.
+    If the build failed, it returns 'error_handler_node' to plan a fix, unless the build keeps failing
+    with the same problems (see NO_PROGRESS_MAX_REPEATS).
     """
     if state["build_success"]:
         return "__end__"
+    if failure_repeats(state.get("failure_history", [])) >= NO_PROGRESS_MAX_REPEATS:
+        return "__end__"
     state["messages"] = []
     return "error_handler_node"
 
@@ -57,30 +226,12 @@ def extract_failures_and_warnings(log_str):
     returns a formatted string of all lines starting with [ERROR] or [WARNING].
     Otherwise, returns an empty string.
     """
-    error_re   = re.compile(r'^\[ERROR\]')
-    warning_re = re.compile(r'^\[WARNING\]')
-
-    lines = log_str.splitlines()
-    build_failed = any("BUILD FAILURE" in line for line in lines)
-
-    if not build_failed:
+    parser = BuildLogParser()
+    for line in log_str.splitlines():
+        parser.feed(line)
+    if not parser.build_failure:
         return ""
-
-    # Collect errors and warnings
-    errors = [line.strip() for line in lines if error_re.match(line)]
-    warnings = [line.strip() for line in lines if warning_re.match(line)]
-
-    formatted = []
-
-    if errors:
-        formatted.append("=== ERRORS ===")
-        formatted.extend(errors)
-
-    if warnings:
-        formatted.append("\n=== WARNINGS ===")
-        formatted.extend(warnings)
-
-    return "\n".join(formatted)
+    return parser.format()
 
 # print(builder_node(
 #     {
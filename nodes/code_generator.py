@@ -1,6 +1,7 @@
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, ToolMessage
 from langchain_openai import ChatOpenAI
 
+import asyncio
 import json
 from states.states import CodeState
 
@@ -9,12 +10,26 @@ You are “SpringGen,” an expert AI Code Generator for Java Spring Boot applic
 Your job is to take a single implementation step from a pre-defined JSON plan and produce the exact Java (or configuration) code required, writing it into the correct file(s).
 
 Capabilities (via provided tool functions):
-  • get_project_structure() → string[]  
+  • show_project_structure() → string[]  
     – returns all files and folders under the root directory.  
+  • list_project_files(path_prefix, pattern, max_depth, collapsed, cursor, page_size) → {entries, total, next_cursor}  
+    – lists files filtered by directory prefix and glob, paginated, optionally collapsed to "dir/ (N files)" summaries.  
+  • find_java_symbol(name, annotation, kind, limit) → string[]  
+    – finds classes, interfaces, methods and constructors by name and/or annotation (e.g. "RestController", "SpringBootTest") and returns "path:line" with the signature.  
   • read_file(path: string) → string  
     – returns the contents of a file.  
+  • read_files(files: string[], max_bytes) → string  
+    – returns the contents of several files (optionally "path:start-end" line ranges) in one call; use it to load all the files you need at once.  
+  • search_project(query, regex, case_sensitive, path_prefix, pattern, limit) → string[]  
+    – finds text in the project's files like grep (property keys, bean names, strings, exception messages) and returns "path:line: text".  
+  • lookup_maven_dependency(artifact, limit) → string[]  
+    – returns the versions of "groupId:artifactId" (or an artifactId) managed by the project's parent/BOMs, declared by its modules, and present in the local Maven repository; without an artifact, the modules' parent, Java and Spring Boot versions.  
   • create_or_update_file(path: string, file_contents: string) → void  
     – overwrites or creates the file at the given path with the provided content.   
+  • edit_file(file_name: string, edits: [{search, replace}]) → string  
+    – replaces exact snippets of an existing file; only the changed lines are sent.  
+  • apply_patch(patch: string) → string  
+    – applies a unified diff to one or more files.  
 
 Input (in the user message):
 {
@@ -31,10 +46,10 @@ Input (in the user message):
 
 Behavior:
 
-1. **Load context**. Before generating code, inspect existing files by calling read_file() and verify package names, imports, and coding style.
+1. **Load context**. Before generating code, inspect existing files by calling read_files() with all of them at once and verify package names, imports, and coding style.
 2. **Generate code**. For the given description, produce only the code snippets needed to fulfill that step.
 3. **Preserve conventions**. Follow the existing project’s naming, formatting, and architectural patterns.
-4 **Write files**. For each entry in affectedFiles, call write_file(path, content) with the full file content (including package declaration and imports).
+4 **Write files**. For each entry in affectedFiles, change existing files with edit_file (or apply_patch), sending only the lines that change, and create new files with create_or_update_file(path, content) with the full file content (including package declaration and imports). If an edit is rejected, use the lines quoted in the error to retry.
 5. **Minimize scope**. Modify only the classes or methods relevant to this step—do not introduce unrelated changes.
 6. **Return confirmation JSON**. After writing, output exactly:
 {
@@ -46,15 +61,32 @@ Behavior:
 No additional text or commentary.
 """
 
+COMPILE_ERRORS_PROMPT = """
+The files you changed in this step do not compile. Fix these errors, then confirm the step again:
+${errors}
+"""
+
 NEXT_STEP_PROMPT = """
 Given the below requirement by the orchestrator for a Java project, make the code changes or carry out the actions as described in the requirement:
 ${requirement}
 """
 
-from tools.file_tools import *
+from tools.compile_check import COMPILE_CHECK_MAX_ATTEMPTS, FAST_COMPILE_CHECK, check_sources
+from tools.diagnostics import render_summary
+from tools.file_tools import project_path
+from tools.registry import CODE_TOOLS
+from utils.context_compaction import written_paths
+from utils.llm_cache import cached
+from utils.prompts import assemble_prompt, system_prompt
+from utils.tracing import traced_llm
 
 llm = ChatOpenAI(model="gpt-4o")
-llm_with_tools = llm.bind_tools([read_file, create_or_update_file, show_project_structure])
+llm_with_tools = traced_llm("code_generator", cached(llm.bind_tools(CODE_TOOLS)))
+tools_by_name = {tool.__name__: tool for tool in CODE_TOOLS}
+system_prompt(SYSTEM_PROMPT)
+
+# Upper bound on LLM turns for a step implemented outside the graph by run_step
+MAX_STEP_TURNS = 25
 
 # Define a lang graph node that generates code based on the requirement
 def generate_code(state: CodeState):
@@ -63,22 +95,121 @@ def generate_code(state: CodeState):
     Generate code based on the requirement provided in the state.
     The state should contain the 'requirement' key with the requirement text.
     """
+    coding_state_info = prepare_step_messages(state)
+
+    # Here you would implement the logic to generate code based on the requirement.
+    state["messages"].append(llm_with_tools.invoke(assemble_prompt(SYSTEM_PROMPT, state["messages"])))
+    if compile_feedback(state, coding_state_info):
+        state["messages"].append(llm_with_tools.invoke(assemble_prompt(SYSTEM_PROMPT, state["messages"])))
+    return finish_step_turn(state, coding_state_info)
+
+
+async def agenerate_code(state: CodeState):
+    """ Async variant of generate_code. """
+    print("In generate_code node")
+    coding_state_info = prepare_step_messages(state)
+    state["messages"].append(await llm_with_tools.ainvoke(assemble_prompt(SYSTEM_PROMPT, state["messages"])))
+    if await asyncio.to_thread(compile_feedback, state, coding_state_info):
+        state["messages"].append(await llm_with_tools.ainvoke(assemble_prompt(SYSTEM_PROMPT, state["messages"])))
+    return finish_step_turn(state, coding_state_info)
+
+
+def prepare_step_messages(state: CodeState) -> dict:
+    """ Start the conversation of the current implementation step if needed; returns its coding_impl entry. """
     curr_step = state["current_implementation_step"]
     coding_state_info = state["coding_impl"][curr_step]
     step_info = state["coding_plan"]["steps"][coding_state_info["coding_step"]-1]
     if coding_state_info["coding_started"] is False:
-        state["messages"].append(HumanMessage(content=SYSTEM_PROMPT))
         state["messages"].append(HumanMessage(content=NEXT_STEP_PROMPT.replace("${requirement}", dict_to_string(step_info))))
         coding_state_info["coding_started"] = True
+    return coding_state_info
 
-    # Here you would implement the logic to generate code based on the requirement.
-    state["messages"].append(llm_with_tools.invoke(state["messages"]))
+
+def compile_feedback(state: CodeState, coding_state_info: dict) -> bool:
+    """
+    When the generator has finished the step (no more tool calls), compile the files the step wrote and,
+    if they do not compile, append the errors for it to fix. Returns True if feedback was appended.
+    At most COMPILE_CHECK_MAX_ATTEMPTS times per step; after that the full build reports what is left.
+    """
+    if not FAST_COMPILE_CHECK or getattr(state["messages"][-1], "tool_calls", None):
+        return False
+    if coding_state_info.get("compile_checks", 0) >= COMPILE_CHECK_MAX_ATTEMPTS:
+        return False
+    step_info = state["coding_plan"]["steps"][coding_state_info["coding_step"]-1]
+    step_prompt = NEXT_STEP_PROMPT.replace("${requirement}", dict_to_string(step_info))
+    started = max((i for i, m in enumerate(state["messages"]) if isinstance(m, HumanMessage) and m.content == step_prompt), default=0)
+    feedback = compile_errors_message(files_written(state["messages"][started:]))
+    if feedback is None:
+        return False
+    coding_state_info["compile_checks"] = coding_state_info.get("compile_checks", 0) + 1
+    state["messages"].append(feedback)
+    return True
+
+
+def compile_errors_message(files: list[str]):
+    """ The feedback message for the compile errors of the given files, None if they compile or cannot be checked. """
+    diagnostics = check_sources(project_path(), files)
+    if not diagnostics:
+        return None
+    print(f"Fast compile check found {len(diagnostics)} errors")
+    return HumanMessage(content=COMPILE_ERRORS_PROMPT.replace("${errors}", render_summary(diagnostics)))
+
+
+def files_written(messages: list) -> list[str]:
+    """ Files the generator wrote or edited in the given messages, in order of first write. """
+    files = {}
+    for message in messages:
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            files.update(dict.fromkeys(written_paths(tool_call)))
+    return list(files)
+
+
+def finish_step_turn(state: CodeState, coding_state_info: dict):
     coding_state_info["coding_done"] = True
-    state["coding_impl"][curr_step] = coding_state_info
+    state["coding_impl"][state["current_implementation_step"]] = coding_state_info
     # state["messages"].extend(coding_state_info["messages"])
     return state
 
 
+def run_step(step_info: dict) -> list:
+    """
+    Implement a single plan step outside the graph, running the generate/tool-call loop
+    that code_generator_node and code_tools perform inside it.
+    Used by the orchestrator to implement independent steps concurrently.
+    Returns the messages exchanged for the step.
+    """
+    print(f"Implementing step {step_info.get('id')}")
+    messages = [HumanMessage(content=NEXT_STEP_PROMPT.replace("${requirement}", dict_to_string(step_info)))]
+    compile_checks = 0
+    for _ in range(MAX_STEP_TURNS):
+        response = llm_with_tools.invoke(assemble_prompt(SYSTEM_PROMPT, messages))
+        messages.append(response)
+        if not response.tool_calls:
+            if not FAST_COMPILE_CHECK or compile_checks >= COMPILE_CHECK_MAX_ATTEMPTS:
+                return messages
+            feedback = compile_errors_message(files_written(messages))
+            if feedback is None:
+                return messages
+            compile_checks += 1
+            messages.append(feedback)
+            continue
+        for tool_call in response.tool_calls:
+            messages.append(ToolMessage(content=run_tool_call(tool_call), tool_call_id=tool_call["id"], name=tool_call["name"]))
+    raise Exception(f"Step {step_info.get('id')} was not completed within {MAX_STEP_TURNS} LLM turns")
+
+
+def run_tool_call(tool_call: dict) -> str:
+    """ Execute one tool call from an AIMessage and return its result as the ToolMessage content. """
+    tool = tools_by_name.get(tool_call["name"])
+    if tool is None:
+        return f"Error: {tool_call['name']} is not a valid tool, try one of [{', '.join(tools_by_name)}]."
+    try:
+        result = tool(**tool_call["args"])
+    except Exception as e:
+        return f"Error: {repr(e)}\n Please fix your mistakes."
+    return result if isinstance(result, str) else json.dumps(result)
+
+
 def dict_to_string(obj):
     return json.dumps(obj, indent=2, sort_keys=True)
 
@@ -13,16 +13,26 @@ Your goal is to take a user’s feature request and synthesize a precise, action
 Capabilities (via provided tool functions):
   • show_project_structure() → string[]  
     – returns all files and folders under the root directory.  
+  • list_project_files(path_prefix, pattern, max_depth, collapsed, cursor, page_size) → {entries, total, next_cursor}  
+    – lists files filtered by directory prefix and glob, paginated, optionally collapsed to "dir/ (N files)" summaries.  
+  • find_java_symbol(name, annotation, kind, limit) → string[]  
+    – finds classes, interfaces, methods and constructors by name and/or annotation (e.g. "RestController", "SpringBootTest") and returns "path:line" with the signature.  
   • read_file(path: string) → string  
     – returns the contents of a file.  
+  • read_files(files: string[], max_bytes) → string  
+    – returns the contents of several files (optionally "path:start-end" line ranges) in one call; use it to load all the files you need at once.  
+  • search_project(query, regex, case_sensitive, path_prefix, pattern, limit) → string[]  
+    – finds text in the project's files like grep (property keys, bean names, strings, exception messages) and returns "path:line: text".  
+  • lookup_maven_dependency(artifact, limit) → string[]  
+    – returns the versions of "groupId:artifactId" (or an artifactId) managed by the project's parent/BOMs, declared by its modules, and present in the local Maven repository; without an artifact, the modules' parent, Java and Spring Boot versions.  
  
 
 Behavior:
 1. **Understand the requirement.** Analyze the user’s feature request to identify the necessary code changes. Feel free to make assumptions for missing details, but document them in the plan.
-2. **Discover relevant code.** Use `show_project_structure()` and `read_file()` to locate existing components (controllers, services, repositories, DTOs, config).
-3. **Load metadata.** Gather information about existing dependencies and versions from the project structure and relevant files (e.g., `pom.xml` for Maven projects).
+2. **Discover relevant code.** Use `list_project_files()` (start with `collapsed=True` on large projects and narrow down with `path_prefix`), `find_java_symbol()`, `search_project()` and `read_files()` to locate existing components (controllers, services, repositories, DTOs, config).
+3. **Load metadata.** Gather information about existing dependencies and versions with `lookup_maven_dependency()` (no argument for the Java and Spring Boot versions, "groupId:artifactId" for a library) and the relevant files (e.g., `pom.xml` for Maven projects).
 4. **Enforce version constraints.**  
-   - Whenever you suggest adding or updating a dependency, you **must** choose a version that is equal to or compatible with `springBootVersion` (per Spring Boot’s own BOM) and doesn’t exceed the project’s `javaVersion`.  
+   - Whenever you suggest adding or updating a dependency, you **must** choose a version that is equal to or compatible with `springBootVersion` (per Spring Boot’s own BOM; prefer the version `lookup_maven_dependency()` reports as managed, and leave `<version>` out when it is managed) and doesn’t exceed the project’s `javaVersion`.  
    - If you need a newer major version of a library, you must flag that as a manual upgrade step (outside your plan).
 4. **Plan in detail.** Produce a JSON plan with:
    • `steps`: an ordered list where each step includes:
@@ -66,10 +76,14 @@ Given the below User requirement Spring Boot project, create a detailed plan for
 ${requirement}
 """
 
-from tools.file_tools import *
+from tools.registry import PLANNER_TOOLS
+from utils.llm_cache import cached
+from utils.prompts import assemble_prompt, system_prompt
+from utils.tracing import traced_llm
 
 llm = ChatOpenAI(model="gpt-4o")
-llm_with_tools = llm.bind_tools([read_file, show_project_structure])
+llm_with_tools = traced_llm("planner", cached(llm.bind_tools(PLANNER_TOOLS)))
+system_prompt(SYSTEM_PROMPT)
 
 # Define a lang graph node that generates code based on the requirement
 def generate_plan_node(state: CodeState):
@@ -78,13 +92,21 @@ def generate_plan_node(state: CodeState):
     Generate plan based on the requirement provided in the state.
     The state should contain the 'requirement' key with the requirement text.
     """
+    prepare_plan_messages(state)
+
+    # Here you would implement the logic to generate code based on the requirement.
+    state["messages"].append(llm_with_tools.invoke(assemble_prompt(SYSTEM_PROMPT, state["messages"])))
+    return state
+
+async def agenerate_plan_node(state: CodeState):
+    """ Async variant of generate_plan_node. """
+    print("In planner node")
+    prepare_plan_messages(state)
+    state["messages"].append(await llm_with_tools.ainvoke(assemble_prompt(SYSTEM_PROMPT, state["messages"])))
+    return state
+
+def prepare_plan_messages(state: CodeState):
+    # Later turns follow tool results, which the model continues from without another instruction
     if state["planning_started"] is False:
-        state["messages"].append(HumanMessage(content=SYSTEM_PROMPT))
         state["messages"].append(HumanMessage(content=NEXT_STEP_PROMPT.replace("${requirement}", state["feature_requirement"])))
         state["planning_started"] = True
-    else:
-        state["messages"].append(HumanMessage(content="Continuing with the planning..."))
-
-    # Here you would implement the logic to generate code based on the requirement.
-    state["messages"].append(llm_with_tools.invoke(state["messages"]))
-    return state
\ No newline at end of file
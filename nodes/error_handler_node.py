@@ -1,8 +1,12 @@
 from langchain_core.messages import HumanMessage
 from langchain_openai import ChatOpenAI
 
+from nodes.builder_node import failed_attempts
 from states.states import CodeState
-from tools.file_tools import read_file, show_project_structure
+from tools.registry import ERROR_HANDLER_TOOLS
+from utils.llm_cache import cached
+from utils.prompts import assemble_prompt, system_prompt
+from utils.tracing import traced_llm
 
 SYSTEM_PROMPT = """
 You are “FixPlanner,” an expert AI that analyzes Java and Spring Boot build errors and creates a precise, step-by-step plan for fixing them.
@@ -12,13 +16,18 @@ You receive:
 - The latest project structure and optionally the current build metadata.
 - Access to tools:
   • show_project_structure() → string[]  
+  • list_project_files(path_prefix, pattern, max_depth, collapsed, cursor, page_size) → {entries, total, next_cursor}  
+  • find_java_symbol(name, annotation, kind, limit) → string[]  
   • read_file(path: string) → string  
+  • read_files(files: string[], max_bytes) → string  
+  • search_project(query, regex, case_sensitive, path_prefix, pattern, limit) → string[]  
+  • lookup_maven_dependency(artifact, limit) → string[]  
 
 Your job:
 1. **Analyze errors.** For each build error, determine:
    - What caused it (e.g., missing import, undefined class, incompatible method call, incompatible versions of dependencies).
-   - Where the root cause is located in the source tree (use list_files + read_file if needed).
-   - Whether it requires code to be edited, deleted, refactored, or dependency updates.
+   - Where the root cause is located in the source tree (use find_java_symbol to jump to the class or method named in the error, search_project for property keys, bean names or messages, and read_file if needed).
+   - Whether it requires code to be edited, deleted, refactored, or dependency updates (use lookup_maven_dependency to pick a version that the project manages and that is available locally).
 
 2. **Plan actionable fixes.** Produce a plan object like this:
 ```jsonc
@@ -57,8 +66,16 @@ ${build_summary}
 Make sure to respond with only the JSON formatted plan and nothing else.
 """
 
+PRIOR_ATTEMPTS_PROMPT = """
+The build has failed with these same problems before. These fix plans were already implemented and did not resolve them:
+${attempts}
+
+Do not repeat them. Look for a different root cause (for example a dependency, configuration or test setup problem rather than the line named in the error) or a different way to fix it.
+"""
+
 llm = ChatOpenAI(model="gpt-4o")
-llm_with_tools = llm.bind_tools([read_file, show_project_structure])
+llm_with_tools = traced_llm("error_handler", cached(llm.bind_tools(ERROR_HANDLER_TOOLS)))
+system_prompt(SYSTEM_PROMPT)
 
 def error_handler_node(state: CodeState):
     """
@@ -66,12 +83,30 @@ def error_handler_node(state: CodeState):
     It generates a plan to fix the errors based on the build summary provided in the state.
     The state should contain the 'build_summary' key with the summary of the build process.
     """
-
-    state["messages"].append(HumanMessage(content=SYSTEM_PROMPT))
-    state["messages"].append(HumanMessage(content=NEXT_STEP_PROMPT.replace("${build_summary}", state["build_summary"])))
+    prepare_error_messages(state)
 
     # Here you would implement the logic to generate a plan based on the build summary.
-    state["messages"].append(llm_with_tools.invoke(state["messages"]))
+    state["messages"].append(llm_with_tools.invoke(assemble_prompt(SYSTEM_PROMPT, state["messages"])))
+    return finish_error_handling(state)
+
+async def aerror_handler_node(state: CodeState):
+    """ Async variant of error_handler_node. """
+    prepare_error_messages(state)
+    state["messages"].append(await llm_with_tools.ainvoke(assemble_prompt(SYSTEM_PROMPT, state["messages"])))
+    return finish_error_handling(state)
+
+def prepare_error_messages(state: CodeState):
+    # Later turns follow tool results, which the model continues from without another instruction
+    if state.get("error_handling_started"):
+        return
+    state["error_handling_started"] = True
+    content = NEXT_STEP_PROMPT.replace("${build_summary}", state["build_summary"])
+    attempts = failed_attempts(state.get("failure_history", []))
+    if attempts:
+        content += PRIOR_ATTEMPTS_PROMPT.replace("${attempts}", attempts)
+    state["messages"].append(HumanMessage(content=content))
+
+def finish_error_handling(state: CodeState):
     state["impl_started"] = False
     state["impl_done"] = False
-    return state
\ No newline at end of file
+    return state
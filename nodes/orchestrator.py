@@ -3,7 +3,13 @@ from typing import Literal
 
 from langchain_core.messages import HumanMessage
 
+import tools.file_tools as file_tools
+from nodes.builder_node import tree_fingerprint
+from nodes.code_generator import run_step
+from nodes.plan_scheduler import run_plan
 from states.states import CodeState
+from tools.snapshots import WORKSPACE_SNAPSHOTS, get_snapshot_store
+from utils.context_compaction import archive_messages
 
 
 def clean_json_string(last_message):
@@ -29,6 +35,8 @@ def implement_coding_plan_node(state: CodeState):
     if not state["impl_started"]:
         state["impl_started"] = True
         state["cycles"] -= 1
+        if WORKSPACE_SNAPSHOTS:
+            snapshot_workspace(state)
 
         last_message = state["messages"][-1].content
         last_message = clean_json_string(last_message)
@@ -49,6 +57,9 @@ def implement_coding_plan_node(state: CodeState):
                 "coding_done": False
             }
 
+        if state.get("max_parallel_steps", 1) > 1 and state["coding_impl"]:
+            implement_plan_in_parallel(state)
+
     state["impl_done"] = True
 
     # Simulating applying the coding plan
@@ -56,11 +67,54 @@ def implement_coding_plan_node(state: CodeState):
         if val["coding_done"] is False:
             state["current_implementation_step"] = val["coding_step"]
             state["impl_done"] = False
-            state["overall_messages"].extend(state["messages"])
+            state["overall_messages"].extend(archive_messages(state["messages"]))
             state["messages"] = []
 
     return state
 
+def snapshot_workspace(state: CodeState):
+    """
+    Snapshot the project before the cycle changes it. The snapshot is scored with the result of the
+    last build, which ran on exactly this tree (no score before the first build).
+    """
+    try:
+        snapshot_id = get_snapshot_store(file_tools.project_path()).take(label=f"before cycle with {state['cycles']} cycles left")
+    except Exception as e:
+        print(f"Could not snapshot the workspace: {e}")
+        return
+    state.setdefault("snapshots", []).append({
+        "id": snapshot_id,
+        "cycles_left": state["cycles"],
+        "error_count": state.get("build_error_count"),
+        "compile_error_count": state.get("build_compile_error_count"),
+        "test_selection": state.get("build_test_selection"),
+        "build_summary": state["build_summary"],
+        "fingerprint": tree_fingerprint(state),
+    })
+
+def implement_plan_in_parallel(state: CodeState):
+    """
+    Implements all steps of the current coding plan with up to state["max_parallel_steps"] steps
+    running at once, ordered by their dependencies. Steps are marked done so the graph moves on
+    to the build. If the plan's dependencies are invalid, the steps are left to the sequential path.
+    """
+    steps = state["coding_plan"]["steps"]
+    try:
+        results, failures = run_plan(steps, run_step, state["max_parallel_steps"])
+    except Exception as e:
+        state["messages"].append(HumanMessage(content=f"Cannot run the coding plan in parallel ({e}). Implementing the steps one by one."))
+        return
+
+    state["overall_messages"].extend(archive_messages(state["messages"]))
+    state["messages"] = []
+    for step_id, step_messages in results.items():
+        state["overall_messages"].extend(archive_messages(step_messages))
+    for step_id, error in failures.items():
+        state["overall_messages"].append(HumanMessage(content=f"Step {step_id} was not implemented: {error}"))
+    for val in state["coding_impl"].values():
+        val["coding_started"] = True
+        val["coding_done"] = True
+
 def decide_next_step_node(state: CodeState) -> Literal["code_generator_node", "builder_node", "__end__"]:
     print("In decision node")
     """
@@ -0,0 +1,100 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def _step_id(value):
+    """ Plans sometimes carry ids as strings ("2"); normalise them to ints where possible. """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def validate_plan(steps: list[dict]) -> dict:
+    """
+    Build the dependency graph of a coding plan and check that it can be executed.
+    Returns a mapping of step id to the set of step ids it depends on.
+    Raises:
+        Exception: If step ids are duplicated, a dependency refers to an unknown step, or the dependencies contain a cycle.
+    """
+    deps: dict = {}
+    for step in steps:
+        step_id = _step_id(step.get("id"))
+        if step_id in deps:
+            raise Exception(f"Duplicate step id {step_id}")
+        deps[step_id] = {_step_id(d) for d in step.get("dependencies", []) if d not in ("", None)}
+
+    for step_id, step_deps in deps.items():
+        missing = step_deps - deps.keys()
+        if missing:
+            raise Exception(f"Step {step_id} depends on unknown steps {sorted(missing, key=str)}")
+
+    # Kahn's algorithm: whatever cannot be ordered is part of (or behind) a cycle
+    remaining = {step_id: set(step_deps) for step_id, step_deps in deps.items()}
+    ready = [step_id for step_id, step_deps in remaining.items() if not step_deps]
+    while ready:
+        done = ready.pop()
+        del remaining[done]
+        for step_id, step_deps in remaining.items():
+            if done in step_deps:
+                step_deps.discard(done)
+                if not step_deps:
+                    ready.append(step_id)
+    if remaining:
+        raise Exception(f"Dependency cycle between steps {sorted(remaining, key=str)}")
+    return deps
+
+
+def run_plan(steps: list[dict], run_step, max_workers: int) -> tuple[dict, dict]:
+    """
+    Run the steps of a coding plan concurrently, respecting their dependencies.
+    A step starts once all its dependencies finished successfully and no running step
+    declares any of the same affectedFiles, so two steps never write one file at the same time.
+    Steps whose dependencies failed are skipped.
+    Args:
+        steps: The "steps" of a coding plan.
+        run_step: Callable executing one step dict; its return value is collected per step id.
+        max_workers: Maximum number of steps running at once.
+    Returns:
+        (results, failures): results maps step id to the return value of run_step,
+        failures maps step id to the error (or skip reason) of every step that did not complete.
+    """
+    deps = validate_plan(steps)
+    max_workers = max(1, max_workers)
+    by_id = {_step_id(step.get("id")): step for step in steps}
+    files = {step_id: {f.strip("/") for f in step.get("affectedFiles", [])} for step_id, step in by_id.items()}
+    order = list(by_id)
+
+    results: dict = {}
+    failures: dict = {}
+    pending = set(order)
+    running: dict = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            busy_files = set().union(*(files[step_id] for step_id in running.values()))
+            for step_id in order:
+                if step_id not in pending:
+                    continue
+                failed_deps = deps[step_id] & failures.keys()
+                if failed_deps:
+                    pending.discard(step_id)
+                    failures[step_id] = f"Skipped because steps {sorted(failed_deps, key=str)} did not complete"
+                    continue
+                if len(running) >= max_workers or not deps[step_id] <= results.keys() or files[step_id] & busy_files:
+                    continue
+                pending.discard(step_id)
+                # Each step gets a copy of the caller's context (e.g. the project path of this run)
+                running[pool.submit(contextvars.copy_context().run, run_step, by_id[step_id])] = step_id
+                busy_files |= files[step_id]
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step_id = running.pop(future)
+                try:
+                    results[step_id] = future.result()
+                except Exception as e:
+                    failures[step_id] = e
+    return results, failures
@@ -1,4 +1,4 @@
-from typing import TypedDict, Annotated
+from typing import Optional, TypedDict, Annotated
 
 from langchain_core.messages import BaseMessage
 from langgraph.graph.message import add_messages
@@ -24,4 +24,17 @@ class CodeState(TypedDict):
     current_implementation_step: int
     build_success: bool
     build_summary: str
+    # Whether the error handler already received the summary of the last build
+    error_handling_started: bool
     cycles: int
+    max_parallel_steps: int
+    # Distinct problems reported by the last build, None before the first build
+    build_error_count: Optional[int]
+    # Compile and dependency problems of the last build, and the key of the tests it ran (see tools/test_selection.py:selection_key)
+    build_compile_error_count: Optional[int]
+    build_test_selection: Optional[str]
+    # Workspace snapshots taken before each implementation cycle: id, cycles_left, error_count, compile_error_count,
+    # test_selection, build_summary and fingerprint of the snapshotted tree
+    snapshots: list[dict]
+    # Failed builds of the run, oldest first: fingerprint, error_count, cycles_left, plan (implemented before the build) and rolled_back_to (snapshot id)
+    failure_history: list[dict]
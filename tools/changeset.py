@@ -0,0 +1,63 @@
+import hashlib
+import threading
+from dataclasses import dataclass, replace
+
+# Hash of a file that does not exist.
+MISSING = ""
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@dataclass
+class FileChange:
+    path: str  # relative to the project root
+    old_hash: str  # content hash before the first write of the run, MISSING for a new file
+    new_hash: str  # content hash after the last write
+
+
+class Changeset:
+    """
+    Net changes made to a project through the file tools during a run: for every written file its content
+    hash before the first write and after the last one. Writes that leave a file as it was are not recorded.
+    There is one per project root; main.initial_state clears it when a new run starts.
+    """
+
+    def __init__(self):
+        self._changes: dict[str, FileChange] = {}
+        self._lock = threading.Lock()
+
+    def record(self, path: str, old_hash: str, new_hash: str):
+        if old_hash == new_hash:
+            return
+        with self._lock:
+            change = self._changes.get(path)
+            if change is None:
+                self._changes[path] = FileChange(path, old_hash, new_hash)
+            else:
+                change.new_hash = new_hash
+
+    def changes(self, include_reverted: bool = False) -> list[FileChange]:
+        """
+        The changed files, sorted by path. Files written back to their original content are left out
+        unless include_reverted is set (a build that saw the intermediate content still has to see the revert).
+        """
+        with self._lock:
+            return [replace(c) for _, c in sorted(self._changes.items()) if include_reverted or c.old_hash != c.new_hash]
+
+    def clear(self):
+        with self._lock:
+            self._changes.clear()
+
+
+_changesets: dict[str, Changeset] = {}
+_changesets_lock = threading.Lock()
+
+
+def get_changeset(root: str) -> Changeset:
+    root = root.rstrip("/")
+    with _changesets_lock:
+        if root not in _changesets:
+            _changesets[root] = Changeset()
+        return _changesets[root]
@@ -0,0 +1,190 @@
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from tools.diagnostics import Diagnostic, deduplicate
+from tools.file_index import get_file_index
+from tools.maven_build import MAVEN_OFFLINE
+from utils.tracing import trace_span
+
+# Compile the files a plan step changed right after the step, feeding errors back to the generator.
+FAST_COMPILE_CHECK = os.getenv("FAST_COMPILE_CHECK", "false").lower() in ("1", "true", "yes")
+# Times the generator is sent back to fix compile errors within one step.
+COMPILE_CHECK_MAX_ATTEMPTS = int(os.getenv("COMPILE_CHECK_MAX_ATTEMPTS", "3"))
+COMPILE_CHECK_TIMEOUT_SECONDS = float(os.getenv("COMPILE_CHECK_TIMEOUT_SECONDS", "120"))
+# Dependency classpaths resolved by Maven, one file per module and pom.xml content, kept between runs.
+CLASSPATH_DIR = os.path.join(".agent", "classpath")
+
+JAVAC_MESSAGE_RE = re.compile(r'^(.+\.java):(\d+): (error|warning): (.*)$')
+JAVAC_DETAIL_RE = re.compile(r'^\s+(symbol|location|required|found|reason)\s*:\s*(.*)$')
+
+
+class ClasspathCache:
+    """
+    Compile classpath of every Maven module of a project: the dependency jars resolved once with
+    "mvn dependency:build-classpath" and cached on disk by the hash of the module's and the root's pom.xml,
+    followed by the modules' own target/classes directories.
+    """
+
+    def __init__(self, root: str):
+        self.root = root.rstrip("/")
+        self._lock = threading.Lock()
+        self._failed: set[str] = set()
+
+    def module_of(self, path: str) -> str:
+        """ Directory of the Maven module owning path (the root itself for single-module projects). """
+        directory = os.path.dirname(path)
+        while directory.startswith(self.root + "/") and not os.path.exists(os.path.join(directory, "pom.xml")):
+            directory = os.path.dirname(directory)
+        return directory if directory.startswith(self.root + "/") else self.root
+
+    def dependencies(self, module: str):
+        """
+        Dependency classpath entries of a module, or None if Maven could not resolve them.
+        Maven runs without holding the lock, so checks of other modules are not held up; two checks of the
+        same uncached module may both resolve it, and the last one to finish stores the result.
+        """
+        key = self._key(module)
+        cache_file = os.path.join(self.root, CLASSPATH_DIR, key + ".txt")
+        with self._lock:
+            if key in self._failed:
+                return None
+            cached = os.path.exists(cache_file)
+        if not cached:
+            entries = self._resolve(module, cache_file)
+            with self._lock:
+                if entries is None:
+                    self._failed.add(key)
+                    return None
+                os.replace(entries, cache_file)
+        with open(cache_file) as f:
+            return [entry for entry in f.read().strip().split(os.pathsep) if entry]
+
+    def _resolve(self, module: str, cache_file: str):
+        """ Run Maven to write the module's classpath to a temporary file next to cache_file; returns its path, or None. """
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        output = f"{cache_file}.{os.getpid()}-{threading.get_ident()}.tmp"
+        command = ["mvn", "-q", "-f", os.path.join(module, "pom.xml")] + (["-o"] if MAVEN_OFFLINE else []) + [
+            "dependency:build-classpath", "-Dmdep.includeScope=test", f"-Dmdep.outputFile={output}"]
+        try:
+            with trace_span("build", "mvn dependency:build-classpath"):
+                completed = subprocess.run(command, cwd=self.root, capture_output=True, text=True,
+                                           timeout=COMPILE_CHECK_TIMEOUT_SECONDS * 5)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"Could not resolve the classpath of {module}: {e}")
+            return None
+        if completed.returncode != 0 or not os.path.exists(output):
+            print(f"Could not resolve the classpath of {module}:\n{completed.stdout[-2000:]}")
+            if os.path.exists(output):
+                os.remove(output)
+            return None
+        return output
+
+    def source_and_class_dirs(self) -> tuple[list[str], list[str]]:
+        """ Source roots and compiled class directories of all modules, so changed files see their siblings' latest code. """
+        sources, classes = [], []
+        # The file index already skips build output, node_modules and hidden directories
+        poms = [f for f in get_file_index(self.root).files() if f == "pom.xml" or f.endswith("/pom.xml")]
+        for pom in sorted(poms, key=lambda f: (f.count("/"), f)):
+            module = os.path.join(self.root, os.path.dirname(pom)).rstrip("/")
+            for source in ("src/main/java", "src/test/java"):
+                if os.path.isdir(os.path.join(module, source)):
+                    sources.append(os.path.join(module, source))
+            for output in ("target/classes", "target/test-classes"):
+                if os.path.isdir(os.path.join(module, output)):
+                    classes.append(os.path.join(module, output))
+        return list(dict.fromkeys(sources)), list(dict.fromkeys(classes))
+
+    def _key(self, module: str) -> str:
+        digest = hashlib.sha256()
+        for pom in dict.fromkeys([os.path.join(self.root, "pom.xml"), os.path.join(module, "pom.xml")]):
+            try:
+                with open(pom, "rb") as f:
+                    digest.update(f.read())
+            except OSError:
+                pass
+        name = os.path.relpath(module, self.root).replace("/", "_").strip(".") or "root"
+        return f"{name}-{digest.hexdigest()[:16]}"
+
+
+def check_sources(root: str, files: list[str]):
+    """
+    Compile the given Java files (paths as passed to the file tools) against the project's cached classpath,
+    without writing class files into the project. Returns the compile diagnostics, or None when no check
+    was possible (no javac, or the classpath could not be resolved).
+    """
+    root = root.rstrip("/")
+    files = [f if f.startswith(root + "/") else root + "/" + f.lstrip("/") for f in dict.fromkeys(files)]
+    files = [f for f in files if f.endswith(".java") and os.path.exists(f)]
+    javac = shutil.which("javac")
+    if not files or javac is None:
+        return None
+    cache = get_classpath_cache(root)
+    dependencies = []
+    for module in dict.fromkeys(cache.module_of(f) for f in files):
+        module_dependencies = cache.dependencies(module)
+        if module_dependencies is None:
+            return None
+        dependencies.extend(module_dependencies)
+    sources, classes = cache.source_and_class_dirs()
+    with tempfile.TemporaryDirectory(prefix="compile-check-") as output:
+        command = [javac, "-d", output, "-implicit:none", "-Xmaxerrs", "100", "-nowarn", "-encoding", "UTF-8",
+                   "-cp", os.pathsep.join(classes + list(dict.fromkeys(dependencies))),
+                   "-sourcepath", os.pathsep.join(sources)] + files
+        with trace_span("build", "javac", files=len(files)) as fields:
+            try:
+                completed = subprocess.run(command, cwd=root, capture_output=True, text=True, errors="replace",
+                                           timeout=COMPILE_CHECK_TIMEOUT_SECONDS)
+            except subprocess.TimeoutExpired:
+                print(f"Compile check timed out after {COMPILE_CHECK_TIMEOUT_SECONDS:.0f}s")
+                return None
+            diagnostics = parse_javac_output(completed.stdout + completed.stderr, root)
+            fields["compilation_errors"] = len(diagnostics)
+    if completed.returncode != 0 and not diagnostics:
+        # javac failed without reporting a source error (bad option, crash): not the step's fault
+        print(f"Compile check could not run:\n{(completed.stdout + completed.stderr)[-2000:]}")
+        return None
+    return diagnostics
+
+
+def parse_javac_output(output: str, root: str = "") -> list[Diagnostic]:
+    """ Errors of a javac run, with the column taken from the caret line and symbol/location details. """
+    diagnostics: list[Diagnostic] = []
+    current = None
+    lines = output.splitlines()
+    for i, line in enumerate(lines):
+        match = JAVAC_MESSAGE_RE.match(line)
+        if match:
+            path, line_no, severity, message = match.groups()
+            current = None
+            if severity != "error":
+                continue
+            if root and path.startswith(root.rstrip("/") + "/"):
+                path = path[len(root.rstrip("/")) + 1:]
+            column = 0
+            # javac prints the source line and then a caret under the error position
+            if i + 2 < len(lines) and lines[i + 2].strip() == "^":
+                column = lines[i + 2].index("^") + 1
+            current = Diagnostic("compile", message.strip(), path, int(line_no), column)
+            diagnostics.append(current)
+            continue
+        detail = JAVAC_DETAIL_RE.match(line)
+        if detail and current is not None:
+            current.details.append(f"{detail.group(1)}: {detail.group(2).strip()}")
+    return deduplicate(diagnostics)
+
+
+_caches: dict[str, ClasspathCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_classpath_cache(root: str) -> ClasspathCache:
+    root = root.rstrip("/")
+    with _caches_lock:
+        if root not in _caches:
+            _caches[root] = ClasspathCache(root)
+        return _caches[root]
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from collections import Counter
+from dataclasses import dataclass, field
+
+from tools.file_index import get_file_index
+
+COMPILE_ERROR_RE = re.compile(r'^\[ERROR\] (.+\.java):\[(\d+),(\d+)\] (.*)$')
+DETAIL_RE = re.compile(r'^\[ERROR\]\s+(symbol|location|required|found|reason)\s*:\s*(.*)$')
+TEST_FAILURE_RE = re.compile(r'^\[ERROR\] (?:Failures|Errors):\s*$|^\[ERROR\]\s+([\w.$]+)[.:#](\w+)(?::\d+)?\s+(.*)$')
+DEPENDENCY_RE = re.compile(r'Could not (?:resolve dependencies|find artifact|transfer artifact)|Non-resolvable (?:parent|import) POM|dependencies\.dependency\.version.* is missing')
+STACK_FRAME_RE = re.compile(r'^\s*at ([\w.$]+)\.([\w$<>]+)\(([\w$]+\.java):(\d+)\)')
+
+# Maven boilerplate that carries no information about the failure
+NOISE = (
+    "-> [Help", "[Help ", "To see the full stack trace", "Re-run Maven using", "For more information about the errors",
+    "After correcting the problems", "mvn <args> -rf", "COMPILATION ERROR", "Tests run:", "There are test failures",
+    "Please refer to", "BUILD FAILURE", "Failed to execute goal org.apache.maven.plugins:maven-surefire-plugin",
+    "Failed to execute goal org.apache.maven.plugins:maven-compiler-plugin",
+)
+
+# Order in which kinds are presented: what blocks everything else comes first
+KIND_RANK = {"dependency": 0, "compile": 1, "context-load": 2, "test-error": 3, "test-failure": 4, "build": 5}
+
+MAX_RENDERED = int(os.getenv("BUILD_DIAGNOSTICS_MAX_RENDERED", "40"))
+
+# Parts of a message that change from build to build while the problem stays the same: numbers, hashes, addresses, proxy names
+VOLATILE_RE = re.compile(r'0x[0-9a-fA-F]+|@[0-9a-f]{5,}\b|\$\$\w+|\blambda\$\w+|\d+')
+
+
+@dataclass
+class Diagnostic:
+    kind: str
+    message: str
+    file: str = ""
+    line: int = 0
+    column: int = 0
+    details: list[str] = field(default_factory=list)
+    test: str = ""
+    root_causes: list[str] = field(default_factory=list)
+    count: int = 1
+
+    def key(self) -> tuple:
+        return self.kind, self.file, self.line, self.column, self.test, re.sub(r'\s+', ' ', self.message).strip()
+
+
+def parse_maven_errors(error_lines: list[str], root: str = "") -> list[Diagnostic]:
+    """ Turn the [ERROR] lines of a Maven log into diagnostics, dropping Maven boilerplate. """
+    diagnostics: list[Diagnostic] = []
+    current = None
+    for line in error_lines:
+        compile_match = COMPILE_ERROR_RE.match(line)
+        if compile_match:
+            path, line_no, column, message = compile_match.groups()
+            current = Diagnostic("compile", message.strip(), _relative(path, root), int(line_no), int(column))
+            diagnostics.append(current)
+            continue
+        detail_match = DETAIL_RE.match(line)
+        if detail_match and current is not None:
+            detail = f"{detail_match.group(1)}: {detail_match.group(2).strip()}"
+            if detail not in current.details:
+                current.details.append(detail)
+            continue
+        current = None
+        text = line[len("[ERROR]"):].strip()
+        if not text or any(noise in text for noise in NOISE):
+            continue
+        if DEPENDENCY_RE.search(text):
+            diagnostics.append(Diagnostic("dependency", text))
+            continue
+        test_match = TEST_FAILURE_RE.match(line)
+        if test_match and test_match.group(1):
+            # Surefire summary line "Class.method:42 message"; the XML reports carry the detail
+            diagnostics.append(Diagnostic("test-failure", test_match.group(3).strip(), test=f"{test_match.group(1)}.{test_match.group(2)}"))
+            continue
+        if test_match:
+            continue
+        diagnostics.append(Diagnostic("build", text))
+    return diagnostics
+
+
+def parse_surefire_reports(root: str, since: float = 0.0) -> list[Diagnostic]:
+    """
+    Read target/surefire-reports/TEST-*.xml of every module and return failed and errored test cases.
+    Reports older than since (a time.time() value) are left out, so results of earlier builds are not repeated.
+    """
+    diagnostics = []
+    project_files = get_file_index(root).files()
+    module_dirs = [os.path.dirname(f) for f in project_files if os.path.basename(f) == "pom.xml"]
+    reports = []
+    for module_dir in module_dirs:
+        reports_dir = os.path.join(root, module_dir, "target", "surefire-reports")
+        if os.path.isdir(reports_dir):
+            reports.extend(os.path.join(reports_dir, name) for name in os.listdir(reports_dir)
+                           if name.startswith("TEST-") and name.endswith(".xml"))
+    for report in reports:
+        try:
+            if os.path.getmtime(report) < since:
+                continue
+            tree = ET.parse(report)
+        except (OSError, ET.ParseError):
+            continue
+        for testcase in tree.iter("testcase"):
+            for outcome in ("error", "failure"):
+                element = testcase.find(outcome)
+                if element is None:
+                    continue
+                classname = testcase.get("classname", "")
+                trace = element.text or ""
+                message = element.get("message") or element.get("type") or trace.strip().split("\n", 1)[0]
+                root_causes = [l.strip()[len("Caused by:"):].strip() for l in trace.splitlines() if l.strip().startswith("Caused by:")]
+                kind = "context-load" if "ApplicationContext" in message or "ApplicationContext" in trace[:500] else f"test-{outcome}"
+                file, line_no = _test_location(project_files, classname, trace)
+                diagnostics.append(Diagnostic(kind, message.strip(), file, line_no, test=f"{classname}.{testcase.get('name', '')}",
+                                              root_causes=_dedupe(root_causes)))
+    return diagnostics
+
+
+def deduplicate(diagnostics: list[Diagnostic]) -> list[Diagnostic]:
+    """ Merge identical diagnostics (Maven prints most errors twice), counting occurrences. """
+    merged: dict[tuple, Diagnostic] = {}
+    for d in diagnostics:
+        existing = merged.get(d.key())
+        if existing is None:
+            merged[d.key()] = d
+        else:
+            existing.count += d.count
+            existing.details = _dedupe(existing.details + d.details)
+            existing.root_causes = existing.root_causes or d.root_causes
+    # Surefire's log summary repeats failures found in the XML reports, with the simple class name
+    reported_tests = [d.test for d in merged.values() if d.test and d.file]
+    return [d for d in merged.values()
+            if not (d.test and not d.file and any(t == d.test or t.endswith("." + d.test) for t in reported_tests))]
+
+
+def render_summary(diagnostics: list[Diagnostic], max_rendered: int = MAX_RENDERED) -> str:
+    """
+    Compact, ranked text for the error-handler prompt: blocking problems first, grouped by file,
+    one line per distinct diagnostic with its occurrence count.
+    """
+    if not diagnostics:
+        return ""
+    total = sum(d.count for d in diagnostics)
+    ranked = sorted(diagnostics, key=lambda d: (KIND_RANK.get(d.kind, 9), d.file or "~", d.line, d.test))
+    shown = ranked[:max_rendered]
+
+    lines = [f"=== BUILD DIAGNOSTICS: {len(diagnostics)} distinct problems ({total} occurrences) ==="]
+    current_file = None
+    for d in shown:
+        group = d.file or "(no source file)"
+        if group != current_file:
+            lines.append(group)
+            current_file = group
+        location = f"{d.line}:{d.column} " if d.line and d.kind == "compile" else f"line {d.line} " if d.line else ""
+        repeated = f" (x{d.count})" if d.count > 1 else ""
+        test = f" in {d.test}" if d.test else ""
+        lines.append(f"  {location}[{d.kind}]{test} {d.message}{repeated}")
+        for detail in d.details:
+            lines.append(f"      {detail}")
+        if d.root_causes:
+            lines.append(f"      root cause: {d.root_causes[-1]}")
+    if len(ranked) > len(shown):
+        lines.append(f"... {len(ranked) - len(shown)} more problems not shown; fix the ones above first.")
+    return "\n".join(lines)
+
+
+def fingerprint(diagnostics: list[Diagnostic], fallback: str = "") -> str:
+    """
+    Identity of a build's failures: the same problems give the same fingerprint even when edits elsewhere moved
+    their lines or changed generated names. Details (javac's symbol and location) and the number of places each
+    problem is reported at are part of it, so fixing some of the occurrences or trading one missing symbol for
+    another is a change. A failure without diagnostics is identified by its fallback text.
+    """
+    if diagnostics:
+        items = Counter((d.kind, d.file, d.test, _normalize(d.message), tuple(_normalize(detail) for detail in d.details))
+                        for d in diagnostics)
+        items = sorted([*item, count] for item, count in items.items())
+    else:
+        items = sorted({_normalize(line) for line in fallback.splitlines() if line.strip()})
+    return hashlib.sha1(json.dumps(items).encode("utf-8")).hexdigest()[:16]
+
+
+def collect_diagnostics(error_lines: list[str], root: str, since: float = 0.0) -> list[Diagnostic]:
+    """ Diagnostics of a build from its [ERROR] lines and the Surefire reports it wrote. """
+    return deduplicate(parse_maven_errors(error_lines, root) + parse_surefire_reports(root, since))
+
+
+def _relative(path: str, root: str) -> str:
+    if root and path.startswith(root.rstrip("/") + "/"):
+        return path[len(root.rstrip("/")) + 1:]
+    return path
+
+
+def _test_location(project_files: list[str], classname: str, trace: str) -> tuple[str, int]:
+    """ Source file of a test class and the line of the deepest stack frame inside it. """
+    outer_class = classname.split("$", 1)[0]
+    line_no = 0
+    for line in trace.splitlines():
+        frame = STACK_FRAME_RE.match(line)
+        if frame and frame.group(1).split("$", 1)[0] == outer_class:
+            line_no = int(frame.group(4))
+            break
+    relative = outer_class.replace(".", "/") + ".java"
+    matches = [f for f in project_files if f == relative or f.endswith("/" + relative)]
+    return (matches[0] if matches else relative), line_no
+
+
+def _normalize(message: str) -> str:
+    return re.sub(r'\s+', ' ', VOLATILE_RE.sub('#', message)).strip()
+
+
+def _dedupe(items: list[str]) -> list[str]:
+    return list(dict.fromkeys(items))
@@ -0,0 +1,285 @@
+import difflib
+import os
+import re
+
+import tools.file_tools as file_tools
+
+HUNK_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+# Lines of the file shown around a rejected hunk's closest match
+REJECT_CONTEXT_LINES = 3
+
+
+class EditRejected(Exception):
+    """ An edit or hunk that does not apply to the current file contents; nothing was written. """
+
+
+def edit_file(file_name: str, edits: list[dict]) -> str:
+    """ Change parts of an existing file by replacing exact snippets, without sending the whole file.
+    Prefer this over create_or_update_file for changes to existing files. All edits are checked before
+    anything is written: if one does not apply, the file is left unchanged and the error says why.
+    Args:
+        file_name (str): The full path of the file to edit.
+        edits (list[dict]): Changes applied in order, each {"search": "<exact lines currently in the file>",
+            "replace": "<lines to put in their place>"}. The search text must occur exactly once in the file;
+            include a few surrounding lines to make it unique. Use an empty replace to delete the lines.
+    Returns:
+        str: The changed line ranges in the edited file.
+    Raises:
+        Exception: If an edit does not apply or the file cannot be written, with the reason and the closest match in the file.
+    """
+    try:
+        _check_inside_project(file_name)
+        text, crlf = _read(file_name)
+        changed = []
+        for n, edit in enumerate(edits, start=1):
+            search, replace = edit.get("search", ""), edit.get("replace", "")
+            if not search:
+                raise EditRejected(f"edit {n}: empty search text. Use create_or_update_file to create a file or replace it entirely.")
+            text, line = _replace_once(text, search.replace("\r\n", "\n"), replace.replace("\r\n", "\n"), f"edit {n}")
+            changed.append((line, line + max(len(replace.rstrip("\n").split("\n")), 1) - 1))
+        written = _write(file_name, text, crlf)
+        return f"Edited {file_name}" + ("" if written else " (no change)") + ": lines " + ", ".join(f"{a}-{b}" for a, b in changed)
+    except EditRejected as e:
+        raise Exception(f"Could not edit {file_name}, nothing was changed: {e}")
+    except Exception as e:
+        raise Exception(f"Could not edit {file_name} because of the following exception: {e}")
+
+
+def apply_patch(patch: str) -> str:
+    """ Apply a unified diff (as produced by "diff -u" or "git diff") to one or more project files.
+    Hunks may be offset from their line numbers but their context and removed lines must match the file.
+    Every hunk of every file is checked before anything is written: if one does not apply, no file is
+    changed and the error says which hunk failed and what the file contains there.
+    Use "--- /dev/null" to create a file and "+++ /dev/null" to delete one.
+    Args:
+        patch (str): The unified diff with "--- a/path", "+++ b/path" and "@@ -l,n +l,n @@" hunk headers.
+    Returns:
+        str: The files changed, with the number of hunks applied to each.
+    Raises:
+        Exception: If the patch cannot be parsed or a hunk does not apply, with the reason and the closest match in the file.
+    """
+    try:
+        # Final text of every touched file (None: delete), computed completely before the first write
+        pending: dict[str, tuple] = {}
+        summary = []
+        for old_path, new_path, hunks in parse_patch(patch):
+            for path in (old_path, new_path):
+                if path is not None:
+                    _check_inside_project(path)
+            if old_path is None:
+                if new_path in pending or os.path.exists(file_tools._project_file(new_path)):
+                    raise EditRejected(f"{new_path} already exists; the patch creates it from /dev/null")
+                text, crlf = "", False
+            elif old_path in pending:
+                text, crlf = pending[old_path]
+                if text is None:
+                    raise EditRejected(f"{old_path} is deleted earlier in the patch")
+            else:
+                text, crlf = _read(old_path)
+            if new_path is None:
+                # Only a file whose every line the patch removes is deleted
+                removed = [line for hunk in hunks for line in hunk["old"]]
+                if [line.rstrip() for line in removed] != [line.rstrip() for line in _lines(text)]:
+                    raise EditRejected(f"{old_path} is not deleted: the patch's removed lines are not the file's contents. "
+                                       + _closest(_lines(text), removed))
+                pending[old_path] = (None, crlf)
+                summary.append(f"deleted {old_path}")
+                continue
+            for n, hunk in enumerate(hunks, start=1):
+                text = _apply_hunk(text, hunk, f"{new_path} hunk {n} ({hunk['header']})")
+            if old_path is not None and old_path != new_path:
+                pending[old_path] = (None, crlf)
+            pending[new_path] = (text, crlf)
+            summary.append(f"{'created' if old_path is None else 'patched'} {new_path} ({len(hunks)} hunks)")
+        for path, (text, crlf) in pending.items():
+            if text is None:
+                file_tools.delete_project_file(path)
+            else:
+                _write(path, text, crlf)
+        return "Applied patch: " + "; ".join(summary)
+    except EditRejected as e:
+        raise Exception(f"Could not apply the patch, nothing was changed: {e}")
+    except Exception as e:
+        raise Exception(f"Could not apply the patch because of the following exception: {e}")
+
+
+def parse_patch(patch: str) -> list[tuple]:
+    """ The files of a unified diff as (old path or None, new path or None, hunks); a None path is /dev/null. """
+    files = []
+    lines = patch.replace("\r\n", "\n").split("\n")
+    i = 0
+    while i < len(lines):
+        if not (lines[i].startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ ")):
+            i += 1
+            continue
+        old_path, new_path = _diff_path(lines[i][4:]), _diff_path(lines[i + 1][4:])
+        if old_path is None and new_path is None:
+            raise EditRejected(f"line {i + 1}: both sides of the file header are /dev/null")
+        hunks = []
+        i += 2
+        while i < len(lines) and not lines[i].startswith("--- "):
+            match = HUNK_RE.match(lines[i])
+            if not match:
+                i += 1
+                continue
+            old_count = int(match.group(2)) if match.group(2) is not None else 1
+            new_count = int(match.group(4)) if match.group(4) is not None else 1
+            hunk = {"header": lines[i].split("@@")[1].strip(), "start": int(match.group(1)), "old": [], "new": []}
+            i += 1
+            while i < len(lines) and (len(hunk["old"]) < old_count or len(hunk["new"]) < new_count):
+                line = lines[i]
+                if line.startswith("\\"):
+                    pass  # "\ No newline at end of file"
+                elif line.startswith("-"):
+                    hunk["old"].append(line[1:])
+                elif line.startswith("+"):
+                    hunk["new"].append(line[1:])
+                elif line.startswith(" ") or line == "":
+                    # Editors and models often drop the space of an empty context line
+                    hunk["old"].append(line[1:])
+                    hunk["new"].append(line[1:])
+                else:
+                    break
+                i += 1
+            if _more_hunk_lines(lines, i):
+                raise EditRejected(f"line {i + 1}: the hunk @@ {hunk['header']} @@ has more lines than its header counts; "
+                                   f"fix the counts or split the hunk")
+            hunks.append(hunk)
+        if not hunks and new_path is not None:
+            raise EditRejected(f"no hunks for {new_path}")
+        files.append((old_path, new_path, hunks))
+    if not files:
+        raise EditRejected('no file headers found; a patch needs "--- a/path" and "+++ b/path" lines before its hunks')
+    return files
+
+
+def _more_hunk_lines(lines: list[str], i: int) -> bool:
+    """ Whether lines[i:] continue the hunk body, before the next hunk or file header. """
+    while i < len(lines) and lines[i] == "":
+        i += 1  # empty context lines, or blank lines between hunks
+    if i >= len(lines) or lines[i].startswith(("@@", "--- ")) or lines[i] == "-- ":  # "-- ": git format-patch signature
+        return False
+    return lines[i].startswith(("+", "-", " "))
+
+
+def _check_inside_project(path: str):
+    """ Reject paths that resolve (following symlinks) outside the project root. """
+    root = os.path.realpath(file_tools.project_path())
+    resolved = os.path.realpath(file_tools._project_file(path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise EditRejected(f"{path} is outside the project")
+
+
+def _lines(text: str) -> list[str]:
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def _diff_path(header: str):
+    path = header.split("\t", 1)[0].strip()
+    if path == "/dev/null":
+        return None
+    if path.startswith(("a/", "b/")) and not os.path.exists(file_tools._project_file(path)):
+        path = path[2:]
+    return path
+
+
+def _apply_hunk(text: str, hunk: dict, label: str) -> str:
+    lines = text.split("\n")
+    trailing_newline = bool(lines) and lines[-1] == ""
+    if trailing_newline:
+        lines.pop()
+    old, new = hunk["old"], hunk["new"]
+    if not old:
+        # Pure insertion: the position comes from the header alone
+        at = min(max(hunk["start"], 0), len(lines))
+        lines[at:at] = new
+    else:
+        at = _locate(lines, old, hunk["start"] - 1)
+        if at is None:
+            raise EditRejected(f"{label} does not apply: its context and removed lines are not in the file. " + _closest(lines, old))
+        lines[at:at + len(old)] = new
+    return "\n".join(lines) + ("\n" if trailing_newline or not text else "")
+
+
+def _locate(lines: list[str], block: list[str], expected: int):
+    """ Start of block in lines nearest to expected, exactly or else ignoring trailing whitespace; None if absent. """
+    for normalize in (lambda s: s, str.rstrip):
+        wanted = [normalize(line) for line in block]
+        starts = [i for i in range(len(lines) - len(block) + 1)
+                  if normalize(lines[i]) == wanted[0] and [normalize(line) for line in lines[i:i + len(block)]] == wanted]
+        if starts:
+            return min(starts, key=lambda i: abs(i - expected))
+    return None
+
+
+def _replace_once(text: str, search: str, replace: str, label: str) -> tuple[str, int]:
+    """ Replace the single occurrence of search; falls back to matching whole lines ignoring indentation. Returns the text and the 1-based line of the change. """
+    count = text.count(search)
+    if count == 1:
+        index = text.index(search)
+        return text[:index] + replace + text[index + len(search):], text.count("\n", 0, index) + 1
+    lines = text.split("\n")
+    if count > 1:
+        starts, position = [], -1
+        while (position := text.find(search, position + 1)) >= 0:
+            starts.append(text.count("\n", 0, position) + 1)
+        raise EditRejected(f"{label}: the search text occurs {count} times (lines {', '.join(map(str, starts[:10]))}"
+                           f"{', ...' if count > 10 else ''}); "
+                           f"include surrounding lines to make it unique.")
+    block = search.strip("\n").split("\n")
+    wanted = [line.strip() for line in block]
+    starts = [i for i in range(len(lines) - len(block) + 1) if [line.strip() for line in lines[i:i + len(block)]] == wanted]
+    if len(starts) == 1:
+        at = starts[0]
+        new_lines = replace.strip("\n").split("\n") if replace.strip("\n") else []
+        return "\n".join(lines[:at] + new_lines + lines[at + len(block):]), at + 1
+    if len(starts) > 1:
+        raise EditRejected(f"{label}: the search text occurs {len(starts)} times ignoring indentation "
+                           f"(lines {', '.join(str(s + 1) for s in starts[:10])}); include surrounding lines to make it unique.")
+    raise EditRejected(f"{label}: the search text is not in the file. " + _closest(lines, block))
+
+
+def _closest(lines: list[str], block: list[str]) -> str:
+    """ Where the file comes closest to block, with those lines numbered, so the next attempt can copy them exactly. """
+    if not lines:
+        return "The file is empty."
+    wanted = "\n".join(line.strip() for line in block)
+    best, best_ratio = 0, -1.0
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(wanted)
+    for i in range(max(len(lines) - len(block) + 1, 1)):
+        matcher.set_seq1("\n".join(line.strip() for line in lines[i:i + len(block)]))
+        if matcher.real_quick_ratio() <= best_ratio or matcher.quick_ratio() <= best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio:
+            best, best_ratio = i, ratio
+    start = max(best - REJECT_CONTEXT_LINES, 0)
+    end = min(best + len(block) + REJECT_CONTEXT_LINES, len(lines))
+    numbered = "\n".join(f"{n + 1:>5}| {lines[n]}" for n in range(start, end))
+    return f"Closest match ({best_ratio:.0%} similar) at lines {best + 1}-{best + len(block)}:\n{numbered}"
+
+
+def _read(file_name: str) -> tuple[str, bool]:
+    """ The file's text with "\n" line endings, and whether it used "\r\n". """
+    with open(file_tools._project_file(file_name), "rb") as f:
+        text = f.read().decode("utf-8")
+    return text.replace("\r\n", "\n"), "\r\n" in text
+
+
+def _write(file_name: str, text: str, crlf: bool) -> bool:
+    return file_tools.write_project_file(file_name, (text.replace("\n", "\r\n") if crlf else text).encode("utf-8"))
+
+
+def patch_paths(patch: str) -> list[str]:
+    """ Paths a unified diff creates or changes, without validating it. """
+    paths = []
+    for line in patch.replace("\r\n", "\n").split("\n"):
+        if line.startswith("+++ "):
+            path = line[4:].split("\t", 1)[0].strip()
+            if path != "/dev/null":
+                paths.append(path[2:] if path.startswith("b/") else path)
+    return paths
@@ -0,0 +1,108 @@
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+# Files at least this large are read through mmap and only the requested range is decoded.
+MMAP_THRESHOLD = int(os.getenv("READ_FILE_MMAP_THRESHOLD", str(1024 * 1024)))
+# Upper bound on the total size of cached file contents.
+CACHE_MAX_BYTES = int(os.getenv("READ_FILE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class FileContentCache:
+    """
+    LRU cache of raw file contents keyed by (path, mtime, size).
+    A stale entry is never served: every lookup stats the file and compares the key,
+    and writes through the file tools drop the entry explicitly.
+    Large files are not cached; read_range maps them and decodes only the requested slice.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, mmap_threshold: int = MMAP_THRESHOLD):
+        self.max_bytes = max_bytes
+        self.mmap_threshold = mmap_threshold
+        self._entries: OrderedDict[str, tuple[int, int, bytes]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def read_range(self, path: str, start_line: int = 0, end_line: int = 0,
+                   byte_offset: int = 0, max_bytes: int = 0) -> tuple[str, int, int, int, int]:
+        """
+        Read part of a file.
+        Lines are 1-based and inclusive, 0 leaves that end of the range open.
+        byte_offset/max_bytes select a byte slice of the (line-selected) content.
+        Returns (text, first byte returned, end byte returned, end byte of the requested range, total bytes of the file).
+        """
+        st = os.stat(path)
+        if st.st_size >= self.mmap_threshold:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _slice(mm, start_line, end_line, byte_offset, max_bytes) + (st.st_size,)
+        return _slice(self._get(path, st), start_line, end_line, byte_offset, max_bytes) + (st.st_size,)
+
+    def invalidate(self, path: str):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._size -= len(entry[2])
+
+    def _get(self, path: str, st: os.stat_result) -> bytes:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                self._entries.move_to_end(path)
+                return entry[2]
+        with open(path, "rb") as f:
+            contents = f.read()
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self._size -= len(previous[2])
+            self._entries[path] = (st.st_mtime_ns, st.st_size, contents)
+            self._size += len(contents)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[2])
+        return contents
+
+
+def _advance_lines(buf, pos: int, count: int) -> int:
+    """ Byte offset just after the count-th newline found from pos, or the end of buf. """
+    for _ in range(count):
+        nl = buf.find(b"\n", pos)
+        if nl < 0:
+            return len(buf)
+        pos = nl + 1
+    return pos
+
+
+def _slice(buf, start_line: int, end_line: int, byte_offset: int, max_bytes: int) -> tuple[str, int, int, int]:
+    """ Decode the selected lines, then the selected bytes of those lines. Only the returned bytes are copied out of buf. """
+    start, end = 0, len(buf)
+    if start_line or end_line:
+        first = max(start_line, 1)
+        start = _advance_lines(buf, 0, first - 1)
+        if end_line:
+            end = _advance_lines(buf, start, end_line - first + 1)
+    range_end = end
+    start = _char_boundary(buf, min(start + max(byte_offset, 0), end))
+    if max_bytes > 0 and start + max_bytes < end:
+        end = _char_boundary(buf, start + max_bytes)
+        while end == start or (end < range_end and buf[end] & 0xC0 == 0x80):
+            end += 1  # max_bytes is shorter than the first character: return that character whole
+    # Undecodable bytes (e.g. an ISO-8859-1 file) show up as U+FFFD instead of silently disappearing
+    return buf[start:end].decode("utf-8", errors="replace"), start, end, range_end
+
+
+def _char_boundary(buf, pos: int) -> int:
+    """ pos, moved back to the start of the UTF-8 character it falls inside (at most 3 continuation bytes). """
+    for _ in range(3):
+        if pos <= 0 or pos >= len(buf) or buf[pos] & 0xC0 != 0x80:
+            break
+        pos -= 1
+    return pos
+
+
+_cache = FileContentCache()
+
+
+def get_content_cache() -> FileContentCache:
+    return _cache
@@ -0,0 +1,188 @@
+import fnmatch
+import os
+import threading
+import time
+
+from utils.tracing import trace_span
+
+# Build output and dependency folders that are never useful to the LLM.
+# Override with a comma separated list of glob patterns in PROJECT_INDEX_IGNORE.
+DEFAULT_IGNORE_PATTERNS = ["target", "node_modules", "generated-sources", "generated-test-sources"]
+IGNORE_PATTERNS = [p.strip() for p in os.getenv("PROJECT_INDEX_IGNORE", ",".join(DEFAULT_IGNORE_PATTERNS)).split(",") if p.strip()]
+# Output folders of other tools (Gradle, IDEs) whose names are also common package names ("com/acme/build"):
+# only ignored directly in a module root, next to a build file. Override with PROJECT_INDEX_IGNORE_MODULE_OUTPUT.
+DEFAULT_MODULE_OUTPUT_PATTERNS = ["build", "out", "bin"]
+MODULE_OUTPUT_PATTERNS = [p.strip() for p in os.getenv("PROJECT_INDEX_IGNORE_MODULE_OUTPUT", ",".join(DEFAULT_MODULE_OUTPUT_PATTERNS)).split(",") if p.strip()]
+BUILD_FILES = ("pom.xml", "build.gradle", "build.gradle.kts")
+
+# How long (in seconds) a validated index is served from memory before directory mtimes are checked again.
+REFRESH_INTERVAL = float(os.getenv("PROJECT_INDEX_REFRESH_SECONDS", "2.0"))
+
+
+class _DirState:
+    __slots__ = ("mtime_ns", "files", "subdirs")
+
+    def __init__(self, mtime_ns: int, files: set[str], subdirs: set[str]):
+        self.mtime_ns = mtime_ns
+        self.files = files
+        self.subdirs = subdirs
+
+
+class FileIndex:
+    """
+    In-process index of every file under a project root.
+    The tree is walked once with os.scandir. Afterwards only directory mtimes are checked
+    (a directory's mtime changes whenever an entry is added, removed or renamed in it),
+    so a refresh costs one stat per directory instead of one per file, and only changed
+    directories are re-listed. Writes made through the file tools are applied directly.
+    """
+
+    def __init__(self, root: str, ignore_patterns: list[str] = None, refresh_interval: float = REFRESH_INTERVAL,
+                 module_output_patterns: list[str] = None):
+        self.root = root.rstrip("/")
+        self.ignore_patterns = list(IGNORE_PATTERNS if ignore_patterns is None else ignore_patterns)
+        self.module_output_patterns = list(MODULE_OUTPUT_PATTERNS if module_output_patterns is None else module_output_patterns)
+        self.refresh_interval = refresh_interval
+        self._dirs: dict[str, _DirState] = {}
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+
+    def files(self) -> list[str]:
+        """ Return all indexed files as paths relative to the root, sorted. """
+        with self._lock:
+            self.refresh()
+            result = []
+            for rel_dir, state in self._dirs.items():
+                prefix = rel_dir + "/" if rel_dir else ""
+                result.extend(prefix + name for name in state.files)
+            return sorted(result)
+
+    def refresh(self, force: bool = False):
+        """ Re-list directories whose mtime changed since they were last scanned. """
+        with self._lock:
+            if not force and self._dirs and time.monotonic() - self._last_refresh < self.refresh_interval:
+                return
+            with trace_span("fs", "file_index.refresh", directories=len(self._dirs)):
+                if not self._dirs:
+                    self._scan_dir("")
+                else:
+                    for rel_dir in list(self._dirs):
+                        state = self._dirs.get(rel_dir)
+                        if state is None:
+                            # Dropped while a parent was rescanned
+                            continue
+                        try:
+                            mtime_ns = os.stat(self._abs(rel_dir)).st_mtime_ns
+                        except OSError:
+                            self._drop(rel_dir)
+                            continue
+                        if mtime_ns != state.mtime_ns:
+                            self._scan_dir(rel_dir)
+            self._last_refresh = time.monotonic()
+
+    def notify_write(self, path: str):
+        """ Record a file that was just created or updated, without rescanning the tree. """
+        with self._lock:
+            if not self._dirs:
+                return
+            rel_path = self._rel(path)
+            if rel_path is None or self.is_ignored(rel_path):
+                return
+            rel_dir, _, name = rel_path.rpartition("/")
+            self._ensure_dir(rel_dir)
+            self._dirs[rel_dir].files.add(name)
+
+    def notify_delete(self, path: str):
+        """ Forget a file that was removed through the file tools. """
+        with self._lock:
+            rel_path = self._rel(path)
+            if rel_path is None:
+                return
+            rel_dir, _, name = rel_path.rpartition("/")
+            state = self._dirs.get(rel_dir)
+            if state is not None:
+                state.files.discard(name)
+
+    def is_ignored(self, rel_path: str) -> bool:
+        """
+        Hidden entries and entries matching an ignore pattern are not indexed, nor is anything below them;
+        module output patterns only apply to directories in a module root.
+        """
+        parts = rel_path.split("/")
+        for i, part in enumerate(parts):
+            if part.startswith("."):
+                return True
+            if any(fnmatch.fnmatch(part, pattern) for pattern in self.ignore_patterns):
+                return True
+            if any(fnmatch.fnmatch(part, pattern) for pattern in self.module_output_patterns) \
+                    and self._is_module_root("/".join(parts[:i])):
+                return True
+        return any(fnmatch.fnmatch(rel_path, pattern) for pattern in self.ignore_patterns if "/" in pattern)
+
+    def _is_module_root(self, rel_dir: str) -> bool:
+        return any(os.path.exists(os.path.join(self._abs(rel_dir), name)) for name in BUILD_FILES)
+
+    def _abs(self, rel_path: str) -> str:
+        return self.root + "/" + rel_path if rel_path else self.root
+
+    def _rel(self, path: str):
+        path = os.path.normpath(path)
+        if not os.path.isabs(path):
+            return path
+        if not path.startswith(self.root + "/"):
+            return None
+        return path[len(self.root) + 1:]
+
+    def _ensure_dir(self, rel_dir: str):
+        if rel_dir in self._dirs:
+            return
+        parent, _, name = rel_dir.rpartition("/")
+        self._ensure_dir(parent)
+        self._dirs[parent].subdirs.add(name)
+        self._scan_dir(rel_dir)
+
+    def _scan_dir(self, rel_dir: str):
+        abs_dir = self._abs(rel_dir)
+        files: set[str] = set()
+        subdirs: set[str] = set()
+        try:
+            mtime_ns = os.stat(abs_dir).st_mtime_ns
+            with os.scandir(abs_dir) as entries:
+                for entry in entries:
+                    child = rel_dir + "/" + entry.name if rel_dir else entry.name
+                    if self.is_ignored(child):
+                        continue
+                    if entry.is_dir():
+                        subdirs.add(entry.name)
+                    else:
+                        files.add(entry.name)
+        except OSError:
+            self._drop(rel_dir)
+            return
+        previous = self._dirs.get(rel_dir)
+        self._dirs[rel_dir] = _DirState(mtime_ns, files, subdirs)
+        if previous is not None:
+            for name in previous.subdirs - subdirs:
+                self._drop(rel_dir + "/" + name if rel_dir else name)
+        for name in subdirs:
+            child = rel_dir + "/" + name if rel_dir else name
+            if child not in self._dirs:
+                self._scan_dir(child)
+
+    def _drop(self, rel_dir: str):
+        prefix = rel_dir + "/"
+        for key in [k for k in self._dirs if k == rel_dir or k.startswith(prefix) or rel_dir == ""]:
+            del self._dirs[key]
+
+
+_indexes: dict[str, FileIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_file_index(root: str) -> FileIndex:
+    """ Return the shared index for the given project root, creating it on first use. """
+    root = root.rstrip("/")
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = FileIndex(root)
+        return _indexes[root]
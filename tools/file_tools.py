@@ -1,24 +1,143 @@
+import fnmatch
 import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from tools.changeset import MISSING, content_hash, get_changeset
+from tools.file_cache import get_content_cache
+from tools.file_index import get_file_index
 
 PROJECT_PATH = "/Users/anuraggupta/IdeaProjects/TestProject"
 
-def read_file(file: str) -> str:
+# Project the tools operate on in the current context; PROJECT_PATH unless a run set its own workspace.
+# A ContextVar (rather than reassigning PROJECT_PATH) lets concurrent runs in one process use different workspaces.
+_project_path: ContextVar = ContextVar("project_path", default=None)
+
+def project_path() -> str:
+    """ Root of the project the file tools operate on in the current context. """
+    return _project_path.get() or PROJECT_PATH
+
+@contextmanager
+def use_project_path(path: str):
+    """ Run the enclosed code (and graph runs started from it) against the project at path. """
+    token = _project_path.set(os.path.abspath(path).rstrip("/"))
+    try:
+        yield
+    finally:
+        _project_path.reset(token)
+
+# Callbacks invoked with the absolute path of every file changed (or deleted) through the file tools.
+# Indexes kept outside this module (e.g. the Java symbol index) register here to stay up to date.
+_write_listeners: list = []
+
+def on_file_written(listener):
+    """ Register a callback that receives the absolute path of every file written by the file tools. """
+    _write_listeners.append(listener)
+
+# Hard cap on the bytes a single read_file call returns to the LLM.
+READ_FILE_MAX_BYTES = int(os.getenv("READ_FILE_MAX_BYTES", str(48 * 1024)))
+
+def read_file(file: str, start_line: int = 0, end_line: int = 0, byte_offset: int = 0, max_bytes: int = 0) -> str:
     """ Read the content of a file and return it as a String.
+    Large files are truncated; the end of the returned text then says how to read the rest.
     Args:
         file (str): The full path of the file to be read.
+        start_line (int): First line to return (1-based). 0 starts at the beginning of the file.
+        end_line (int): Last line to return (inclusive). 0 reads to the end of the file.
+        byte_offset (int): Skip this many bytes of the selected lines.
+        max_bytes (int): Return at most this many bytes. 0 uses the default cap.
     Returns:
         str: The content of the file.
     Raises:
         Exception: If the file cannot be read, an exception is raised with the error message.
     """
     try:
-        f = open(PROJECT_PATH + "/" + file, "r")
-        return f.read()
+        limit = READ_FILE_MAX_BYTES if max_bytes <= 0 else min(max_bytes, READ_FILE_MAX_BYTES)
+        text, start, end, range_end, total = get_content_cache().read_range(
+            _project_file(file), start_line, end_line, byte_offset, limit)
+        if end < range_end:
+            text += (f"\n... [truncated: returned bytes {start}-{end} of {total}. "
+                     f"Call read_file again with the same lines and byte_offset={byte_offset + end - start} to read more]")
+        return text
     except Exception as e:
         raise Exception(f"Could Not Read File because of the following exception: {e}")
 
+# Total bytes a read_files call returns, shared among its files.
+READ_FILES_MAX_BYTES = int(os.getenv("READ_FILES_MAX_BYTES", str(128 * 1024)))
+# Threads reading the files of a read_files call.
+READ_FILES_THREADS = int(os.getenv("READ_FILES_THREADS", "8"))
+# "path:start-end" selects lines of a file in read_files
+LINE_RANGE_RE = re.compile(r'^(.+?):(\d*)-(\d*)$')
+
+_read_pool = ThreadPoolExecutor(max_workers=READ_FILES_THREADS, thread_name_prefix="read-files")
+
+def read_files(files: list[str], max_bytes: int = 0) -> str:
+    """ Read several files in one call and return their contents one after the other.
+    Use this instead of calling read_file once per file when loading the files a task touches.
+    The byte budget is shared: small files are returned whole and only the largest ones are truncated.
+    Args:
+        files (list[str]): Paths of the files to read. Append ":start-end" to a path to read only those lines
+            (1-based, inclusive, either end may be left open), e.g. "src/main/java/com/acme/App.java:10-60".
+        max_bytes (int): Total bytes to return for all files together. 0 uses the default budget.
+    Returns:
+        str: Every file under a "=== path ===" header, followed by its content or the error reading it.
+    """
+    budget = READ_FILES_MAX_BYTES if max_bytes <= 0 else min(max_bytes, READ_FILES_MAX_BYTES)
+    specs = []
+    for spec in dict.fromkeys(files):
+        match = LINE_RANGE_RE.match(spec)
+        path, start_line, end_line = (match.group(1), int(match.group(2) or 0), int(match.group(3) or 0)) if match else (spec, 0, 0)
+        # Resolved here: the pool threads do not see this context's project path
+        specs.append((spec, path, _project_file(path), start_line, end_line))
+
+    def read(spec):
+        try:
+            return get_content_cache().read_range(spec[2], spec[3], spec[4], 0, min(budget, READ_FILE_MAX_BYTES))
+        except Exception as e:
+            return e
+
+    results = list(_read_pool.map(read, specs)) if len(specs) > 1 else [read(spec) for spec in specs]
+    sizes = [0 if isinstance(r, Exception) else r[2] - r[1] for r in results]
+    shares = _share_budget(sizes, budget)
+
+    sections = []
+    for (spec, path, file_path, start_line, end_line), result, share in zip(specs, results, shares):
+        if isinstance(result, Exception):
+            sections.append(f"=== {spec} ===\nError: could not read the file: {result}")
+            continue
+        text, start, end, range_end, total = result
+        if share < end - start:
+            # Read again with the file's share, so the cut falls on a character boundary
+            try:
+                text, start, end, range_end, total = get_content_cache().read_range(
+                    file_path, start_line, end_line, 0, max(share, 1))
+            except Exception as e:
+                sections.append(f"=== {spec} ===\nError: could not read the file: {e}")
+                continue
+        if end < range_end:
+            lines = f"start_line={start_line}, end_line={end_line}, " if start_line or end_line else ""
+            text += (f"\n... [truncated: returned bytes {start}-{end} of {total}. "
+                     f"Call read_file(\"{path}\", {lines}byte_offset={end - start}) to read more]")
+        sections.append(f"=== {spec} ===\n{text}")
+    return "\n\n".join(sections)
+
+def _share_budget(sizes: list[int], budget: int) -> list[int]:
+    """ Bytes granted to each file: an equal share of the budget, with what small files leave over going to the larger ones. """
+    shares = [0] * len(sizes)
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while pending:
+        fair = budget // len(pending)
+        i = pending.pop(0)
+        shares[i] = min(sizes[i], fair)
+        budget -= shares[i]
+    return shares
+
 def create_or_update_file(file_name: str, file_contents: str) -> bool:
     """ Create or update a file with the given contents.
+    A file that already has exactly these contents is left untouched.
     Args:
         file_name (str): The full path of the file to be created or updated.
         file_contents (str): The contents to write into the file.
@@ -28,58 +147,146 @@ def create_or_update_file(file_name: str, file_contents: str) -> bool:
         Exception: If the file cannot be created or updated, an exception is raised with the error message.
     """
     try:
-        if not file_name.startswith(PROJECT_PATH+ "/"):
-            file_name = PROJECT_PATH + "/" + file_name
-        directory = os.path.dirname(file_name)
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-        with open(file_name, "w") as f:
-            f.write(file_contents)
+        write_project_file(file_name, file_contents.encode("utf-8"))
         return True
     except:
         return False
 
+def write_project_file(file_name: str, data: bytes) -> bool:
+    """
+    Write a project file atomically and record it in the run's changeset, keeping the caches, the index
+    and the write listeners up to date. Returns False (without touching the file) if it already had this content.
+    """
+    root = project_path()
+    file_name = _project_file(file_name)
+    new_hash = content_hash(data)
+    old_hash = _file_hash(file_name)
+    if old_hash == new_hash:
+        # Rewriting identical content would only bump the mtime and make Maven recompile
+        return False
+    _atomic_write(file_name, data)
+    _file_changed(root, file_name, old_hash, new_hash)
+    return True
+
+def delete_project_file(file_name: str) -> bool:
+    """ Delete a project file, recording it like write_project_file. Returns False if there was no such file. """
+    root = project_path()
+    file_name = _project_file(file_name)
+    old_hash = _file_hash(file_name)
+    if old_hash == MISSING:
+        return False
+    os.remove(file_name)
+    _file_changed(root, file_name, old_hash, MISSING)
+    return True
+
+def _file_hash(file_name: str) -> str:
+    try:
+        with open(file_name, "rb") as f:
+            return content_hash(f.read())
+    except FileNotFoundError:
+        return MISSING
+
+def _file_changed(root: str, file_name: str, old_hash: str, new_hash: str):
+    get_changeset(root).record(file_name[len(root) + 1:], old_hash, new_hash)
+    get_content_cache().invalidate(file_name)
+    if new_hash == MISSING:
+        get_file_index(root).notify_delete(file_name)
+    else:
+        get_file_index(root).notify_write(file_name)
+    for listener in _write_listeners:
+        listener(file_name)
+
+def _atomic_write(file_name: str, data: bytes):
+    """ Write through a temporary file in the same directory and rename it over the target, so readers and crashes never see a partial file. """
+    directory = os.path.dirname(file_name)
+    os.makedirs(directory, exist_ok=True)
+    try:
+        mode = os.stat(file_name).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o644
+    fd, temp_name = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(file_name) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_name, mode)
+        os.replace(temp_name, file_name)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except OSError:
+            pass
+        raise
 
-def show_project_structure_util(path: str = PROJECT_PATH) -> list[str]:
-    files: list[str] = []
-    if not os.path.exists(path):
-        os.mkdir(path)
-    if not os.path.isdir(path):
-        print(f"Error {path} is not a directory")
-        return []
-    for file in os.listdir(path):
-        # Skip hidden files and directories
-        if file.startswith("."):
-            continue
-        file_path = os.path.join(path, file)
-        if os.path.isdir(file_path):
-            children: list[str] = show_project_structure_util(file_path)
-            if len(children) > 0:
-                for s in children:
-                    files.append(s)
-        else:
-            files.append(file_path.replace(PROJECT_PATH + "/", ""))
-    return files
 
 def show_project_structure() -> list[str]:
     """ Show the project structure by listing all files in the given directory and its subdirectories.
+    Build output (e.g. target/) and hidden files are left out.
     Returns:
         list[str]: A list of file paths in the directory and its subdirectories.
     """
     try:
-        return show_project_structure_util(PROJECT_PATH)
+        root = project_path()
+        if not os.path.exists(root):
+            os.mkdir(root)
+        if not os.path.isdir(root):
+            print(f"Error {root} is not a directory")
+            return []
+        return get_file_index(root).files()
     except Exception as e:
         raise Exception(f"Could not show project structure because of the following exception: {e}")
 
-def build_project() -> str:
-    """ Build the project using Maven.
+def _project_file(file_name: str) -> str:
+    """ Absolute path of a file given relative to the project (absolute paths inside the project are kept). """
+    root = project_path()
+    if file_name.startswith(root + "/"):
+        return file_name
+    return root + "/" + file_name.lstrip("/")
+
+def list_project_files(path_prefix: str = "", pattern: str = "", max_depth: int = 0, collapsed: bool = False,
+                       cursor: int = 0, page_size: int = 200) -> dict:
+    """ List project files with filtering and pagination. Prefer this over show_project_structure on large projects.
+    Args:
+        path_prefix (str): Only list files under this directory, e.g. "src/main/java/com/acme". Empty for the whole project.
+        pattern (str): Optional glob matched against the file path relative to the project, e.g. "*Controller.java" or "**/pom.xml".
+        max_depth (int): Directory levels below path_prefix to expand. Deeper files are summarized as "dir/ (N files)". 0 means no limit.
+        collapsed (bool): If True, summarize every directory as "dir/ (N files)" instead of listing its files.
+        cursor (int): Offset of the first entry to return, taken from "next_cursor" of the previous page.
+        page_size (int): Maximum number of entries to return.
     Returns:
-        str: The output of the Maven build command.
+        dict: "entries" (file paths or directory summaries), "total" entry count and "next_cursor" (None on the last page).
     Raises:
-        Exception: If the build fails, an exception is raised with the error message.
+        Exception: If the project files cannot be listed, an exception is raised with the error message.
     """
-    import subprocess
-    result = subprocess.run(["mvn", "clean", "install"], cwd=PROJECT_PATH, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise Exception(f"{result.stdout}")
-    return result.stdout
\ No newline at end of file
+    try:
+        prefix = path_prefix.strip("/")
+        files = show_project_structure()
+        if prefix:
+            files = [f for f in files if f.startswith(prefix + "/")]
+        if pattern:
+            files = [f for f in files if fnmatch.fnmatch(f, pattern) or fnmatch.fnmatch(f.rsplit("/", 1)[-1], pattern)]
+
+        entries: list[str] = []
+        dir_counts: dict[str, int] = {}
+        for f in files:
+            rel_parts = (f[len(prefix) + 1:] if prefix else f).split("/")
+            if max_depth > 0 and len(rel_parts) > max_depth + 1:
+                directory = "/".join(rel_parts[:max_depth])
+            elif collapsed and len(rel_parts) > 1:
+                directory = "/".join(rel_parts[:-1])
+            else:
+                entries.append(f)
+                continue
+            directory = prefix + "/" + directory if prefix else directory
+            if directory not in dir_counts:
+                entries.append(directory)
+            dir_counts[directory] = dir_counts.get(directory, 0) + 1
+        entries = [f"{e}/ ({dir_counts[e]} files)" if e in dir_counts else e for e in entries]
+
+        page_size = max(1, page_size)
+        page = entries[cursor:cursor + page_size]
+        next_cursor = cursor + page_size if cursor + page_size < len(entries) else None
+        return {"entries": page, "total": len(entries), "next_cursor": next_cursor}
+    except Exception as e:
+        raise Exception(f"Could not list project files because of the following exception: {e}")
@@ -0,0 +1,236 @@
+import os
+import re
+import threading
+import time
+
+import tools.file_tools as file_tools
+from tools.file_index import REFRESH_INTERVAL, get_file_index
+
+PACKAGE_RE = re.compile(r'^\s*package\s+([\w.]+)\s*;')
+IMPORT_RE = re.compile(r'^\s*import\s+(static\s+)?([\w.]+?)(\.\*)?\s*;')
+# Capitalized identifiers: by Java convention the names of the types a file uses
+TYPE_REFERENCE_RE = re.compile(r'\b([A-Z][\w$]*)\b')
+ANNOTATION_RE = re.compile(r'@(?!interface\b)([\w.]+)')
+TYPE_RE = re.compile(r'\b(class|interface|enum|record|@interface)\s+(\w+)')
+METHOD_RE = re.compile(r'^\s*((?:@[\w.]+(?:\([^)]*\))?\s+)*)'
+                       r'((?:(?:public|protected|private|static|final|abstract|synchronized|native|default|strictfp)\s+)*)'
+                       r'(?:<(?:[^<>]|<(?:[^<>]|<[^<>]*>)*>)*>\s+)?'  # type parameters, bounds nested up to two levels
+                       r'(?:([\w.$]+(?:<.*>)?(?:\[\])*)\s+)?'
+                       r'(\w+)\s*\(')
+NOT_METHODS = {"if", "for", "while", "switch", "catch", "return", "new", "throw", "else", "do", "try", "synchronized", "super", "this"}
+STRING_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+
+
+def parse_java(source: str) -> dict:
+    """
+    Extract the package, type declarations and method/constructor signatures of a Java source file.
+    This is a line-oriented scan, not a compiler: it relies on the usual one-declaration-per-line formatting.
+    Returns a dict with "package", "imports", "references" (capitalized names used in the code) and "symbols",
+    each symbol having kind, name, container, signature, annotations and line.
+    """
+    package = ""
+    imports = []
+    references = set()
+    symbols = []
+    pending_annotations: list[str] = []
+    type_stack: list[tuple[str, int]] = []  # (type name, brace depth of its body)
+    depth = 0
+    in_comment = False
+
+    for line_no, raw in enumerate(source.splitlines(), start=1):
+        line = raw
+        if in_comment:
+            end = line.find("*/")
+            if end < 0:
+                continue
+            line = line[end + 2:]
+            in_comment = False
+        line = STRING_RE.sub('""', line)
+        line = re.sub(r'/\*.*?\*/', ' ', line)
+        if "/*" in line:
+            line, _, _ = line.partition("/*")
+            in_comment = True
+        line = line.split("//", 1)[0]
+        stripped = line.strip()
+
+        if stripped:
+            package_match = PACKAGE_RE.match(line)
+            import_match = IMPORT_RE.match(line)
+            if import_match:
+                # "a.b.C.*" and static member imports both depend on the type a.b.C
+                static, name, wildcard = import_match.groups()
+                imports.append(name + (".*" if wildcard and not static else ""))
+                if static and not wildcard:
+                    imports.append(name.rsplit(".", 1)[0])
+                depth += line.count("{") - line.count("}")
+                continue
+            references.update(TYPE_REFERENCE_RE.findall(line))
+            type_match = TYPE_RE.search(line)
+            method_match = METHOD_RE.match(line) if type_stack else None
+            annotations = pending_annotations + ANNOTATION_RE.findall(line.split("(", 1)[0] if not type_match else line[:type_match.start()])
+            container = type_stack[-1][0] if type_stack else ""
+
+            if package_match:
+                package = package_match.group(1)
+            elif type_match and not stripped.startswith(("return", "new ")) and "=" not in line[:type_match.start()]:
+                kind = "annotation" if type_match.group(1) == "@interface" else type_match.group(1)
+                name = type_match.group(2)
+                symbols.append({
+                    "kind": kind,
+                    "name": name,
+                    "container": container,
+                    "signature": stripped.rstrip("{").strip(),
+                    "annotations": annotations,
+                    "line": line_no,
+                })
+                type_stack.append((name, depth + 1))
+                pending_annotations = []
+            elif method_match and _is_method(method_match, line, container, depth, type_stack):
+                name = method_match.group(4)
+                is_constructor = method_match.group(3) is None
+                symbols.append({
+                    "kind": "constructor" if is_constructor else "method",
+                    "name": name,
+                    "container": container,
+                    "signature": stripped[len(method_match.group(1)):].split("{", 1)[0].rstrip(" ;"),
+                    "annotations": pending_annotations + ANNOTATION_RE.findall(method_match.group(1)),
+                    "line": line_no,
+                })
+                pending_annotations = []
+            elif stripped.startswith("@"):
+                pending_annotations.extend(ANNOTATION_RE.findall(stripped))
+            elif stripped not in ("{", "}"):
+                pending_annotations = []
+
+        depth += line.count("{") - line.count("}")
+        while type_stack and depth < type_stack[-1][1]:
+            type_stack.pop()
+
+    return {"package": package, "imports": imports, "references": sorted(references), "symbols": symbols}
+
+
+def _is_method(match, line: str, container: str, depth: int, type_stack: list) -> bool:
+    name = match.group(4)
+    return_type = match.group(3)
+    if name in NOT_METHODS or (return_type in NOT_METHODS if return_type else False):
+        return False
+    # Only members declared directly in a type body, not calls inside method bodies
+    if depth != type_stack[-1][1]:
+        return False
+    if "=" in line[:match.end()] or "." in name:
+        return False
+    if return_type is None:
+        return name == container
+    return True
+
+
+class JavaSymbolIndex:
+    """
+    Index of Java declarations under a project root, maintained file by file.
+    A file is only re-parsed when its (mtime, size) changed or it was written through the file tools.
+    """
+
+    def __init__(self, root: str, refresh_interval: float = REFRESH_INTERVAL):
+        self.root = root.rstrip("/")
+        self.refresh_interval = refresh_interval
+        self._files: dict[str, tuple[int, int, dict]] = {}
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+
+    def refresh(self, force: bool = False):
+        with self._lock:
+            if not force and self._files and time.monotonic() - self._last_refresh < self.refresh_interval:
+                return
+            java_files = [f for f in get_file_index(self.root).files() if f.endswith(".java")]
+            for rel_path in java_files:
+                self._update(rel_path)
+            for rel_path in set(self._files) - set(java_files):
+                del self._files[rel_path]
+            self._last_refresh = time.monotonic()
+
+    def notify_write(self, path: str):
+        if not path.endswith(".java") or not path.startswith(self.root + "/"):
+            return
+        with self._lock:
+            self._update(path[len(self.root) + 1:])
+
+    def parsed_files(self) -> dict[str, dict]:
+        """ The parse_java result of every Java file, by path relative to the root. """
+        self.refresh()
+        with self._lock:
+            return {rel_path: parsed for rel_path, (_, _, parsed) in self._files.items()}
+
+    def search(self, name: str = "", annotation: str = "", kind: str = "", limit: int = 50) -> list[dict]:
+        self.refresh()
+        name_lower = name.lower()
+        annotation = annotation.lstrip("@")
+        matches = []
+        with self._lock:
+            for rel_path, (_, _, parsed) in self._files.items():
+                for symbol in parsed["symbols"]:
+                    if kind and symbol["kind"] != kind:
+                        continue
+                    if annotation and not any(a == annotation or a.endswith("." + annotation) for a in symbol["annotations"]):
+                        continue
+                    if name_lower and name_lower not in symbol["name"].lower():
+                        continue
+                    rank = 0 if symbol["name"] == name else 1 if symbol["name"].lower() == name_lower else 2
+                    matches.append((rank, rel_path, symbol["line"], {**symbol, "file": rel_path, "package": parsed["package"]}))
+        matches.sort(key=lambda m: m[:3])
+        return [m[3] for m in matches[:limit]]
+
+    def _update(self, rel_path: str):
+        path = self.root + "/" + rel_path
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._files.pop(rel_path, None)
+            return
+        cached = self._files.get(rel_path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            self._files[rel_path] = (st.st_mtime_ns, st.st_size, parse_java(f.read()))
+
+
+_indexes: dict[str, JavaSymbolIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_symbol_index(root: str) -> JavaSymbolIndex:
+    root = root.rstrip("/")
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = JavaSymbolIndex(root)
+        return _indexes[root]
+
+
+def _on_file_written(path: str):
+    get_symbol_index(file_tools.project_path()).notify_write(path)
+
+
+file_tools.on_file_written(_on_file_written)
+
+
+def find_java_symbol(name: str = "", annotation: str = "", kind: str = "", limit: int = 50) -> list[str]:
+    """ Look up Java classes, interfaces, enums, records, methods and constructors in the project by name and/or annotation.
+    Use this to locate code instead of reading files one by one.
+    Args:
+        name (str): Case-insensitive part of the symbol name, e.g. "UserService" or "findBy". Empty matches any name.
+        annotation (str): Only return symbols carrying this annotation, e.g. "RestController", "Service", "SpringBootTest", "GetMapping".
+        kind (str): Optional filter: "class", "interface", "enum", "record", "annotation", "method" or "constructor".
+        limit (int): Maximum number of results.
+    Returns:
+        list[str]: One line per match: "path:line kind package.Container.name signature [@Annotations]".
+    Raises:
+        Exception: If the project sources cannot be indexed, an exception is raised with the error message.
+    """
+    try:
+        results = []
+        for s in get_symbol_index(file_tools.project_path()).search(name, annotation, kind, limit):
+            qualified = ".".join(p for p in (s["package"], s["container"], s["name"]) if p)
+            annotations = " ".join("@" + a for a in s["annotations"])
+            results.append(f'{s["file"]}:{s["line"]} {s["kind"]} {qualified} | {s["signature"]}' + (f" [{annotations}]" if annotations else ""))
+        return results
+    except Exception as e:
+        raise Exception(f"Could not look up Java symbols because of the following exception: {e}")
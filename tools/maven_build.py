@@ -0,0 +1,352 @@
+import asyncio
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+import tools.file_tools as file_tools
+from tools.changeset import MISSING, FileChange, get_changeset
+from tools.test_selection import TEST_SELECTION, affected_tests
+from utils.tracing import trace_span
+
+# Run Maven with -o so builds never wait on remote repositories.
+MAVEN_OFFLINE = os.getenv("MAVEN_OFFLINE", "false").lower() in ("1", "true", "yes")
+# Stop the build once this many distinct compilation errors were reported (0 never stops early).
+MAVEN_MAX_COMPILATION_ERRORS = int(os.getenv("MAVEN_MAX_COMPILATION_ERRORS", "25"))
+# Kill the build after this many seconds.
+MAVEN_TIMEOUT_SECONDS = float(os.getenv("MAVEN_TIMEOUT_SECONDS", "1800"))
+# Raw output lines kept in memory, from the end of the log.
+MAVEN_LOG_TAIL_LINES = int(os.getenv("MAVEN_LOG_TAIL_LINES", "300"))
+# Upper bound on the [ERROR] / [WARNING] lines kept by the parser.
+MAX_KEPT_DIAGNOSTICS = 500
+
+ERROR_RE = re.compile(r'^\[ERROR\]')
+WARNING_RE = re.compile(r'^\[WARNING\]')
+COMPILATION_ERROR_RE = re.compile(r'^\[ERROR\] (.+\.java):\[(\d+),(\d+)\]')
+# javac's "symbol:", "location:" ... lines follow an error without an [ERROR] prefix the first time Maven prints it
+JAVAC_DETAIL_RE = re.compile(r'^\s+(symbol|location|required|found|reason)\s*:')
+
+
+class BuildLogParser:
+    """
+    Single-pass parser for Maven output, fed one line at a time while the build runs.
+    Keeps the [ERROR] and [WARNING] lines (bounded) and counts distinct javac errors.
+    """
+
+    def __init__(self, max_kept: int = MAX_KEPT_DIAGNOSTICS):
+        self.max_kept = max_kept
+        self.errors: list[str] = []
+        self.warnings: list[str] = []
+        self.build_failure = False
+        self._compilation_errors: set[tuple[str, str, str]] = set()
+        self._in_compilation_error = False
+
+    @property
+    def compilation_error_count(self) -> int:
+        return len(self._compilation_errors)
+
+    def feed(self, line: str):
+        line = line.rstrip("\n")
+        if self._in_compilation_error and JAVAC_DETAIL_RE.match(line):
+            if len(self.errors) < self.max_kept:
+                self.errors.append("[ERROR]   " + line.strip())
+            return
+        self._in_compilation_error = False
+        if ERROR_RE.match(line):
+            if len(self.errors) < self.max_kept:
+                self.errors.append(line.strip())
+            match = COMPILATION_ERROR_RE.match(line)
+            if match:
+                self._compilation_errors.add(match.groups())
+                self._in_compilation_error = True
+        elif WARNING_RE.match(line):
+            if len(self.warnings) < self.max_kept:
+                self.warnings.append(line.strip())
+        elif "BUILD FAILURE" in line:
+            self.build_failure = True
+
+    def format(self) -> str:
+        formatted = []
+        if self.errors:
+            formatted.append("=== ERRORS ===")
+            formatted.extend(self.errors)
+        if self.warnings:
+            formatted.append("\n=== WARNINGS ===")
+            formatted.extend(self.warnings)
+        return "\n".join(formatted)
+
+
+@dataclass
+class BuildResult:
+    command: list[str]
+    success: bool
+    parser: BuildLogParser
+    tail: list[str] = field(default_factory=list)
+    aborted: bool = False
+    timed_out: bool = False
+    timeout: float = MAVEN_TIMEOUT_SECONDS
+    started: float = 0.0
+    duration: float = 0.0
+    # Files (relative to the project) whose changes this build covered
+    changed_files: list[str] = field(default_factory=list)
+    # Test classes the build was limited to, None when it ran the full suite
+    selected_tests: Optional[list[str]] = None
+
+    def notes(self) -> list[str]:
+        """ Explanations for a build that was stopped before Maven finished. """
+        notes = []
+        if self.aborted:
+            notes.append(f"Build stopped early after {self.parser.compilation_error_count} compilation errors; more may follow once these are fixed.")
+        if self.timed_out:
+            notes.append(f"Build killed after {self.timeout:.0f} seconds.")
+        return notes
+
+    def summary(self) -> str:
+        """ The errors and warnings of a failed build, with a note when the build was stopped early. """
+        if self.success:
+            return ""
+        notes = self.notes()
+        formatted = self.parser.format()
+        if not formatted:
+            # Failed without any [ERROR] line (e.g. the JVM crashed): the end of the log is all we have
+            formatted = "\n".join(self.tail[-50:])
+        return "\n".join(notes + [formatted])
+
+
+def run_maven(command: list[str], cwd: str, max_compilation_errors: int = MAVEN_MAX_COMPILATION_ERRORS,
+              timeout: float = MAVEN_TIMEOUT_SECONDS, tail_lines: int = MAVEN_LOG_TAIL_LINES) -> BuildResult:
+    """
+    Run a Maven command, parsing its output line by line as it is produced.
+    The build is killed once max_compilation_errors distinct javac errors were seen or after timeout seconds.
+    Only the last tail_lines lines of raw output are kept.
+    """
+    started = time.monotonic()
+    started_at = time.time()
+    parser = BuildLogParser()
+    tail: deque[str] = deque(maxlen=tail_lines)
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, errors="replace", bufsize=1, start_new_session=True)
+    timed_out = threading.Event()
+
+    def kill():
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def on_timeout():
+        timed_out.set()
+        kill()
+
+    timer = threading.Timer(timeout, on_timeout)
+    timer.start()
+    aborted = False
+    try:
+        for line in process.stdout:
+            tail.append(line.rstrip("\n"))
+            parser.feed(line)
+            if not aborted and max_compilation_errors and parser.compilation_error_count >= max_compilation_errors:
+                aborted = True
+                kill()
+        returncode = process.wait()
+    finally:
+        timer.cancel()
+        process.stdout.close()
+    return BuildResult(
+        command=command,
+        success=returncode == 0 and not aborted and not timed_out.is_set(),
+        parser=parser,
+        tail=list(tail),
+        aborted=aborted,
+        timed_out=timed_out.is_set(),
+        timeout=timeout,
+        started=started_at,
+        duration=time.monotonic() - started,
+    )
+
+
+async def arun_maven(command: list[str], cwd: str, max_compilation_errors: int = MAVEN_MAX_COMPILATION_ERRORS,
+                     timeout: float = MAVEN_TIMEOUT_SECONDS, tail_lines: int = MAVEN_LOG_TAIL_LINES) -> BuildResult:
+    """ run_maven on an asyncio subprocess, so the event loop keeps serving other runs while Maven works. """
+    started = time.monotonic()
+    started_at = time.time()
+    parser = BuildLogParser()
+    tail: deque[str] = deque(maxlen=tail_lines)
+    process = await asyncio.create_subprocess_exec(*command, cwd=cwd, stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.STDOUT, start_new_session=True,
+                                                   limit=1024 * 1024)
+    aborted = False
+    timed_out = False
+
+    def kill():
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    async def consume() -> int:
+        nonlocal aborted
+        async for raw in process.stdout:
+            line = raw.decode("utf-8", errors="replace")
+            tail.append(line.rstrip("\n"))
+            parser.feed(line)
+            if not aborted and max_compilation_errors and parser.compilation_error_count >= max_compilation_errors:
+                aborted = True
+                kill()
+        return await process.wait()
+
+    try:
+        returncode = await asyncio.wait_for(consume(), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        kill()
+        returncode = await process.wait()
+    except BaseException:
+        # Cancelled run: do not leave Maven behind
+        kill()
+        raise
+    return BuildResult(
+        command=command,
+        success=returncode == 0 and not aborted and not timed_out,
+        parser=parser,
+        tail=list(tail),
+        aborted=aborted,
+        timed_out=timed_out,
+        timeout=timeout,
+        started=started_at,
+        duration=time.monotonic() - started,
+    )
+
+
+class _BuildTracker:
+    """ Content hashes of the changed files as of the last successful build of a project, and whether it was built in this run. """
+
+    def __init__(self):
+        self.built_hashes: dict[str, str] = {}
+        self.built_once = False
+
+
+_trackers: dict[str, _BuildTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def _tracker(root: str) -> _BuildTracker:
+    with _trackers_lock:
+        if root not in _trackers:
+            _trackers[root] = _BuildTracker()
+        return _trackers[root]
+
+
+def pending_changes(root: str) -> list[FileChange]:
+    """
+    Files of the run's changeset whose content differs from what the last successful build compiled
+    (from the content before the run if there was none). Files rewritten with identical content
+    never enter the changeset, and files changed and changed back before a build drop out here.
+    """
+    tracker = _tracker(root)
+    with _trackers_lock:
+        built = dict(tracker.built_hashes)
+    return [c for c in get_changeset(root).changes(include_reverted=True) if c.new_hash != built.get(c.path, c.old_hash)]
+
+
+def affected_modules(root: str, touched: set[str]) -> list[str]:
+    """
+    Maven modules (directories relative to root) owning the touched files, found via the nearest pom.xml.
+    Returns an empty list when a touched file belongs to the root project itself, meaning everything must be built.
+    """
+    modules = set()
+    for path in touched:
+        directory = os.path.dirname(path)
+        while directory.startswith(root + "/") and not os.path.exists(os.path.join(directory, "pom.xml")):
+            directory = os.path.dirname(directory)
+        if not directory.startswith(root + "/"):
+            return []
+        modules.add(directory[len(root) + 1:])
+    return sorted(modules)
+
+
+def maven_command(root: str, touched: set[str], first_build: bool, full: bool = False, tests: Optional[list[str]] = None) -> list[str]:
+    """
+    The Maven command for building the project after the given files were touched.
+    The first build of the run, a build after a pom.xml change, or full=True runs "clean install".
+    Otherwise "clean" is skipped so unchanged classes are not recompiled, and in multi-module
+    projects only the modules owning touched files (plus the modules they depend on and
+    those depending on them) are built.
+    With tests, Surefire only runs these test classes (none at all for an empty list).
+    """
+    command = ["mvn"]
+    if MAVEN_OFFLINE:
+        command.append("-o")
+    if tests is not None:
+        # Modules without any of the selected tests must not fail for lack of them
+        command += ["-Dtest=" + ",".join(tests), "-Dsurefire.failIfNoSpecifiedTests=false"] if tests else ["-DskipTests"]
+    if full or first_build or any(os.path.basename(p) == "pom.xml" for p in touched):
+        return command + ["clean", "install"]
+    command.append("install")
+    modules = affected_modules(root, touched)
+    if modules:
+        command += ["-pl", ",".join(modules), "-am", "-amd"]
+    return command
+
+
+def build_project(full: bool = False, all_tests: bool = False) -> BuildResult:
+    """ Build the project using Maven, incrementally where possible (see maven_command).
+    Args:
+        full (bool): Force a "mvn clean install" of the whole project.
+        all_tests (bool): Run the full test suite even if the changes only affect some tests.
+    Returns:
+        BuildResult: Outcome of the build with the parsed errors and warnings and the end of the log.
+    """
+    root, tracker, changes, tests, command = _start_build(full, all_tests)
+    with trace_span("build", "mvn", command=" ".join(command), changed_files=len(changes),
+                    selected_tests=-1 if tests is None else len(tests)) as fields:
+        result = run_maven(command, root)
+        fields.update(_span_fields(result))
+    _finish_build(tracker, changes, tests, result)
+    return result
+
+
+async def abuild_project(full: bool = False, all_tests: bool = False) -> BuildResult:
+    """ build_project running Maven as an asyncio subprocess. """
+    root, tracker, changes, tests, command = await asyncio.to_thread(_start_build, full, all_tests)
+    with trace_span("build", "mvn", command=" ".join(command), changed_files=len(changes),
+                    selected_tests=-1 if tests is None else len(tests)) as fields:
+        result = await arun_maven(command, root)
+        fields.update(_span_fields(result))
+    _finish_build(tracker, changes, tests, result)
+    return result
+
+
+def _start_build(full: bool, all_tests: bool):
+    root = file_tools.project_path()
+    tracker = _tracker(root)
+    changes = pending_changes(root)
+    # Classes of deleted sources would survive in target/ without a clean
+    full = full or any(c.new_hash == MISSING for c in changes)
+    with _trackers_lock:
+        first_build = not tracker.built_once
+        tracker.built_once = True
+    tests = None if all_tests or not TEST_SELECTION else affected_tests(root, changes)
+    command = maven_command(root, {root + "/" + c.path for c in changes}, first_build, full, tests)
+    print("Running", " ".join(command), f"({len(changes)} changed files" +
+          ("" if tests is None else f", {len(tests)} affected test classes") + ")")
+    return root, tracker, changes, tests, command
+
+
+def _finish_build(tracker: _BuildTracker, changes: list[FileChange], tests: Optional[list[str]], result: BuildResult):
+    result.changed_files = [c.path for c in changes]
+    result.selected_tests = tests
+    # On failure nothing is marked as built: the modules that failed still have to be rebuilt next time
+    if result.success:
+        with _trackers_lock:
+            tracker.built_hashes.update({c.path: c.new_hash for c in changes})
+
+
+def _span_fields(result: BuildResult) -> dict:
+    return {"success": result.success, "failures": int(not result.success),
+            "compilation_errors": result.parser.compilation_error_count, "aborted": result.aborted, "timed_out": result.timed_out}
@@ -0,0 +1,323 @@
+import os
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+import tools.file_tools as file_tools
+from tools.file_index import get_file_index
+
+# Local Maven repository holding the artifacts (and parent/BOM POMs) available offline.
+MAVEN_REPOSITORY = os.path.expanduser(os.getenv("MAVEN_REPOSITORY", os.path.join("~", ".m2", "repository")))
+# Seconds a listing of the whole local repository (for lookups by artifactId alone) is reused.
+REPOSITORY_SCAN_INTERVAL = float(os.getenv("MAVEN_REPOSITORY_SCAN_INTERVAL", "300"))
+
+PROPERTY_RE = re.compile(r'\$\{([^}]+)\}')
+QUALIFIER_RANK = {"alpha": 0, "a": 0, "beta": 1, "b": 1, "milestone": 2, "m": 2, "rc": 3, "cr": 3, "snapshot": 4,
+                  "": 5, "ga": 5, "final": 5, "release": 5, "sp": 6}
+
+
+class Pom:
+    """ The parts of a pom.xml that determine dependency versions. """
+
+    def __init__(self, path: str):
+        self.path = path
+        root = ET.parse(path).getroot()
+        for element in root.iter():
+            if isinstance(element.tag, str) and "}" in element.tag:
+                element.tag = element.tag.split("}", 1)[1]
+        parent = root.find("parent")
+        self.parent = None
+        if parent is not None:
+            self.parent = (_text(parent, "groupId"), _text(parent, "artifactId"), _text(parent, "version"),
+                           _text(parent, "relativePath", "../pom.xml"))
+        self.group_id = _text(root, "groupId") or (self.parent[0] if self.parent else "")
+        self.artifact_id = _text(root, "artifactId")
+        self.version = _text(root, "version") or (self.parent[2] if self.parent else "")
+        properties = root.find("properties")
+        self.properties = {child.tag: (child.text or "").strip() for child in properties} if properties is not None else {}
+        self.managed = _dependencies(root.find("dependencyManagement/dependencies"))
+        self.dependencies = _dependencies(root.find("dependencies"))
+
+    @property
+    def coordinates(self) -> str:
+        return f"{self.group_id}:{self.artifact_id}:{self.version}"
+
+
+class EffectiveModel:
+    """ Properties and managed versions of a POM after inheritance and BOM imports, with where each version came from. """
+
+    def __init__(self, pom: Pom, properties: dict[str, str], declared: list[tuple[dict, str]],
+                 managed: dict[str, tuple[str, str]], missing: list[str]):
+        self.pom = pom
+        self.properties = properties
+        self.declared = declared  # uninterpolated dependencyManagement entries of the POM and its parents, with their POM
+        self.managed = managed  # "groupId:artifactId" -> (version, declaring POM coordinates)
+        self.missing = missing  # parents and BOMs that are not available locally
+
+    def resolve(self, value: str) -> str:
+        return _resolve(value, self.properties)
+
+
+class MavenIndex:
+    """
+    Dependency versions known without the network: the effective dependencyManagement of every project module
+    (parent chain, properties and imported BOMs, read from the project and the local repository) and the
+    versions present in the local repository. Parsed POMs are cached by (mtime, size).
+    """
+
+    def __init__(self, root: str, repository: str = MAVEN_REPOSITORY):
+        self.root = root.rstrip("/")
+        self.repository = repository
+        self._poms: dict[str, tuple[int, int, Pom]] = {}
+        self._artifacts: dict[str, list[str]] = {}
+        self._artifacts_scanned = 0.0
+        self._lock = threading.RLock()
+
+    def modules(self) -> list[EffectiveModel]:
+        """ Effective models of the project's POMs, root first. """
+        paths = sorted((f for f in get_file_index(self.root).files() if os.path.basename(f) == "pom.xml"),
+                       key=lambda f: (f.count("/"), f))
+        models = []
+        with self._lock:
+            for rel_path in paths:
+                try:
+                    models.append(self._effective(self.root + "/" + rel_path, set()))
+                except (OSError, ET.ParseError) as e:
+                    print(f"Could not parse {rel_path}: {e}")
+        return models
+
+    def local_versions(self, group_id: str, artifact_id: str) -> list[str]:
+        """ Versions of an artifact in the local repository, newest first. """
+        directory = os.path.join(self.repository, *group_id.split("."), artifact_id)
+        try:
+            versions = [v for v in os.listdir(directory) if _has_artifact(os.path.join(directory, v), artifact_id, v)]
+        except OSError:
+            return []
+        return sorted(versions, key=version_key, reverse=True)
+
+    def local_group_ids(self, artifact_id: str) -> list[str]:
+        """ groupIds under which the local repository holds an artifact with this id. """
+        with self._lock:
+            if time.monotonic() - self._artifacts_scanned > REPOSITORY_SCAN_INTERVAL:
+                self._artifacts = self._scan_repository()
+                self._artifacts_scanned = time.monotonic()
+            return list(self._artifacts.get(artifact_id, []))
+
+    def _scan_repository(self) -> dict[str, list[str]]:
+        artifacts: dict[str, list[str]] = {}
+        for directory, dirs, files in os.walk(self.repository):
+            # An artifact directory holds version directories, each with "<artifactId>-<version>.pom"
+            artifact_id = os.path.basename(directory)
+            if any(os.path.exists(os.path.join(directory, d, f"{artifact_id}-{d}.pom")) for d in dirs[:3]):
+                group_id = os.path.relpath(os.path.dirname(directory), self.repository).replace(os.sep, ".")
+                artifacts.setdefault(artifact_id, []).append(group_id)
+                dirs[:] = []
+        return artifacts
+
+    def _pom(self, path: str) -> Pom:
+        st = os.stat(path)
+        cached = self._poms.get(path)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+        pom = Pom(path)
+        self._poms[path] = (st.st_mtime_ns, st.st_size, pom)
+        return pom
+
+    def _effective(self, path: str, seen: set[str]) -> EffectiveModel:
+        pom = self._pom(path)
+        properties, declared, missing = {}, [], []
+        if pom.parent is not None:
+            parent_path = self._parent_path(path, pom.parent)
+            if parent_path is None or parent_path in seen:
+                missing.append(f"parent {':'.join(pom.parent[:3])}")
+            else:
+                parent = self._effective(parent_path, seen | {path})
+                properties.update(parent.properties)
+                declared.extend(parent.declared)
+                # The parent's imports are redone below with this POM's properties
+                missing.extend(m for m in parent.missing if m.startswith("parent "))
+        properties.update(pom.properties)
+        properties.update({"project.groupId": pom.group_id, "project.artifactId": pom.artifact_id,
+                           "project.version": pom.version, "pom.version": pom.version, "version": pom.version})
+        if pom.parent is not None:
+            properties.update({"project.parent.groupId": pom.parent[0], "project.parent.version": pom.parent[2]})
+        # Like Maven, inherited entries are interpolated with this POM's properties, which may override their versions
+        declared = [(dependency, pom.coordinates) for dependency in pom.managed] + declared
+
+        managed, imports = {}, []
+        for dependency, source in declared:
+            key = f"{_resolve(dependency['groupId'], properties)}:{_resolve(dependency['artifactId'], properties)}"
+            if dependency["scope"] == "import" and dependency["type"] == "pom":
+                imports.append((key, _resolve(dependency["version"], properties)))
+            else:
+                managed.setdefault(key, (_resolve(dependency["version"], properties), source))
+        # Imported BOMs, interpolated with their own properties, only add what neither this POM nor its parents manage
+        for key, version in imports:
+            group_id, artifact_id = key.split(":")
+            bom_path = self._repository_pom(group_id, artifact_id, version)
+            if bom_path is None or bom_path in seen:
+                missing.append(f"BOM {key}:{version}")
+                continue
+            bom = self._effective(bom_path, seen | {path})
+            for bom_key, entry in bom.managed.items():
+                managed.setdefault(bom_key, entry)
+            missing.extend(bom.missing)
+        return EffectiveModel(pom, properties, declared, managed, missing)
+
+    def _parent_path(self, path: str, parent: tuple[str, str, str, str]):
+        group_id, artifact_id, version, relative_path = parent
+        if relative_path:
+            candidate = os.path.normpath(os.path.join(os.path.dirname(path), relative_path))
+            if os.path.isdir(candidate):
+                candidate = os.path.join(candidate, "pom.xml")
+            if os.path.exists(candidate):
+                try:
+                    local = self._pom(candidate)
+                    if local.artifact_id == artifact_id and local.group_id == group_id:
+                        return candidate
+                except (OSError, ET.ParseError):
+                    pass
+        return self._repository_pom(group_id, artifact_id, version)
+
+    def _repository_pom(self, group_id: str, artifact_id: str, version: str):
+        path = os.path.join(self.repository, *group_id.split("."), artifact_id, version, f"{artifact_id}-{version}.pom")
+        return path if os.path.exists(path) else None
+
+
+def version_key(version: str) -> tuple:
+    """ Sort key approximating Maven's version order: numbers numerically, qualifiers alpha < beta < milestone < rc < snapshot < release. """
+    match = re.match(r'^(\d+(?:\.\d+)*)[.-]?(.*)$', version)
+    if not match:
+        return (), -1, version.lower()
+    numbers = [int(n) for n in match.group(1).split(".")]
+    while numbers and numbers[-1] == 0:
+        numbers.pop()
+    qualifier = match.group(2).lower()
+    name = re.match(r'^[a-z]*', qualifier).group(0)
+    return tuple(numbers), QUALIFIER_RANK.get(name, 5 if not name else 4), qualifier
+
+
+def _has_artifact(directory: str, artifact_id: str, version: str) -> bool:
+    return any(os.path.exists(os.path.join(directory, f"{artifact_id}-{version}.{ext}")) for ext in ("pom", "jar"))
+
+
+def _text(element, path: str, default: str = "") -> str:
+    found = element.find(path)
+    return (found.text or "").strip() if found is not None else default
+
+
+def _dependencies(element) -> list[dict]:
+    if element is None:
+        return []
+    return [{"groupId": _text(d, "groupId"), "artifactId": _text(d, "artifactId"), "version": _text(d, "version"),
+             "scope": _text(d, "scope"), "type": _text(d, "type", "jar")} for d in element.findall("dependency")]
+
+
+def _resolve(value: str, properties: dict[str, str]) -> str:
+    for _ in range(10):
+        resolved = PROPERTY_RE.sub(lambda m: properties.get(m.group(1), m.group(0)), value)
+        if resolved == value:
+            break
+        value = resolved
+    return value
+
+
+_indexes: dict[str, MavenIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_maven_index(root: str) -> MavenIndex:
+    root = root.rstrip("/")
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = MavenIndex(root)
+        return _indexes[root]
+
+
+def lookup_maven_dependency(artifact: str = "", limit: int = 10) -> list[str]:
+    """ Look up the versions of a Maven dependency that the project manages, declares, and has available offline.
+    Use this before adding or changing a dependency in a pom.xml instead of guessing a version: a version managed
+    by the project's parent or BOM (e.g. Spring Boot's) should be used by leaving <version> out, and a version that
+    is not in the local repository may fail to resolve.
+    Args:
+        artifact (str): "groupId:artifactId" (e.g. "org.projectlombok:lombok") or just the artifactId (e.g. "lombok").
+            Empty returns an overview of the project's modules: parent, Java and Spring Boot versions.
+        limit (int): Maximum number of local versions listed per artifact, newest first.
+    Returns:
+        list[str]: One line per finding: managed versions with the POM or BOM they come from, the versions declared
+            by the modules, and the versions present in the local repository.
+    Raises:
+        Exception: If the project POMs cannot be read, an exception is raised with the error message.
+    """
+    try:
+        index = get_maven_index(file_tools.project_path())
+        modules = index.modules()
+        if not artifact.strip():
+            return _overview(modules)
+        group_id, _, artifact_id = artifact.strip().rpartition(":")
+        if ":" in group_id:  # groupId:artifactId:version
+            group_id, _, artifact_id = group_id.rpartition(":")
+        if group_id:
+            keys = [f"{group_id}:{artifact_id}"]
+        else:
+            known = {key for m in modules for key in m.managed} | {
+                f"{m.resolve(d['groupId'])}:{m.resolve(d['artifactId'])}" for m in modules for d in m.pom.dependencies}
+            keys = sorted(k for k in known if k.split(":")[1] == artifact_id) or [
+                f"{g}:{artifact_id}" for g in sorted(index.local_group_ids(artifact_id))]
+            if not keys:
+                return [f"No artifact named {artifact_id} is managed or declared by the project or present in the local repository"]
+        return [line for key in keys for line in _describe(index, modules, key, limit)]
+    except Exception as e:
+        raise Exception(f"Could not look up Maven dependencies because of the following exception: {e}")
+
+
+def _describe(index: MavenIndex, modules: list[EffectiveModel], key: str, limit: int) -> list[str]:
+    managed: dict[tuple[str, str], list[str]] = {}
+    declared = []
+    for model in modules:
+        module = os.path.relpath(model.pom.path, index.root)
+        if key in model.managed:
+            managed.setdefault(model.managed[key], []).append(module)
+        for dependency in model.pom.dependencies:
+            if f"{model.resolve(dependency['groupId'])}:{model.resolve(dependency['artifactId'])}" == key:
+                version = model.resolve(dependency["version"]) if dependency["version"] else "no version (managed)"
+                declared.append(f"{key} declared in {module}: {version}" + (f", scope {dependency['scope']}" if dependency["scope"] else ""))
+    lines = [f"{key} managed at {version} in {', '.join(modules_)} (from {source})" for (version, source), modules_ in managed.items()]
+    lines.extend(declared)
+    managed_versions = {version for version, _ in managed}
+    group_id, artifact_id = key.split(":")
+    local = index.local_versions(group_id, artifact_id)
+    if local:
+        shown = ", ".join(local[:limit]) + (f" (+{len(local) - limit} older)" if len(local) > limit else "")
+        lines.append(f"{key} in the local repository: {shown}")
+        for version in sorted(managed_versions - set(local)):
+            lines.append(f"{key}: the managed version {version} is not in the local repository and needs to be downloaded")
+    else:
+        lines.append(f"{key} is not in the local repository; resolving it needs network access")
+    if not managed_versions:
+        missing = sorted({m for model in modules for m in model.missing})
+        lines.append(f"{key} is not managed by the project" +
+                     (f" (unknown: {', '.join(missing)} not in the local repository)" if missing else "; declare it with an explicit version"))
+    return lines
+
+
+def _overview(modules: list[EffectiveModel]) -> list[str]:
+    lines = []
+    for model in modules:
+        pom = model.pom
+        parts = [f"{os.path.basename(os.path.dirname(pom.path))}: {pom.coordinates}"]
+        if pom.parent is not None:
+            parts.append(f"parent {':'.join(pom.parent[:3])}")
+        for name in ("java.version", "maven.compiler.release", "maven.compiler.source"):
+            if name in model.properties:
+                parts.append(f"{name}={model.resolve(model.properties[name])}")
+                break
+        boot = model.managed.get("org.springframework.boot:spring-boot")
+        if boot:
+            parts.append(f"Spring Boot {boot[0]}")
+        parts.append(f"{len(model.managed)} managed artifacts")
+        if model.missing:
+            parts.append(f"not in the local repository: {', '.join(sorted(set(model.missing)))}")
+        lines.append(", ".join(parts))
+    return lines or ["No pom.xml found in the project"]
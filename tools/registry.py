@@ -0,0 +1,21 @@
+from tools.file_tools import read_file, read_files, show_project_structure, list_project_files, create_or_update_file
+from tools.edit_tools import apply_patch, edit_file
+from tools.java_symbols import find_java_symbol
+from tools.maven_index import lookup_maven_dependency
+from tools.text_search import search_project
+from utils.tracing import traced_tool
+
+(read_file, read_files, show_project_structure, list_project_files, find_java_symbol, search_project, lookup_maven_dependency,
+ create_or_update_file, edit_file, apply_patch) = (
+    traced_tool(tool) for tool in (read_file, read_files, show_project_structure, list_project_files, find_java_symbol,
+                                   search_project, lookup_maven_dependency, create_or_update_file, edit_file, apply_patch))
+
+# Tools bound to the LLMs and executed by the ToolNodes in main.py.
+# Nodes and ToolNodes must share these lists so the model is never offered a tool the graph cannot run.
+# Every tool is wrapped for tracing (utils/tracing.py).
+PLANNER_TOOLS = [read_file, read_files, show_project_structure, list_project_files, find_java_symbol, search_project,
+                 lookup_maven_dependency]
+CODE_TOOLS = [read_file, read_files, show_project_structure, list_project_files, find_java_symbol, search_project,
+              lookup_maven_dependency, create_or_update_file, edit_file, apply_patch]
+ERROR_HANDLER_TOOLS = [read_file, read_files, show_project_structure, list_project_files, find_java_symbol, search_project,
+                       lookup_maven_dependency]
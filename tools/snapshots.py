@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+import tools.file_tools as file_tools
+from tools.changeset import content_hash
+from tools.file_index import get_file_index
+
+# Take a snapshot of the project before every implementation cycle and roll back when a cycle makes the build worse.
+WORKSPACE_SNAPSHOTS = os.getenv("WORKSPACE_SNAPSHOTS", "true").lower() in ("1", "true", "yes")
+# Snapshot store inside the project. Hidden, so the file index, the tools and Maven never see it.
+SNAPSHOT_DIR = os.path.join(".agent", "snapshots")
+
+
+class SnapshotStore:
+    """
+    Content-addressed snapshots of the indexed project files (build output and hidden files excluded).
+    A snapshot is a manifest of path -> content hash; file contents are stored once per distinct hash,
+    so a snapshot only adds the files that changed since earlier ones. Hashes are cached by
+    (mtime, size), so taking a snapshot reads only files modified since the last one.
+    """
+
+    def __init__(self, root: str):
+        self.root = root.rstrip("/")
+        self.directory = os.path.join(self.root, SNAPSHOT_DIR)
+        self._hashes: dict[str, tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, label: str = "") -> str:
+        """ Snapshot the current project files and return the snapshot id. """
+        with self._lock:
+            index = get_file_index(self.root)
+            index.refresh(force=True)
+            files = {}
+            for rel_path in index.files():
+                path = os.path.join(self.root, rel_path)
+                try:
+                    files[rel_path] = self._store(path)
+                except FileNotFoundError:
+                    continue
+            snapshot_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+            manifest = {"id": snapshot_id, "label": label, "created": time.time(), "files": files}
+            os.makedirs(os.path.join(self.directory, "manifests"), exist_ok=True)
+            with open(self._manifest_path(snapshot_id), "w") as f:
+                json.dump(manifest, f)
+            return snapshot_id
+
+    def restore(self, snapshot_id: str) -> list[str]:
+        """
+        Bring the project files back to a snapshot through the file tools, so caches, indexes and the
+        run's changeset (and with it the next incremental build) see the change.
+        Files created after the snapshot are deleted. Returns the paths that changed.
+        """
+        with self._lock:
+            with open(self._manifest_path(snapshot_id)) as f:
+                files = json.load(f)["files"]
+            index = get_file_index(self.root)
+            index.refresh(force=True)
+            changed = []
+            with file_tools.use_project_path(self.root):
+                for rel_path in index.files():
+                    if rel_path not in files and file_tools.delete_project_file(rel_path):
+                        changed.append(rel_path)
+                for rel_path, digest in sorted(files.items()):
+                    with open(self._object_path(digest), "rb") as f:
+                        if file_tools.write_project_file(rel_path, f.read()):
+                            changed.append(rel_path)
+            return sorted(changed)
+
+    def _store(self, path: str) -> str:
+        st = os.stat(path)
+        cached = self._hashes.get(path)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = content_hash(data)
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            temp_path = f"{object_path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, object_path)
+        self._hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def _manifest_path(self, snapshot_id: str) -> str:
+        return os.path.join(self.directory, "manifests", snapshot_id + ".json")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "objects", digest[:2], digest)
+
+
+_stores: dict[str, SnapshotStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_snapshot_store(root: str) -> SnapshotStore:
+    root = root.rstrip("/")
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = SnapshotStore(root)
+        return _stores[root]
+
+
+def comparable_scores(snapshot: dict, error_count: int, compile_error_count: int, test_selection: str) -> tuple:
+    """
+    The snapshot's score and the current build's on the same footing: all problems when both builds ran the same
+    tests, otherwise only compile and dependency problems. The snapshot's score is None if its tree was not built.
+    """
+    if snapshot.get("test_selection") == test_selection:
+        return snapshot.get("error_count"), error_count
+    return snapshot.get("compile_error_count"), compile_error_count
+
+
+def best_snapshot(snapshots: list[dict], error_count: int, compile_error_count: int, test_selection: str):
+    """
+    The best snapshot that scored better than the current build, the earliest on ties; None if none did.
+    Builds that ran different affected tests cannot compare their test failures: snapshots built with the same
+    test selection are compared on all problems, the others only on compile and dependency problems.
+    """
+    same = [s for s in snapshots if s.get("error_count") is not None and s.get("test_selection") == test_selection
+            and s["error_count"] < error_count]
+    if same:
+        return min(same, key=lambda s: s["error_count"])
+    other = [s for s in snapshots if s.get("compile_error_count") is not None and s["compile_error_count"] < compile_error_count]
+    return min(other, key=lambda s: s["compile_error_count"]) if other else None
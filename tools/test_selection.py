@@ -0,0 +1,88 @@
+import hashlib
+import os
+import re
+from collections import deque
+
+from tools.changeset import MISSING, FileChange
+from tools.java_symbols import get_symbol_index
+
+# Run only the tests affected by the changes on intermediate builds; the build that would end the run uses the full suite.
+TEST_SELECTION = os.getenv("TEST_SELECTION", "true").lower() in ("1", "true", "yes")
+
+TEST_SOURCE_DIR = "src/test/java/"
+# Surefire's default includes
+TEST_CLASS_RE = re.compile(r'^(Test\w*|\w*Test|\w*Tests|\w*TestCase)\.java$')
+TYPE_KINDS = {"class", "interface", "enum", "record", "annotation"}
+
+
+def dependents_graph(files: dict[str, dict]) -> dict[str, set[str]]:
+    """
+    For every Java file (relative path), the files that refer to one of its top-level types:
+    through a single-type or on-demand import, or by simple name within the same package.
+    """
+    by_name: dict[str, str] = {}
+    for rel_path, parsed in files.items():
+        for symbol in parsed["symbols"]:
+            if symbol["kind"] in TYPE_KINDS and not symbol["container"]:
+                by_name[".".join(p for p in (parsed["package"], symbol["name"]) if p)] = rel_path
+
+    dependents: dict[str, set[str]] = {rel_path: set() for rel_path in files}
+    for rel_path, parsed in files.items():
+        package = parsed["package"]
+        imported = {}
+        wildcards = [package]
+        for name in parsed["imports"]:
+            if name.endswith(".*"):
+                wildcards.append(name[:-2])
+            elif name in by_name:
+                imported[name.rsplit(".", 1)[-1]] = by_name[name]
+                dependents[by_name[name]].add(rel_path)
+        for reference in parsed["references"]:
+            if reference in imported:
+                continue
+            for prefix in wildcards:
+                target = by_name.get(f"{prefix}.{reference}" if prefix else reference)
+                if target is not None:
+                    dependents[target].add(rel_path)
+                    break
+    for rel_path in dependents:
+        dependents[rel_path].discard(rel_path)
+    return dependents
+
+
+def affected_tests(root: str, changes: list[FileChange]):
+    """
+    Fully qualified names of the test classes that may be affected by the changed files: the tests that
+    reach a changed Java file through the reference graph, and changed tests themselves.
+    Returns None when the whole suite has to run: nothing changed, or a change the graph cannot follow
+    (a pom.xml, a resource or a deleted file).
+    """
+    if not changes or any(not c.path.endswith(".java") or c.new_hash == MISSING for c in changes):
+        return None
+    files = get_symbol_index(root).parsed_files()
+    dependents = dependents_graph(files)
+
+    seen = {c.path for c in changes if c.path in files}
+    queue = deque(seen)
+    while queue:
+        for dependent in dependents.get(queue.popleft(), ()):
+            if dependent not in seen:
+                seen.add(dependent)
+                queue.append(dependent)
+
+    tests = set()
+    for rel_path in seen:
+        if f"/{TEST_SOURCE_DIR}" in "/" + rel_path and TEST_CLASS_RE.match(os.path.basename(rel_path)):
+            package = files[rel_path]["package"]
+            name = os.path.basename(rel_path)[:-len(".java")]
+            tests.add(f"{package}.{name}" if package else name)
+    return sorted(tests)
+
+
+def selection_key(tests) -> str:
+    """ Identifies the tests a build ran (see affected_tests), so that only builds of the same selection compare their test failures. """
+    if tests is None:
+        return "all"
+    if not tests:
+        return "none"
+    return hashlib.sha1(",".join(sorted(tests)).encode("utf-8")).hexdigest()[:12]
@@ -0,0 +1,298 @@
+import fnmatch
+import json
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+import tools.file_tools as file_tools
+from tools.file_index import REFRESH_INTERVAL, get_file_index
+
+# Where the index is persisted inside the project, so a new run only re-reads the files that changed.
+SEARCH_INDEX_FILE = os.path.join(".agent", "search", "trigrams.json")
+# Larger files (logs, dumps, bundled assets) are not indexed.
+SEARCH_MAX_FILE_BYTES = int(os.getenv("SEARCH_MAX_FILE_BYTES", str(1024 * 1024)))
+# A matching line is cut to this many characters in the results.
+SNIPPET_CHARS = 200
+
+BINARY_EXTENSIONS = {".class", ".jar", ".war", ".ear", ".zip", ".gz", ".tar", ".png", ".jpg", ".jpeg", ".gif", ".ico",
+                     ".pdf", ".woff", ".woff2", ".ttf", ".eot", ".so", ".dll", ".exe", ".bin", ".keystore", ".jks", ".p12"}
+INDEX_VERSION = 2
+
+
+def trigrams(text: str) -> set[str]:
+    """ The lowercased three-character substrings of text; lines are indexed separately, matches never span lines. """
+    grams = set()
+    for line in text.lower().split("\n"):
+        grams.update(line[i:i + 3] for i in range(len(line) - 2))
+    return grams
+
+
+def required_literals(pattern: str) -> list[str]:
+    """
+    Literal strings every match of the regular expression must contain, for narrowing candidates with the index.
+    Conservative: an alternation, or anything this scan does not understand, yields no literals (all files are candidates).
+    """
+    literals, current = [], []
+    depth = 0  # literals inside groups may be optional or alternatives: only top-level ones are required
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "|":
+            return []
+        if c == "\\":
+            if i + 1 >= len(pattern):
+                return []
+            escaped = pattern[i + 1]
+            i += 2
+            if escaped.isalnum():  # \d, \w, \b, backreferences...: not literal
+                literals.append("".join(current))
+                current = []
+            elif depth == 0:
+                current.append(escaped)
+        elif c == "[":
+            end = _class_end(pattern, i)
+            if end < 0:
+                return []
+            literals.append("".join(current))
+            current = []
+            i = end + 1
+        elif c == "(" and pattern[i + 1:i + 2] == "?" and pattern[i + 2:i + 3] in set("aiLmsux-"):
+            return []  # inline flags, e.g. (?x) makes whitespace and "#" non-literal
+        elif c in ".^$()":
+            depth += {"(": 1, ")": -1}.get(c, 0)
+            literals.append("".join(current))
+            current = []
+            i += 1
+        elif c in "*?{+":
+            # The quantified character may be absent (or repeated): it ends the run either way
+            if current and c != "+":
+                current.pop()
+            literals.append("".join(current))
+            current = []
+            end = pattern.find("}", i) if c == "{" else -1
+            i = end + 1 if end >= 0 else i + 1
+        else:
+            if depth == 0:
+                current.append(c)
+            i += 1
+    literals.append("".join(current))
+    return [literal for literal in literals if len(literal) >= 3]
+
+
+def _class_end(pattern: str, start: int) -> int:
+    """ Index of the "]" closing the character class opened at start, skipping escaped characters; -1 if unclosed. """
+    i = start + 1
+    if pattern[i:i + 1] == "^":
+        i += 1
+    if pattern[i:i + 1] == "]":
+        i += 1  # a "]" first in the class is literal
+    while i < len(pattern):
+        if pattern[i] == "\\":
+            i += 2
+        elif pattern[i] == "]":
+            return i
+        else:
+            i += 1
+    return -1
+
+
+class TrigramIndex:
+    """
+    Trigram index of the project's text files, so a search only reads the files that can contain the query.
+    Files are re-indexed when their (mtime, size) changed or they were written through the file tools; the index
+    is saved under .agent/ and reloaded by the next run.
+    """
+
+    def __init__(self, root: str, refresh_interval: float = REFRESH_INTERVAL):
+        self.root = root.rstrip("/")
+        self.refresh_interval = refresh_interval
+        # (mtime_ns, size, trigrams); trigrams is None for files that are not searched (too large or binary)
+        self._files: dict[str, tuple[int, int, Optional[set[str]]]] = {}
+        self._postings: dict[str, set[str]] = {}
+        self._last_refresh = 0.0
+        self._dirty = False
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def refresh(self, force: bool = False):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if not force and self._last_refresh and time.monotonic() - self._last_refresh < self.refresh_interval:
+                return
+            files = [f for f in get_file_index(self.root).files() if self._indexable(f)]
+            for rel_path in files:
+                self._update(rel_path)
+            for rel_path in set(self._files) - set(files):
+                self._remove(rel_path)
+            self._last_refresh = time.monotonic()
+            if self._dirty:
+                self._save()
+
+    def notify_write(self, path: str):
+        if not path.startswith(self.root + "/"):
+            return
+        rel_path = path[len(self.root) + 1:]
+        with self._lock:
+            if not self._loaded:
+                return  # indexed on the first search
+            if get_file_index(self.root).is_ignored(rel_path) or not self._indexable(rel_path):
+                return
+            self._update(rel_path)
+
+    def candidates(self, literals: list[str]) -> list[str]:
+        """ Files containing every trigram of the literals (case-insensitively), sorted; all files without literals. """
+        self.refresh()
+        with self._lock:
+            grams = set().union(*(trigrams(literal) for literal in literals)) if literals else set()
+            if not grams:
+                return sorted(rel_path for rel_path, (_, _, file_grams) in self._files.items() if file_grams is not None)
+            postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+            result = set(postings[0])
+            for posting in postings[1:]:
+                result &= posting
+                if not result:
+                    break
+            return sorted(result)
+
+    def _indexable(self, rel_path: str) -> bool:
+        return os.path.splitext(rel_path)[1].lower() not in BINARY_EXTENSIONS
+
+    def _update(self, rel_path: str):
+        path = self.root + "/" + rel_path
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._remove(rel_path)
+            return
+        cached = self._files.get(rel_path)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return
+        grams = None
+        if st.st_size <= SEARCH_MAX_FILE_BYTES:
+            text = read_text(path)
+            if text is not None:
+                grams = trigrams(text)
+        self._remove(rel_path)
+        self._files[rel_path] = (st.st_mtime_ns, st.st_size, grams)
+        for gram in grams or ():
+            self._postings.setdefault(gram, set()).add(rel_path)
+        self._dirty = True
+
+    def _remove(self, rel_path: str):
+        cached = self._files.pop(rel_path, None)
+        if cached is None:
+            return
+        for gram in cached[2] or ():
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(rel_path)
+                if not posting:
+                    del self._postings[gram]
+        self._dirty = True
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(os.path.join(self.root, SEARCH_INDEX_FILE), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        for rel_path, (mtime_ns, size, grams) in data["files"].items():
+            grams = {grams[i:i + 3] for i in range(0, len(grams), 3)} if grams is not None else None
+            self._files[rel_path] = (mtime_ns, size, grams)
+            for gram in grams or ():
+                self._postings.setdefault(gram, set()).add(rel_path)
+
+    def _save(self):
+        path = os.path.join(self.root, SEARCH_INDEX_FILE)
+        data = {"version": INDEX_VERSION,
+                "files": {rel_path: [mtime_ns, size, "".join(sorted(grams)) if grams is not None else None] for rel_path, (mtime_ns, size, grams) in self._files.items()}}
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(path + ".tmp", path)
+            self._dirty = False
+        except OSError as e:
+            print(f"Could not save the search index: {e}")
+
+
+def read_text(path: str):
+    """ The file's text, or None for a binary file (a NUL byte in its first 8 KB). """
+    with open(path, "rb") as f:
+        data = f.read()
+    if b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+_indexes: dict[str, TrigramIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(root: str) -> TrigramIndex:
+    root = root.rstrip("/")
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = TrigramIndex(root)
+        return _indexes[root]
+
+
+def _on_file_written(path: str):
+    get_search_index(file_tools.project_path()).notify_write(path)
+
+
+file_tools.on_file_written(_on_file_written)
+
+
+def search_project(query: str, regex: bool = False, case_sensitive: bool = False, path_prefix: str = "",
+                   pattern: str = "", limit: int = 50) -> list[str]:
+    """ Search the text of the project's files, like grep: find where a property key, bean name, string or exception message is used.
+    Build output (target/) and binary files are not searched. Use this instead of reading candidate files one by one.
+    Args:
+        query (str): The text to find, e.g. "spring.datasource.url" or "User not found". Matches never span lines.
+        regex (bool): Treat query as a Python regular expression, e.g. r"@Value\\(\\"\\$\\{app\\.".
+        case_sensitive (bool): Match case exactly; by default case is ignored.
+        path_prefix (str): Only search below this directory, relative to the project root, e.g. "src/main/resources".
+        pattern (str): Only search files whose name matches this glob, e.g. "*.java" or "application*.yml".
+        limit (int): Maximum number of matching lines returned.
+    Returns:
+        list[str]: One line per match: "path:line: text", followed by a note when more lines matched than the limit.
+    Raises:
+        Exception: If the query is not a valid regular expression or the project cannot be indexed, with the error message.
+    """
+    try:
+        if not query:
+            raise ValueError("the query is empty")
+        flags = 0 if case_sensitive else re.IGNORECASE
+        matcher = re.compile(query if regex else re.escape(query), flags)
+        index = get_search_index(file_tools.project_path())
+        prefix = path_prefix.strip("/")
+        results, total = [], 0
+        for rel_path in index.candidates(required_literals(query) if regex else [query]):
+            if prefix and not (rel_path == prefix or rel_path.startswith(prefix + "/")):
+                continue
+            if pattern and not fnmatch.fnmatch(os.path.basename(rel_path), pattern) and not fnmatch.fnmatch(rel_path, pattern):
+                continue
+            try:
+                text = read_text(index.root + "/" + rel_path)
+            except OSError:
+                continue
+            if text is None:
+                continue
+            for line_no, line in enumerate(text.split("\n"), start=1):
+                if matcher.search(line):
+                    total += 1
+                    if len(results) < limit:
+                        snippet = line.strip()
+                        results.append(f"{rel_path}:{line_no}: " + (snippet[:SNIPPET_CHARS] + "..." if len(snippet) > SNIPPET_CHARS else snippet))
+        if total > len(results):
+            results.append(f"... {total - len(results)} more matching lines; narrow the search with path_prefix or pattern")
+        return results or [f"No matches for {query!r}"]
+    except Exception as e:
+        raise Exception(f"Could not search the project because of the following exception: {e}")
@@ -0,0 +1,245 @@
+import os
+import random
+import sqlite3
+import threading
+from typing import Any, Iterator, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", os.path.join(".checkpoints", "checkpoints.sqlite"))
+# A list channel is stored in full again after this many consecutive deltas, bounding the work to rebuild it.
+MAX_DELTA_CHAIN = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT, type TEXT NOT NULL, checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL, metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL, version TEXT NOT NULL,
+    type TEXT NOT NULL, value BLOB, base_version TEXT, chain INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL,
+    type TEXT NOT NULL, value BLOB, task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class SqliteCheckpointer(BaseCheckpointSaver):
+    """
+    File-backed LangGraph checkpointer.
+    Like the in-memory saver, a channel is only stored when its version changes. In addition, list channels
+    that only grew since their previous version (messages, overall_messages) are stored as the appended tail
+    plus a reference to that previous version, so long runs do not write the whole history at every step.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_DB, *, serde=None):
+        super().__init__(serde=serde)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        # (thread_id, checkpoint_ns, channel) -> (version, value, chain) of the last list value stored in this process
+        self._last_lists: dict[tuple[str, str, str], tuple[str, list, int]] = {}
+
+    def get_tuple(self, config: RunnableConfig):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            if checkpoint_id:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)).fetchone()
+            if row is None:
+                return None
+            return self._to_tuple(thread_id, checkpoint_ns, row)
+
+    def list(self, config, *, filter: dict[str, Any] = None, before: RunnableConfig = None, limit: int = None) -> Iterator[CheckpointTuple]:
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints"
+        conditions, params = [], []
+        if config:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                conditions.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            conditions.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            metadata = self.serde.loads_typed((row[6], row[7]))
+            if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            with self._lock:
+                yield self._to_tuple(row[0], row[1], row[2:])
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")
+        with self._lock:
+            for channel, version in new_versions.items():
+                self._put_blob(thread_id, checkpoint_ns, channel, str(version), values.get(channel), channel in values)
+            checkpoint_type, checkpoint_blob = self.serde.dumps_typed(stored)
+            metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 checkpoint_type, checkpoint_blob, metadata_type, metadata_blob))
+            self._conn.commit()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                value_type, value_blob = self.serde.dumps_typed(value)
+                # Special writes (errors, interrupts...) have fixed negative indexes and may be overwritten
+                verb = "INSERT OR REPLACE" if write_idx < 0 else "INSERT OR IGNORE"
+                self._conn.execute(
+                    f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint_id, task_id, write_idx, channel, value_type, value_blob, task_path))
+            self._conn.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for table in ("checkpoints", "blobs", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+            for key in [k for k in self._last_lists if k[0] == thread_id]:
+                del self._last_lists[key]
+
+    async def aget_tuple(self, config: RunnableConfig):
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter: dict[str, Any] = None, before: RunnableConfig = None, limit: int = None):
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+    def get_next_version(self, current, channel) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    def _put_blob(self, thread_id: str, checkpoint_ns: str, channel: str, version: str, value, present: bool):
+        key = (thread_id, checkpoint_ns, channel)
+        if not present:
+            row = (thread_id, checkpoint_ns, channel, version, "empty", None, None, 0)
+        elif isinstance(value, list):
+            previous = self._last_lists.get(key)
+            if previous is not None and previous[2] < MAX_DELTA_CHAIN and _extends(value, previous[1]):
+                value_type, blob = self.serde.dumps_typed(value[len(previous[1]):])
+                row = (thread_id, checkpoint_ns, channel, version, "delta:" + value_type, blob, previous[0], previous[2] + 1)
+                self._last_lists[key] = (version, list(value), previous[2] + 1)
+            else:
+                value_type, blob = self.serde.dumps_typed(value)
+                row = (thread_id, checkpoint_ns, channel, version, value_type, blob, None, 0)
+                self._last_lists[key] = (version, list(value), 0)
+        else:
+            value_type, blob = self.serde.dumps_typed(value)
+            row = (thread_id, checkpoint_ns, channel, version, value_type, blob, None, 0)
+        self._conn.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    def _load_blob(self, thread_id: str, checkpoint_ns: str, channel: str, version: str):
+        """ Returns (present, value), following delta references back to the last full value. """
+        tails = []
+        while True:
+            row = self._conn.execute(
+                "SELECT type, value, base_version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, version)).fetchone()
+            if row is None or row[0] == "empty":
+                return False, None
+            value_type, blob, base_version = row
+            if not value_type.startswith("delta:"):
+                value = self.serde.loads_typed((value_type, blob))
+                break
+            tails.append(self.serde.loads_typed((value_type[len("delta:"):], blob)))
+            version = base_version
+        if tails:
+            value = list(value)
+            for tail in reversed(tails):
+                value.extend(tail)
+        return True, value
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint_blob, metadata_type, metadata_blob = row
+        checkpoint = self.serde.loads_typed((checkpoint_type, checkpoint_blob))
+        channel_values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            present, value = self._load_blob(thread_id, checkpoint_ns, channel, str(version))
+            if present:
+                channel_values[channel] = value
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            parent_config=({"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id}}
+                           if parent_checkpoint_id else None),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((value_type, value))) for task_id, channel, value_type, value in writes],
+        )
+
+
+def _extends(value: list, previous: list) -> bool:
+    """ Whether value starts with all items of previous (compared by identity first, which is the common case in-process). """
+    if len(value) < len(previous):
+        return False
+    return all(a is b or a == b for a, b in zip(value, previous))
@@ -0,0 +1,165 @@
+import json
+import os
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+import tools.file_tools as file_tools
+from tools.edit_tools import patch_paths
+from tools.file_tools import LINE_RANGE_RE
+
+# Upper bound on the estimated prompt tokens of one LLM request.
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "60000"))
+# The most recent messages are always sent unchanged.
+KEEP_RECENT_MESSAGES = 6
+# Characters of a tool output kept when it has to be shortened.
+PREVIEW_CHARS = 400
+
+# Tools whose output only depends on their arguments and the project state: a later identical call supersedes an earlier one
+IDEMPOTENT_TOOLS = {"read_file", "read_files", "show_project_structure", "list_project_files", "find_java_symbol",
+                    "search_project", "lookup_maven_dependency"}
+# Tools that change files, with the argument holding the path and the one holding the (large) new content
+WRITE_TOOLS = {"create_or_update_file": ("file_name", "file_contents"), "edit_file": ("file_name", "edits"), "apply_patch": ("", "patch")}
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+_token_counts: dict[tuple, int] = {}
+
+
+def count_tokens(message: BaseMessage) -> int:
+    """ Estimated prompt tokens of a message, memoized per message id and content size. """
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        content += json.dumps([c["args"] for c in tool_calls])
+    key = (message.id, len(content)) if message.id else None
+    if key in _token_counts:
+        return _token_counts[key]
+    tokens = (len(_encoding.encode(content, disallowed_special=())) if _encoding else len(content) // 4) + 4
+    if key is not None:
+        if len(_token_counts) > 50000:
+            _token_counts.clear()
+        _token_counts[key] = tokens
+    return tokens
+
+
+def count_message_tokens(messages: list[BaseMessage]) -> int:
+    return sum(count_tokens(m) for m in messages)
+
+
+def compact_messages(messages: list[BaseMessage], budget: int = LLM_CONTEXT_TOKEN_BUDGET) -> list[BaseMessage]:
+    """
+    Return the messages to send to the LLM, keeping the request under the token budget.
+    The stored history is not modified and no message is dropped (every tool call keeps its tool result):
+    1. Tool results made stale by later messages are replaced by a short reference: reads of a file that
+       was rewritten afterwards, and results of a call that was later repeated with the same arguments.
+    2. The full file contents in older write calls are elided; the file on disk is the source of truth.
+    3. If still over budget, the oldest tool results are shortened to a preview until the request fits.
+    The last KEEP_RECENT_MESSAGES messages are never changed.
+    """
+    if count_message_tokens(messages) <= budget:
+        return messages
+
+    calls: dict[str, dict] = {}
+    for message in messages:
+        if isinstance(message, AIMessage):
+            for call in message.tool_calls:
+                calls[call["id"]] = call
+
+    compacted = list(messages)
+    protected_from = max(0, len(messages) - KEEP_RECENT_MESSAGES)
+    written_after: dict[str, int] = {}
+    seen_calls: set[str] = set()
+
+    # Walk backwards so "later" information is known when an older message is visited
+    for i in range(len(messages) - 1, -1, -1):
+        message = messages[i]
+        if isinstance(message, AIMessage) and message.tool_calls:
+            for call in message.tool_calls:
+                for path in written_paths(call):
+                    written_after.setdefault(_normalize_path(path), i)
+            if i < protected_from:
+                compacted[i] = _elide_write_contents(message)
+        elif isinstance(message, ToolMessage) and i < protected_from:
+            call = calls.get(message.tool_call_id)
+            if call is None or call["name"] not in IDEMPOTENT_TOOLS:
+                continue
+            signature = call["name"] + json.dumps(call["args"], sort_keys=True)
+            if signature in seen_calls:
+                compacted[i] = _replace_content(message, f"[{call['name']} result elided: the same call was repeated later in this conversation]")
+            elif call["name"] == "read_file" and _normalize_path(call["args"].get("file", "")) in written_after:
+                compacted[i] = _replace_content(message, f"[read_file result elided: {call['args'].get('file')} was rewritten later in this conversation]")
+            elif call["name"] == "read_files" and call["args"].get("files") and all(
+                    _normalize_path(LINE_RANGE_RE.sub(r"\1", f)) in written_after for f in call["args"]["files"]):
+                compacted[i] = _replace_content(message, "[read_files result elided: all of these files were rewritten later in this conversation]")
+            seen_calls.add(signature)
+
+    total = count_message_tokens(compacted)
+    for i in range(protected_from):
+        if total <= budget:
+            break
+        message = compacted[i]
+        if isinstance(message, ToolMessage) and isinstance(message.content, str) and len(message.content) > PREVIEW_CHARS:
+            shortened = _replace_content(message, message.content[:PREVIEW_CHARS]
+                                         + f"\n... [{len(message.content) - PREVIEW_CHARS} characters elided to save context; call the tool again if needed]")
+            total += count_tokens(shortened) - count_tokens(message)
+            compacted[i] = shortened
+
+    print(f"Compacted LLM context from {count_message_tokens(messages)} to {total} estimated tokens")
+    return compacted
+
+
+def archive_messages(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """ Copies of the messages for the run log (overall_messages), with long tool results and written file contents shortened. """
+    archived = []
+    for message in messages:
+        if isinstance(message, ToolMessage) and isinstance(message.content, str) and len(message.content) > PREVIEW_CHARS:
+            message = _replace_content(message, message.content[:PREVIEW_CHARS] + f"\n... [{len(message.content) - PREVIEW_CHARS} characters elided]")
+        elif isinstance(message, AIMessage):
+            message = _elide_write_contents(message)
+        archived.append(message)
+    return archived
+
+
+def written_paths(call: dict) -> list[str]:
+    """ Files a tool call asks to change, as given in its arguments. """
+    if call["name"] == "apply_patch":
+        return patch_paths(call["args"].get("patch") or "")
+    if call["name"] in WRITE_TOOLS and call["args"].get(WRITE_TOOLS[call["name"]][0]):
+        return [call["args"][WRITE_TOOLS[call["name"]][0]]]
+    return []
+
+
+def _normalize_path(path: str) -> str:
+    if not path:
+        return ""
+    path = os.path.normpath(path)
+    root = file_tools.project_path()
+    if path.startswith(root + "/"):
+        path = path[len(root) + 1:]
+    return path.lstrip("/")
+
+
+def _replace_content(message: BaseMessage, content: str) -> BaseMessage:
+    return message.model_copy(update={"content": content})
+
+
+def _elide_write_contents(message: AIMessage) -> AIMessage:
+    changed = False
+    tool_calls = []
+    for call in message.tool_calls:
+        content_arg = WRITE_TOOLS.get(call["name"], (None, None))[1]
+        contents = call["args"].get(content_arg) if content_arg else None
+        if isinstance(contents, str) and len(contents) > PREVIEW_CHARS:
+            call = {**call, "args": {**call["args"], content_arg: f"[{len(contents)} characters written; see the file for its current content]"}}
+            changed = True
+        tool_calls.append(call)
+    if not changed:
+        return message
+    # The raw provider tool calls would otherwise still carry the full contents
+    additional_kwargs = {k: v for k, v in message.additional_kwargs.items() if k != "tool_calls"}
+    return message.model_copy(update={"tool_calls": tool_calls, "additional_kwargs": additional_kwargs})
@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+# off: call the model every time. read_write: serve hits from the cache and store misses.
+# replay: serve hits and fail on a miss, so a pipeline can be re-run offline and deterministically.
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off").lower()
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".llm_cache", "responses.sqlite"))
+# Least recently used responses are evicted once the stored responses exceed this size.
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class LLMCacheMiss(Exception):
+    """ Raised in replay mode when a request has no cached response. """
+
+
+class LLMResponseCache:
+    """ SQLite store of serialized model responses keyed by request hash, with size-based LRU eviction. """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return messages_from_dict([json.loads(row[0])])[0]
+
+    def put(self, key: str, message: BaseMessage):
+        response = json.dumps(message_to_dict(message))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, len(response), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+def _normalize_message(message: BaseMessage) -> dict:
+    """ The parts of a message that affect the model's answer. Generated ids (message and tool call ids) are left out. """
+    normalized = {"type": message.type, "content": message.content}
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        normalized["tool_calls"] = [{"name": c["name"], "args": c["args"]} for c in tool_calls]
+    if message.type == "tool":
+        normalized["name"] = message.name
+    return normalized
+
+
+def cache_key(runnable, messages: list[BaseMessage]) -> str:
+    """ Hash of the model and its parameters, the bound tools and the normalized messages. """
+    model = getattr(runnable, "bound", runnable)
+    payload = {
+        "model": getattr(model, "_identifying_params", {"model": repr(model)}),
+        "bound": getattr(runnable, "kwargs", {}),
+        "messages": [_normalize_message(m) for m in messages],
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class CachedChatModel:
+    """ Wraps a chat model (usually the result of bind_tools) so invoke() and ainvoke() go through the response cache. """
+
+    def __init__(self, runnable, cache: LLMResponseCache, mode: str):
+        self.runnable = runnable
+        self.cache = cache
+        self.mode = mode
+
+    def invoke(self, messages: list[BaseMessage], *args, **kwargs):
+        key = cache_key(self.runnable, messages)
+        cached_response = self.cache.get(key)
+        if cached_response is not None:
+            return cached_response
+        if self.mode == "replay":
+            raise LLMCacheMiss(f"No cached LLM response for request {key} in replay mode")
+        response = self.runnable.invoke(messages, *args, **kwargs)
+        self.cache.put(key, response)
+        return response
+
+    async def ainvoke(self, messages: list[BaseMessage], *args, **kwargs):
+        key = cache_key(self.runnable, messages)
+        # SQLite access is blocking; keep it off the event loop
+        cached_response = await asyncio.to_thread(self.cache.get, key)
+        if cached_response is not None:
+            return cached_response
+        if self.mode == "replay":
+            raise LLMCacheMiss(f"No cached LLM response for request {key} in replay mode")
+        response = await self.runnable.ainvoke(messages, *args, **kwargs)
+        await asyncio.to_thread(self.cache.put, key, response)
+        return response
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+        return _cache
+
+
+def cached(runnable, mode: str = None):
+    """ Put the runnable behind the response cache according to LLM_CACHE_MODE (returned unchanged when "off"). """
+    mode = (mode or LLM_CACHE_MODE).lower()
+    if mode == "off":
+        return runnable
+    if mode not in ("read_write", "replay"):
+        raise Exception(f"Unknown LLM_CACHE_MODE {mode}, expected off, read_write or replay")
+    return CachedChatModel(runnable, get_cache(), mode)
@@ -0,0 +1,46 @@
+import threading
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from utils.context_compaction import LLM_CONTEXT_TOKEN_BUDGET, compact_messages, count_tokens
+
+# System prompts of the nodes. Conversations stored by earlier versions carry them as human messages;
+# they are dropped from requests since every request starts with its node's system message.
+_system_prompts: dict[str, SystemMessage] = {}
+_lock = threading.Lock()
+
+
+def system_prompt(text: str) -> str:
+    """ Register a node's system prompt (see assemble_prompt); returns the text unchanged. """
+    with _lock:
+        _system_prompts.setdefault(text.strip(), SystemMessage(content=text, id=f"system-{len(_system_prompts) + 1}"))
+    return text
+
+
+def assemble_prompt(prompt: str, messages: list[BaseMessage], budget: int = LLM_CONTEXT_TOKEN_BUDGET) -> list[BaseMessage]:
+    """
+    The request for a node's LLM call, laid out so that consecutive requests share the longest possible prefix
+    and the provider's prompt cache (keyed on exact prefixes) can serve it:
+    1. the node's system prompt, always the same message, first (the tool schemas bound to the model precede it);
+    2. the conversation as stored, where nodes only ever append at the end.
+    Registered system prompts inside the conversation and a human message repeating the one before it are dropped,
+    so repeated instructions are sent once. The conversation is compacted to fit the budget (see compact_messages).
+    """
+    system = _system_message(prompt)
+    history = []
+    for message in messages:
+        if isinstance(message, SystemMessage):
+            continue
+        if isinstance(message, HumanMessage) and isinstance(message.content, str):
+            if message.content.strip() in _system_prompts:
+                continue
+            if history and isinstance(history[-1], HumanMessage) and history[-1].content == message.content:
+                continue
+        history.append(message)
+    return [system] + compact_messages(history, budget - count_tokens(system))
+
+
+def _system_message(prompt: str) -> SystemMessage:
+    system_prompt(prompt)
+    with _lock:
+        return _system_prompts[prompt.strip()]
@@ -0,0 +1,260 @@
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.messages import BaseMessage
+
+# Append one JSON line per span (graph node, tool call, LLM call, file-system walk) to this file. Empty disables it.
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+# Write a Prometheus text-format snapshot of the aggregated metrics to this file. Empty disables it.
+TRACE_METRICS_FILE = os.getenv("TRACE_METRICS_FILE", "")
+# Minimum seconds between two snapshot writes while a run is in progress; one is always written at the end of a run.
+TRACE_METRICS_INTERVAL = float(os.getenv("TRACE_METRICS_INTERVAL", "10"))
+
+
+def payload_bytes(messages: list[BaseMessage]) -> int:
+    """ Size of the message contents and tool-call arguments sent to or received from the model. """
+    total = 0
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+        total += len(content.encode("utf-8"))
+        for call in getattr(message, "tool_calls", None) or []:
+            total += len(json.dumps(call["args"]).encode("utf-8"))
+    return total
+
+
+def _run_context() -> tuple[str, str]:
+    """ Thread id of the graph run and the graph node the caller executes in, when called inside a run. """
+    try:
+        from langgraph.config import get_config
+        config = get_config()
+    except Exception:
+        return "", ""
+    return (str(config.get("configurable", {}).get("thread_id", "")),
+            str(config.get("metadata", {}).get("langgraph_node", "")))
+
+
+class Tracer:
+    """
+    Records spans and aggregates them per (kind, name): count, errors, seconds, tokens, payload bytes and retries.
+    Spans carry the run's thread id, the enclosing graph node and the implementation cycle
+    (0 while planning, then 1, 2, ... for every plan the orchestrator starts, counted within this process).
+    """
+
+    def __init__(self, trace_file: str = TRACE_FILE, metrics_file: str = TRACE_METRICS_FILE,
+                 metrics_interval: float = TRACE_METRICS_INTERVAL):
+        self.trace_file = trace_file
+        self.metrics_file = metrics_file
+        self.metrics_interval = metrics_interval
+        self._lock = threading.Lock()
+        self._metrics: dict[tuple[str, str], dict[str, float]] = {}
+        self._initial_cycles: dict[str, int] = {}
+        self._cycles: dict[str, int] = {}
+        self._failed_calls: dict[str, set[str]] = {}
+        self._last_metrics_write = 0.0
+        if trace_file and os.path.dirname(trace_file):
+            os.makedirs(os.path.dirname(trace_file), exist_ok=True)
+
+    def observe_cycles(self, thread_id: str, cycles_left):
+        """ Track the implementation cycle of a run from the "cycles" countdown in its state. """
+        if not isinstance(cycles_left, int):
+            return
+        with self._lock:
+            initial = self._initial_cycles.setdefault(thread_id, cycles_left)
+            self._cycles[thread_id] = max(0, initial - cycles_left)
+
+    def cycle(self, thread_id: str) -> int:
+        with self._lock:
+            return self._cycles.get(thread_id, 0)
+
+    def is_retry(self, thread_id: str, signature: str, failed: bool) -> bool:
+        """ Whether an identical call failed before in this run; remembers the outcome of this one. """
+        with self._lock:
+            failures = self._failed_calls.setdefault(thread_id, set())
+            retry = signature in failures
+            if failed:
+                failures.add(signature)
+            else:
+                failures.discard(signature)
+            return retry
+
+    def record(self, kind: str, name: str, seconds: float, error: str = "", **fields):
+        thread_id, node = _run_context()
+        span = {"ts": round(time.time(), 3), "kind": kind, "name": name, "thread_id": thread_id, "node": node,
+                "cycle": self.cycle(thread_id), "duration_ms": round(seconds * 1000, 3), "ok": not error}
+        if error:
+            span["error"] = error[:500]
+        span.update(fields)
+        with self._lock:
+            metrics = self._metrics.setdefault((kind, name), {"count": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0})
+            metrics["count"] += 1
+            metrics["errors"] += 1 if error else 0
+            metrics["seconds"] += seconds
+            metrics["max_seconds"] = max(metrics["max_seconds"], seconds)
+            for key, value in fields.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metrics[key] = metrics.get(key, 0) + value
+            if self.trace_file:
+                with open(self.trace_file, "a") as f:
+                    f.write(json.dumps(span, default=str) + "\n")
+            write_metrics = self.metrics_file and time.monotonic() - self._last_metrics_write >= self.metrics_interval
+        if write_metrics:
+            self.write_metrics()
+
+    @contextmanager
+    def span(self, kind: str, name: str, **fields):
+        """ Time the enclosed block; fields set on the yielded dict are recorded with the span. """
+        started = time.perf_counter()
+        error = ""
+        try:
+            yield fields
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            self.record(kind, name, time.perf_counter() - started, error, **fields)
+
+    def snapshot(self) -> dict[tuple[str, str], dict[str, float]]:
+        with self._lock:
+            return {key: dict(value) for key, value in self._metrics.items()}
+
+    def llm_usage(self) -> str:
+        """ One line with the prompt tokens of the LLM calls so far and the share served from the provider's prompt cache. """
+        usage = [values for (kind, _), values in self.snapshot().items() if kind == "llm"]
+        prompt_tokens = sum(values.get("input_tokens", 0) for values in usage)
+        cached_tokens = sum(values.get("cache_read_tokens", 0) for values in usage)
+        share = f" ({cached_tokens / prompt_tokens:.0%})" if prompt_tokens else ""
+        return (f"LLM calls: {sum(values['count'] for values in usage)}, prompt tokens: {prompt_tokens:.0f}, "
+                f"served from the prompt cache: {cached_tokens:.0f}{share}")
+
+    def prometheus_text(self) -> str:
+        """ The aggregated metrics in the Prometheus text exposition format. """
+        lines = []
+        snapshot = self.snapshot()
+        series = [
+            ("agent_span_count_total", "counter", "Spans recorded.", "count"),
+            ("agent_span_errors_total", "counter", "Spans that ended with an exception.", "errors"),
+            ("agent_span_seconds_total", "counter", "Total wall time of the spans.", "seconds"),
+            ("agent_span_seconds_max", "gauge", "Longest span.", "max_seconds"),
+            ("agent_input_tokens_total", "counter", "Prompt tokens reported by the model.", "input_tokens"),
+            ("agent_output_tokens_total", "counter", "Completion tokens reported by the model.", "output_tokens"),
+            ("agent_cache_read_tokens_total", "counter", "Prompt tokens served from the provider's prompt cache.", "cache_read_tokens"),
+            ("agent_request_bytes_total", "counter", "Bytes sent: LLM request messages or tool arguments.", "request_bytes"),
+            ("agent_response_bytes_total", "counter", "Bytes received: LLM responses or tool results.", "response_bytes"),
+            ("agent_retries_total", "counter", "Calls repeating an identical call that failed before.", "retries"),
+            ("agent_build_failures_total", "counter", "Maven builds that failed.", "failures"),
+            ("agent_compilation_errors_total", "counter", "Distinct javac errors reported by the builds.", "compilation_errors"),
+        ]
+        for metric, metric_type, help_text, key in series:
+            samples = [(kind, name, values[key]) for (kind, name), values in sorted(snapshot.items()) if key in values]
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for kind, name, value in samples:
+                lines.append(f'{metric}{{kind="{_escape(kind)}",name="{_escape(name)}"}} {value:.6g}')
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path: str = ""):
+        """ Write the Prometheus snapshot (atomically, for scrapers reading the file). """
+        path = path or self.metrics_file
+        if not path:
+            return
+        with self._lock:
+            self._last_metrics_write = time.monotonic()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+tracer = Tracer()
+
+
+def trace_span(kind: str, name: str, **fields):
+    """ Context manager recording a span on the process tracer. """
+    return tracer.span(kind, name, **fields)
+
+
+def traced_node(name: str, node):
+    """ Wrap a graph node (sync or async) so every execution is recorded as a "node" span. """
+    def observe(state):
+        if isinstance(state, dict):
+            tracer.observe_cycles(_run_context()[0], state.get("cycles"))
+
+    if asyncio.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def traced_async(state):
+            observe(state)
+            with trace_span("node", name):
+                return await node(state)
+        return traced_async
+
+    @functools.wraps(node)
+    def traced(state):
+        observe(state)
+        with trace_span("node", name):
+            return node(state)
+    return traced
+
+
+def traced_tool(tool):
+    """ Wrap a tool function, recording argument and result bytes and retries. Keeps its name, docstring and signature. """
+    @functools.wraps(tool)
+    def traced(*args, **kwargs):
+        arguments = json.dumps([args, kwargs], sort_keys=True, default=str)
+        signature = tool.__name__ + arguments
+        with trace_span("tool", tool.__name__, request_bytes=len(arguments.encode("utf-8"))) as fields:
+            try:
+                result = tool(*args, **kwargs)
+            except Exception:
+                fields["retries"] = int(tracer.is_retry(_run_context()[0], signature, failed=True))
+                raise
+            fields["retries"] = int(tracer.is_retry(_run_context()[0], signature, failed=result is False))
+            fields["response_bytes"] = len((result if isinstance(result, str) else json.dumps(result, default=str)).encode("utf-8"))
+            return result
+    return traced
+
+
+class TracedChatModel:
+    """ Wraps a chat model (usually cached(llm.bind_tools(...))) recording every invoke/ainvoke as an "llm" span. """
+
+    def __init__(self, name: str, runnable):
+        self.name = name
+        self.runnable = runnable
+
+    def invoke(self, messages: list[BaseMessage], *args, **kwargs):
+        with trace_span("llm", self.name, request_bytes=payload_bytes(messages)) as fields:
+            response = self.runnable.invoke(messages, *args, **kwargs)
+            fields.update(_response_fields(response))
+            return response
+
+    async def ainvoke(self, messages: list[BaseMessage], *args, **kwargs):
+        with trace_span("llm", self.name, request_bytes=payload_bytes(messages)) as fields:
+            response = await self.runnable.ainvoke(messages, *args, **kwargs)
+            fields.update(_response_fields(response))
+            return response
+
+
+def _response_fields(response: BaseMessage) -> dict:
+    fields = {"response_bytes": payload_bytes([response]), "tool_calls": len(getattr(response, "tool_calls", None) or [])}
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage:
+        fields["input_tokens"] = usage.get("input_tokens", 0)
+        fields["output_tokens"] = usage.get("output_tokens", 0)
+        fields["cache_read_tokens"] = (usage.get("input_token_details") or {}).get("cache_read", 0)
+    return fields
+
+
+def traced_llm(name: str, runnable) -> TracedChatModel:
+    return TracedChatModel(name, runnable)